@@ -0,0 +1,75 @@
+"""Guard the import time of the experio entrypoints.
+
+Every module is imported in a fresh interpreter. The script fails when an
+import exceeds the time budget or pulls in a heavy module that should only
+load on demand.
+"""
+import argparse
+import json
+import subprocess  # noqa: S404
+import sys
+
+from experio.console import console
+
+MODULES = (
+    'experio.__main__',
+    'experio.dataset',
+    'experio.models',
+    'experio.search',
+)
+HEAVY_MODULES = (
+    'julia',
+    'pandas',
+    'torch',
+    'transformers',
+)
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {0}
+elapsed = time.perf_counter() - start
+heavy = [name for name in {1!r} if name in sys.modules]
+print(json.dumps({{'elapsed': elapsed, 'heavy': heavy}}))
+"""
+
+
+def probe(module: str) -> dict:
+    """Import a module in a fresh interpreter.
+
+    Args:
+        module (str): Name of the module.
+
+    Returns:
+        dict: Import time in seconds and heavy modules loaded.
+    """
+    output = subprocess.run(  # noqa: S603
+        [sys.executable, '-c', PROBE.format(module, HEAVY_MODULES)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--budget',
+        type=float,
+        default=1.0,
+        help='maximum import time in seconds',
+    )
+    args = parser.parse_args()
+
+    failed = False
+    for module in MODULES:
+        res = probe(module)
+        ok = res['elapsed'] < args.budget and not res['heavy']
+        failed = failed or not ok
+        console.log(
+            '{0}: {1:.3f}s'.format(module, res['elapsed']),
+            'heavy: {0}'.format(', '.join(res['heavy']) or '-'),
+            style='green' if ok else 'red',
+        )
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,225 @@
+"""Compare the peak memory of loading the train and test splits.
+
+Before, the splits were gathered from the embeddings by fancy indexing
+and copied into torch tensors. After, the rows are grouped by split once
+in a SplitLayout and the splits are torch views of its memory-mapped
+files. Every mode runs in a fresh interpreter, touches every value of
+both splits and reports its peak RSS, and the anonymous and file-backed
+parts of its RSS once the splits are loaded. File-backed pages are page
+cache, shared between processes and reclaimable. The full saved
+embeddings are used, or synthetic ones if there are none.
+"""
+import argparse
+import json
+import resource
+import subprocess  # noqa: S404
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from experio import const
+from experio.console import console
+from experio.core.models.dedup import embedding_paths, open_embeddings
+from experio.models import SplitLayout
+
+MODES = ('before', 'build', 'after')
+SPLIT_PERCENT = 0.8
+RANDOM_SEED = 5
+
+
+def source_paths(args: argparse.Namespace, work_path: Path) -> list[str]:
+    """Find the embeddings to split, writing synthetic ones if needed.
+
+    Args:
+        args (argparse.Namespace): Arguments of the script.
+        work_path (Path): Directory of the synthetic files.
+
+    Returns:
+        list[str]: Paths of the word and definition embeddings.
+    """
+    paths = [
+        '{0}/words_embed.npy'.format(args.base_path),
+        '{0}/def_embed.npy'.format(args.base_path),
+    ]
+    if all(
+        Path(path).is_file() or all(
+            Path(part).is_file() for part in embedding_paths(path)
+        )
+        for path in paths
+    ):
+        return paths
+
+    console.log('No saved embeddings, using {0} synthetic rows.'.format(
+        args.rows,
+    ))
+    rng = np.random.default_rng(RANDOM_SEED)
+    paths = [str(work_path / 'words.npy'), str(work_path / 'defs.npy')]
+    for path in paths:
+        out = np.lib.format.open_memmap(
+            path,
+            mode='w+',
+            dtype=np.float32,
+            shape=(args.rows, args.dim),
+        )
+        for start in range(0, args.rows, 65536):
+            stop = min(start + 65536, args.rows)
+            out[start:stop] = rng.standard_normal(
+                (stop - start, args.dim),
+                dtype=np.float32,
+            )
+        out.flush()
+        del out
+    return paths
+
+
+def split_rows(num_rows: int) -> tuple[np.ndarray, np.ndarray]:
+    """Split all rows at random.
+
+    Args:
+        num_rows (int): Number of rows.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Sorted train and test rows.
+    """
+    rng = np.random.default_rng(RANDOM_SEED)
+    mask = rng.random(num_rows) < SPLIT_PERCENT
+    rows = np.arange(num_rows)
+    return rows[mask], rows[~mask]
+
+
+def rss_parts() -> dict:
+    """Get the anonymous and file-backed RSS of this process.
+
+    Returns:
+        dict: Both parts in MiB.
+    """
+    parts = {}
+    for line in Path('/proc/self/status').read_text().splitlines():
+        name, _, value = line.partition(':')
+        if name in ('RssAnon', 'RssFile'):
+            parts['{0}_mib'.format(name[3:].lower())] = (
+                int(value.split()[0]) / 1024
+            )
+    return parts
+
+
+def run_mode(mode: str, paths: list[str], layout_path: str) -> dict:
+    """Load the splits one way, in this process.
+
+    Args:
+        mode (str): before, build or after.
+        paths (list[str]): Paths of the word and definition embeddings.
+        layout_path (str): Directory of the split layout.
+
+    Returns:
+        dict: Seconds taken and memory used.
+    """
+    inputs, targets = (open_embeddings(path) for path in paths)
+    train_rows, test_rows = split_rows(len(inputs))
+
+    start = time.perf_counter()
+    if mode == 'before':
+        splits = [
+            torch.tensor(source[rows])
+            for rows in (train_rows, test_rows)
+            for source in (inputs, targets)
+        ]
+    else:
+        layout = SplitLayout.open(
+            layout_path,
+            inputs,
+            targets,
+            {'train': train_rows, 'test': test_rows},
+            source={'paths': paths},
+        )
+        splits = [*layout.split('train'), *layout.split('test')]
+    total = sum(float(split.sum()) for split in splits)
+    seconds = time.perf_counter() - start
+
+    metrics = {'seconds': seconds, 'checksum': total, **rss_parts()}
+    metrics['rows'] = len(train_rows) + len(test_rows)
+    return metrics
+
+
+def run_child(mode: str, paths: list[str], layout_path: str) -> dict:
+    """Run one mode in a fresh interpreter.
+
+    Args:
+        mode (str): before, build or after.
+        paths (list[str]): Paths of the word and definition embeddings.
+        layout_path (str): Directory of the split layout.
+
+    Returns:
+        dict: Metrics of the mode, with its peak RSS.
+    """
+    output = subprocess.run(  # noqa: S603
+        [
+            sys.executable,
+            __file__,
+            '--mode',
+            mode,
+            '--paths',
+            *paths,
+            '--layout-path',
+            layout_path,
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--base-path', default=const.BASE_PATH)
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument(
+        '--out',
+        default=str(Path(const.BASE_PATH) / 'layout_report.json'),
+    )
+    parser.add_argument('--mode', help=argparse.SUPPRESS)
+    parser.add_argument('--paths', nargs='+', help=argparse.SUPPRESS)
+    parser.add_argument('--layout-path', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        # child process of run_child
+        metrics = run_mode(args.mode, args.paths, args.layout_path)
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        metrics['peak_rss_mib'] = rss / 1024
+        print(json.dumps(metrics))
+        sys.exit(0)
+
+    report = {}
+    with tempfile.TemporaryDirectory() as work_path:
+        paths = source_paths(args, Path(work_path))
+        layout_path = str(Path(work_path) / 'layout')
+        for mode in MODES:
+            report[mode] = run_child(mode, paths, layout_path)
+            console.log(mode, ', '.join(
+                '{0} {1:.4g}'.format(name, value)
+                for name, value in report[mode].items()
+            ))
+
+    before, after = report['before'], report['after']
+    if before['checksum'] != after['checksum']:
+        console.log('Splits differ between layouts.', style='red')
+    console.log(
+        'Peak RSS {0:.1f} MiB -> {1:.1f} MiB,'.format(
+            before['peak_rss_mib'],
+            after['peak_rss_mib'],
+        ),
+        'anonymous {0:.1f} MiB -> {1:.1f} MiB.'.format(
+            before['anon_mib'],
+            after['anon_mib'],
+        ),
+    )
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.out).write_text(json.dumps(report, indent=2))
+    console.log('Report saved to {0}.'.format(args.out))
@@ -0,0 +1,73 @@
+"""Benchmark parsing the yawipa dumps in python against julia."""
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from experio import const
+from experio.console import console
+from experio.core.dataset.stream import parse_def, parse_etym
+from experio.jl import get_julia
+
+PARSERS = (
+    ('def', parse_def),
+    ('etym', parse_etym),
+)
+
+
+def count_lines(path: str) -> int:
+    """Count the lines of a text file.
+
+    Args:
+        path (str): Path of the text file.
+
+    Returns:
+        int: Number of lines.
+    """
+    with open(path, 'rb') as txt:
+        return sum(chunk.count(b'\n') for chunk in iter(
+            lambda: txt.read(1 << 24),
+            b'',
+        ))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--base-path', default=const.BASE_PATH)
+    parser.add_argument(
+        '--julia',
+        action='store_true',
+        help='also time the julia builders with their csv step',
+    )
+    args = parser.parse_args()
+
+    for name, parse in PARSERS:
+        txt_path = str(Path(args.base_path) / '{0}.txt'.format(name))
+        num_lines = count_lines(txt_path)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.perf_counter()
+            parse(txt_path, str(Path(tmp) / '{0}.arrow'.format(name)))
+            elapsed = time.perf_counter() - start
+            console.log('{0} python: {1:.0f} lines/sec'.format(
+                name,
+                num_lines / elapsed,
+            ))
+
+        if not args.julia:
+            continue
+
+        jl = get_julia()
+        with tempfile.TemporaryDirectory() as tmp:
+            os.symlink(
+                Path(txt_path).resolve(),
+                Path(tmp) / '{0}.txt'.format(name),
+            )
+            start = time.perf_counter()
+            jl.eval('load_{0}(path="{1}/")'.format(name, tmp))
+            elapsed = time.perf_counter() - start
+            console.log('{0} julia: {1:.0f} lines/sec'.format(
+                name,
+                num_lines / elapsed,
+            ))
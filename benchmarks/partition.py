@@ -0,0 +1,151 @@
+"""Compare the partitioned dataset format against the current files.
+
+Every dataset is partitioned by language and word prefix with compressed,
+dictionary encoded batches. The script reports the disk usage of both
+layouts, and the cold read time of a full read and of a query for the
+words of a language starting with a prefix. The files are evicted from
+the page cache before every read. The query of the arrow file filters
+the memory-mapped word and lang columns, as ArrowReader does.
+"""
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable
+
+import pyarrow as pa
+
+from experio import const
+from experio.console import console
+from experio.core.dataset.partition import PartitionedDataset
+from experio.dataset import ArrowReader
+
+NAMES = ('def', 'etym', 'final')
+
+
+def evict(paths: list[Path]) -> None:
+    """Drop files from the page cache.
+
+    Args:
+        paths (list[Path]): Files to drop.
+    """
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def cold_read(paths: list[Path], read: Callable[[], int]) -> dict:
+    """Time a read of files that are not in the page cache.
+
+    Args:
+        paths (list[Path]): Files the read touches.
+        read (Callable[[], int]): Reads and returns the number of rows.
+
+    Returns:
+        dict: Seconds and number of rows read.
+    """
+    evict(paths)
+    start = time.perf_counter()
+    num_rows = read()
+    return {'seconds': time.perf_counter() - start, 'rows': num_rows}
+
+
+def compare(name: str, args: argparse.Namespace) -> dict:
+    """Partition a dataset and compare it to its arrow file.
+
+    Args:
+        name (str): Name of the dataset.
+        args (argparse.Namespace): Arguments of the script.
+
+    Returns:
+        dict: Disk usage and cold read times of both layouts.
+    """
+    arrow_path = Path(args.base_path) / '{0}.arrow'.format(name)
+    csv_path = arrow_path.with_suffix('.csv')
+    parts_path = Path(args.base_path) / '{0}.parts'.format(name)
+    dataset = PartitionedDataset.write(
+        str(arrow_path),
+        str(parts_path),
+        compression=args.compression,
+        prefix_length=args.prefix_length,
+    )
+    part_paths = [parts_path / part['file'] for part in dataset.partitions]
+
+    lang = None
+    filters = [('word', 'startswith', args.prefix)]
+    if 'lang' in ArrowReader(str(arrow_path)).schema.names:
+        lang = args.lang
+        filters.append(('lang', '==', args.lang))
+
+    report = {
+        'arrow_bytes': arrow_path.stat().st_size,
+        'csv_bytes': csv_path.stat().st_size if csv_path.is_file() else 0,
+        'partitioned_bytes': dataset.size,
+        'partitions': len(dataset.partitions),
+        'arrow_full': cold_read(
+            [arrow_path],
+            lambda: pa.ipc.open_file(
+                pa.OSFile(str(arrow_path)),
+            ).read_all().num_rows,
+        ),
+        'partitioned_full': cold_read(
+            part_paths,
+            lambda: dataset.table().num_rows,
+        ),
+        'arrow_query': cold_read(
+            [arrow_path],
+            lambda: ArrowReader(str(arrow_path)).table(
+                filters=filters,
+            ).num_rows,
+        ),
+        'partitioned_query': cold_read(
+            part_paths,
+            lambda: dataset.table(lang=lang, prefix=args.prefix).num_rows,
+        ),
+    }
+    report['size_ratio'] = report['partitioned_bytes'] / report['arrow_bytes']
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--base-path', default=const.BASE_PATH)
+    parser.add_argument('--names', nargs='+', default=list(NAMES))
+    parser.add_argument('--compression', default='zstd')
+    parser.add_argument('--prefix-length', type=int, default=1)
+    parser.add_argument('--lang', default='eng')
+    parser.add_argument('--prefix', default='ab')
+    parser.add_argument(
+        '--out',
+        default=str(Path(const.BASE_PATH) / 'partition_report.json'),
+    )
+    args = parser.parse_args()
+
+    reports = {}
+    for name in args.names:
+        reports[name] = compare(name, args)
+        report = reports[name]
+        console.log(
+            '{0}: {1:.1f} MiB arrow, {2:.1f} MiB partitioned,'.format(
+                name,
+                report['arrow_bytes'] / (1 << 20),
+                report['partitioned_bytes'] / (1 << 20),
+            ),
+            'cold full read {0:.3f}s -> {1:.3f}s,'.format(
+                report['arrow_full']['seconds'],
+                report['partitioned_full']['seconds'],
+            ),
+            'cold query {0:.3f}s -> {1:.3f}s.'.format(
+                report['arrow_query']['seconds'],
+                report['partitioned_query']['seconds'],
+            ),
+        )
+
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.out).write_text(json.dumps(reports, indent=2))
+    console.log('Report saved to {0}.'.format(args.out))
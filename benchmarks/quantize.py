@@ -0,0 +1,62 @@
+"""Compare the int8 quantized encoder with the float32 one.
+
+Definitions sampled from the dataset are embedded by both encoders. The
+script reports how closely the int8 embeddings agree with the float32
+ones (cosine similarity and nearest neighbour overlap among the sampled
+definitions) and the throughput of both, and saves the report as JSON.
+"""
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+
+from experio import const
+from experio.console import console
+from experio.core.models.encoder import MODEL
+from experio.dataset import ArrowReader
+from experio.models import Encoder, compare_encoders
+
+RANDOM_SEED = 5
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--file-path',
+        default=str(Path(const.BASE_PATH) / 'final.arrow'),
+    )
+    parser.add_argument('--model-name', default=MODEL)
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--token-budget', type=int, default=None)
+    parser.add_argument('--threads', type=int, default=None)
+    parser.add_argument(
+        '--out',
+        default=str(Path(const.BASE_PATH) / 'quantize_report.json'),
+    )
+    args = parser.parse_args()
+
+    if args.threads is not None:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    definitions = ArrowReader(args.file_path).column('def')
+    rng = np.random.default_rng(RANDOM_SEED)
+    sample = rng.choice(
+        len(definitions),
+        size=min(args.rows, len(definitions)),
+        replace=False,
+    )
+    texts = definitions.take(np.sort(sample)).to_pylist()
+
+    report = compare_encoders(
+        Encoder(args.model_name, args.token_budget),
+        Encoder(args.model_name, args.token_budget, quantize=True),
+        texts,
+        k_neighbors=args.k,
+    )
+    for name, value in report.items():
+        console.log('{0}: {1:.4g}'.format(name, value))
+
+    Path(args.out).write_text(json.dumps(report, indent=2))
+    console.log('Report saved to {0}.'.format(args.out))
@@ -0,0 +1,86 @@
+"""Benchmark reading the dataset, whole into pandas against streaming.
+
+Every reader runs in a fresh interpreter, which reports its peak RSS and
+the time until its first batch of rows is available.
+"""
+import argparse
+import json
+import subprocess  # noqa: S404
+import sys
+from pathlib import Path
+
+from experio import const
+from experio.console import console
+
+PROBE = """
+import json, resource, time
+{0}
+start = time.perf_counter()
+{1}
+first = time.perf_counter() - start
+{2}
+total = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{'first': first, 'total': total, 'rss': rss}}))
+"""
+READERS = {
+    'pandas (read_all)': (
+        'import pandas, pyarrow as pa',
+        'df = pa.ipc.open_file({0!r}).read_all().to_pandas()',
+        'len(df)',
+    ),
+    'stream all columns': (
+        'from experio.dataset import ArrowReader',
+        'batches = ArrowReader({0!r}).batches()\n'
+        'next(batches)',
+        'sum(batch.num_rows for batch in batches)',
+    ),
+    'stream def column': (
+        'from experio.dataset import ArrowReader',
+        'batches = ArrowReader({0!r}).batches(["def"])\n'
+        'next(batches)',
+        'sum(batch.num_rows for batch in batches)',
+    ),
+    'table word column': (
+        'from experio.dataset import ArrowReader',
+        'words = ArrowReader({0!r}).column("word")',
+        'len(words)',
+    ),
+}
+
+
+def probe(setup: str, first: str, rest: str) -> dict:
+    """Run a reader in a fresh interpreter.
+
+    Args:
+        setup (str): Imports, not timed.
+        first (str): Code producing the first batch.
+        rest (str): Code consuming the remaining rows.
+
+    Returns:
+        dict: Time to first batch, total time and peak RSS in KiB.
+    """
+    output = subprocess.run(  # noqa: S603
+        [sys.executable, '-c', PROBE.format(setup, first, rest)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--file-path',
+        default=str(Path(const.BASE_PATH) / 'final.arrow'),
+    )
+    args = parser.parse_args()
+
+    for name, (setup, first, rest) in READERS.items():
+        res = probe(setup, first.format(args.file_path), rest)
+        console.log(
+            '{0}: first batch {1:.3f}s,'.format(name, res['first']),
+            'total {0:.3f}s,'.format(res['total']),
+            'peak RSS {0:.1f} MiB'.format(res['rss'] / 1024),
+        )
@@ -0,0 +1,152 @@
+"""Load generator for the definition retrieval service.
+
+Concurrent clients send definition requests over keep-alive connections
+to a running scripts/serve.py and the script reports the latency
+percentiles and the request rate.
+"""
+import argparse
+import asyncio
+import json
+import time
+from typing import Optional
+
+import numpy as np
+
+from experio.console import console
+
+TEXTS = (
+    'mesogenic from Ancient Greek',
+    'biological from biology',
+    'thing from Old English',
+    'word from Proto-Germanic',
+)
+
+
+async def connect(
+    host: str,
+    port: int,
+    unix_path: Optional[str],
+) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """Open a connection to the service.
+
+    Args:
+        host (str): Host of the service.
+        port (int): Port of the service.
+        unix_path (Optional[str]): Unix socket of the service.
+
+    Returns:
+        tuple[asyncio.StreamReader, asyncio.StreamWriter]: The streams.
+    """
+    if unix_path is None:
+        return await asyncio.open_connection(host, port)
+    return await asyncio.open_unix_connection(unix_path)
+
+
+async def request(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    text: str,
+    k_neighbors: int,
+) -> dict:
+    """Send one definition request and read its response.
+
+    Args:
+        reader (asyncio.StreamReader): Stream of the responses.
+        writer (asyncio.StreamWriter): Stream of the requests.
+        text (str): Text to define.
+        k_neighbors (int): Number of definitions.
+
+    Returns:
+        dict: Response of the service.
+
+    Raises:
+        OSError: If the service answers with an error.
+    """
+    body = json.dumps({'text': text, 'k': k_neighbors}).encode()
+    writer.write(
+        b'POST /define HTTP/1.1\r\nHost: experio\r\n'
+        + 'Content-Length: {0}\r\n\r\n'.format(len(body)).encode()
+        + body,
+    )
+    await writer.drain()
+
+    status = (await reader.readline()).split(b' ')[1]
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in {b'\r\n', b''}:
+            break
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+            length = int(value)
+    payload = await reader.readexactly(length)
+    if status != b'200':
+        raise OSError('Service answered {0}: {1}'.format(status, payload))
+    return json.loads(payload)
+
+
+async def client(args: argparse.Namespace, count: int) -> list[float]:
+    """Send requests one after the other over one connection.
+
+    Args:
+        args (argparse.Namespace): Arguments of the script.
+        count (int): Number of requests.
+
+    Returns:
+        list[float]: Latency of every request in seconds.
+    """
+    reader, writer = await connect(args.host, args.port, args.unix_path)
+    latencies = []
+    try:
+        for it in range(count):
+            start = time.perf_counter()
+            await request(reader, writer, TEXTS[it % len(TEXTS)], args.k)
+            latencies.append(time.perf_counter() - start)
+    finally:
+        writer.close()
+    return latencies
+
+
+async def generate_load(args: argparse.Namespace) -> None:
+    """Run the clients and report latency and throughput.
+
+    Args:
+        args (argparse.Namespace): Arguments of the script.
+    """
+    per_client = max(args.requests // args.concurrency, 1)
+    start = time.perf_counter()
+    results = await asyncio.gather(*[
+        client(args, per_client) for _ in range(args.concurrency)
+    ])
+    elapsed = time.perf_counter() - start
+
+    latencies = np.concatenate(results) * 1000
+    p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+    console.log(
+        '{0} requests from {1} clients:'.format(
+            len(latencies),
+            args.concurrency,
+        ),
+        'p50 {0:.1f} ms, p90 {1:.1f} ms, p99 {2:.1f} ms,'.format(
+            p50,
+            p90,
+            p99,
+        ),
+        '{0:.0f} requests/sec'.format(len(latencies) / elapsed),
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--unix-path', default=None)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', nargs='+', type=int, default=[64])
+    parser.add_argument('--k', type=int, default=3)
+    args = parser.parse_args()
+
+    for concurrency in args.concurrency:
+        asyncio.run(generate_load(argparse.Namespace(
+            **dict(vars(args), concurrency=concurrency),
+        )))
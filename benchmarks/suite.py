@@ -0,0 +1,268 @@
+"""Offline benchmark suite of every pipeline stage.
+
+Every stage runs at every dataset size in a fresh interpreter on
+synthetic data, with a tiny random transformer in place of the pretrained
+model, so no network is needed. Results are saved as JSON and can be
+compared with the results of a previous run.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess  # noqa: S404
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from experio import const
+from experio.console import console
+
+STAGES = ('etl', 'embed', 'train', 'search')
+SIZES = (1000, 10000, 100000)
+DIM = 768
+QUERIES = 200
+RANDOM_SEED = 5
+
+# metrics where lower is better, the others are throughputs
+LOWER_IS_BETTER = ('ms', 'mib')
+
+
+def bench_etl(size: int, work_path: Path) -> dict:
+    """Benchmark parsing the yawipa dumps and joining them.
+
+    Args:
+        size (int): Number of words.
+        work_path (Path): Directory of the synthetic files.
+
+    Returns:
+        dict: Lines per second of both dumps and final rows per second.
+    """
+    from synthetic import write_def_dump, write_etym_dump
+
+    from experio.core.dataset.clean import build_final
+    from experio.core.dataset.stream import parse_def, parse_etym
+
+    results = {}
+    for name, write, parse in (
+        ('def', write_def_dump, parse_def),
+        ('etym', write_etym_dump, parse_etym),
+    ):
+        txt_path = str(work_path / '{0}.txt'.format(name))
+        num_lines = write(txt_path, size)
+        start = time.perf_counter()
+        parse(txt_path, str(work_path / '{0}.arrow'.format(name)))
+        elapsed = time.perf_counter() - start
+        results['{0}_lines_per_sec'.format(name)] = num_lines / elapsed
+
+    start = time.perf_counter()
+    num_rows = build_final(
+        str(work_path / 'etym.arrow'),
+        str(work_path / 'def.arrow'),
+        str(work_path / 'final.arrow'),
+    )
+    results['final_rows_per_sec'] = num_rows / (time.perf_counter() - start)
+    return results
+
+
+def bench_embed(size: int, work_path: Path) -> dict:
+    """Benchmark embedding definitions with the tiny transformer.
+
+    Args:
+        size (int): Number of definitions.
+        work_path (Path): Directory of the tiny model.
+
+    Returns:
+        dict: Rows per second with fixed and token budget batches.
+    """
+    from synthetic import random_words, sentence, write_tiny_model
+
+    from experio.models import Encoder
+
+    model_path = write_tiny_model(str(work_path / 'model'))
+    rng = np.random.default_rng(RANDOM_SEED)
+    vocab = random_words(rng, 2048)
+    texts = [sentence(rng, vocab, rng.integers(3, 30)) for _ in range(size)]
+
+    results = {}
+    for name, token_budget in (('fixed', None), ('token_budget', 8192)):
+        encoder = Encoder(model_name=model_path)
+        start = time.perf_counter()
+        encoder.batch_embeddings(
+            texts,
+            token_budget=token_budget,
+            verbose=False,
+        )
+        elapsed = time.perf_counter() - start
+        results['{0}_rows_per_sec'.format(name)] = size / elapsed
+    return results
+
+
+def bench_train(size: int, work_path: Path) -> dict:
+    """Benchmark one training epoch of the predictor.
+
+    Args:
+        size (int): Number of training rows.
+        work_path (Path): Unused.
+
+    Returns:
+        dict: Training samples per second.
+    """
+    import torch
+
+    from experio.training import build_predictor, train_predictor
+
+    generator = torch.Generator().manual_seed(RANDOM_SEED)
+    train_x = torch.randn(size, DIM, generator=generator)
+    train_y = torch.randn(size, DIM, generator=generator)
+    model = build_predictor(DIM, DIM)
+    start = time.perf_counter()
+    train_predictor(model, train_x, train_y, epochs=1)
+    elapsed = time.perf_counter() - start
+    return {'samples_per_sec': size / elapsed}
+
+
+def bench_search(size: int, work_path: Path) -> dict:
+    """Benchmark exact nearest neighbour queries.
+
+    Args:
+        size (int): Number of searched embeddings.
+        work_path (Path): Unused.
+
+    Returns:
+        dict: Latency percentiles of single queries and batch throughput.
+    """
+    from experio.search import ExactSearch
+
+    rng = np.random.default_rng(RANDOM_SEED)
+    embeddings = rng.normal(size=(size, DIM)).astype(np.float32)
+    queries = rng.normal(size=(QUERIES, DIM)).astype(np.float32)
+    search = ExactSearch(embeddings)
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        search.search(query, 10)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    search.search(queries, 10)
+    elapsed = time.perf_counter() - start
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'p50_ms': p50,
+        'p95_ms': p95,
+        'p99_ms': p99,
+        'batch_queries_per_sec': QUERIES / elapsed,
+    }
+
+
+BENCHMARKS = {
+    'etl': bench_etl,
+    'embed': bench_embed,
+    'train': bench_train,
+    'search': bench_search,
+}
+
+
+def run_stage(stage: str, size: int, work_path: str) -> dict:
+    """Run one stage in a fresh interpreter.
+
+    Args:
+        stage (str): Name of the stage.
+        size (int): Dataset size.
+        work_path (str): Directory of the synthetic files.
+
+    Returns:
+        dict: Metrics of the stage, with its peak RSS.
+    """
+    env = dict(os.environ, HF_HUB_OFFLINE='1', TRANSFORMERS_OFFLINE='1')
+    output = subprocess.run(  # noqa: S603
+        [
+            sys.executable,
+            __file__,
+            '--stage',
+            stage,
+            '--size',
+            str(size),
+            '--work-path',
+            work_path,
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+        env=env,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def compare(results: dict, baseline: dict) -> None:
+    """Log every metric next to its value in a baseline run.
+
+    Args:
+        results (dict): Results of this run.
+        baseline (dict): Results of the baseline run.
+    """
+    for key, metrics in results.items():
+        for name, value in metrics.items():
+            old = baseline.get(key, {}).get(name)
+            if not old:
+                continue
+            ratio = value / old
+            better = ratio < 1 if name.endswith(LOWER_IS_BETTER) else ratio > 1
+            console.log(
+                '{0} {1}: {2:.4g} vs {3:.4g} ({4:+.1%})'.format(
+                    key,
+                    name,
+                    value,
+                    old,
+                    ratio - 1,
+                ),
+                style='green' if better else 'red',
+            )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--stages', nargs='+', default=STAGES)
+    parser.add_argument('--sizes', nargs='+', type=int, default=SIZES)
+    parser.add_argument(
+        '--out',
+        default=str(Path(const.BASE_PATH) / 'benchmarks' / '{0}.json'.format(
+            time.strftime('%Y%m%d-%H%M%S'),
+        )),
+    )
+    parser.add_argument('--baseline', help='results of a previous run')
+    parser.add_argument('--stage', help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--work-path', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        # child process of run_stage
+        metrics = BENCHMARKS[args.stage](args.size, Path(args.work_path))
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        metrics['peak_rss_mib'] = rss / 1024
+        print(json.dumps(metrics))
+        sys.exit(0)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as work_path:
+        for stage in args.stages:
+            for size in args.sizes:
+                key = '{0}/{1}'.format(stage, size)
+                results[key] = run_stage(stage, size, work_path)
+                console.log(key, ', '.join(
+                    '{0} {1:.4g}'.format(name, value)
+                    for name, value in results[key].items()
+                ))
+
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    Path(args.out).write_text(json.dumps(results, indent=2))
+    console.log('Results saved to {0}.'.format(args.out))
+
+    if args.baseline:
+        compare(results, json.loads(Path(args.baseline).read_text()))
@@ -0,0 +1,167 @@
+"""Synthetic inputs for the offline benchmarks.
+
+The generators write text dumps in the yawipa format and a tiny randomly
+initialized transformer, so every pipeline stage can be benchmarked
+without downloading the dumps or the pretrained model.
+"""
+import string
+from pathlib import Path
+
+import numpy as np
+
+LANGS = ('eng', 'eng', 'eng', 'fra', 'deu')
+POS = ('Noun', 'Verb', 'Adjective', 'Adverb', 'Proper noun')
+SPECIAL_TOKENS = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]']
+
+
+def random_words(
+    rng: np.random.Generator,
+    num_words: int,
+    min_len: int = 2,
+    max_len: int = 12,
+) -> list[str]:
+    """Generate random lowercase words.
+
+    Args:
+        rng (np.random.Generator): Random generator.
+        num_words (int): Number of words.
+        min_len (int): Minimum number of letters.
+        max_len (int): Maximum number of letters.
+
+    Returns:
+        list[str]: The words.
+    """
+    letters = np.array(list(string.ascii_lowercase))
+    lengths = rng.integers(min_len, max_len + 1, size=num_words)
+    codes = rng.integers(0, len(letters), size=int(lengths.sum()))
+    chars = letters[codes]
+    ends = np.cumsum(lengths)
+    return [
+        ''.join(chars[end - length:end])
+        for end, length in zip(ends, lengths)
+    ]
+
+
+def sentence(rng: np.random.Generator, vocab: list[str], size: int) -> str:
+    """Build a sentence of random words of a vocabulary.
+
+    Args:
+        rng (np.random.Generator): Random generator.
+        vocab (list[str]): Words to draw from.
+        size (int): Number of words.
+
+    Returns:
+        str: The sentence.
+    """
+    return ' '.join(vocab[it] for it in rng.integers(0, len(vocab), size))
+
+
+def write_def_dump(
+    path: str,
+    num_words: int,
+    defs_per_word: int = 3,
+    seed: int = 5,
+) -> int:
+    """Write a synthetic yawipa definitions dump.
+
+    Lines are lang, word, part of speech, a sense field and the
+    definition, tab separated. Some definitions start with a wiki
+    template, as in the real dump.
+
+    Args:
+        path (str): Path of def.txt.
+        num_words (int): Number of distinct words.
+        defs_per_word (int): Maximum number of definitions per word.
+        seed (int): Random seed.
+
+    Returns:
+        int: Number of lines written.
+    """
+    rng = np.random.default_rng(seed)
+    words = random_words(rng, num_words)
+    vocab = random_words(rng, 2048)
+    num_lines = 0
+    with open(path, 'w') as txt:
+        for word in words:
+            lang = LANGS[rng.integers(len(LANGS))]
+            pos = POS[rng.integers(len(POS))]
+            for _ in range(rng.integers(1, defs_per_word + 1)):
+                definition = sentence(rng, vocab, rng.integers(3, 30))
+                if rng.random() < 0.2:
+                    definition = '{{lb|en|rare}} ' + definition
+                txt.write('{0}\t{1}\t{2}\tsense\t{3}\n'.format(
+                    lang,
+                    word,
+                    pos,
+                    definition,
+                ))
+                num_lines += 1
+    return num_lines
+
+
+def write_etym_dump(path: str, num_words: int, seed: int = 5) -> int:
+    """Write a synthetic yawipa etymologies dump.
+
+    Uses the same seed as write_def_dump so the words of both dumps
+    match.
+
+    Args:
+        path (str): Path of etym.txt.
+        num_words (int): Number of distinct words.
+        seed (int): Random seed.
+
+    Returns:
+        int: Number of lines written.
+    """
+    rng = np.random.default_rng(seed)
+    words = random_words(rng, num_words)
+    vocab = random_words(rng, 2048)
+    with open(path, 'w') as txt:
+        for word in words:
+            lang = LANGS[rng.integers(len(LANGS))]
+            roots = '\t'.join(
+                'inh\tenm\t{0}'.format(vocab[it])
+                for it in rng.integers(0, len(vocab), rng.integers(1, 4))
+            )
+            txt.write('{0}\t{1}\tetym\t1\t{2}\n'.format(lang, word, roots))
+    return num_words
+
+
+def write_tiny_model(path: str, hidden_size: int = 64, seed: int = 5) -> str:
+    """Save a tiny randomly initialized BERT model and tokenizer.
+
+    The directory can be passed as model_name wherever the pretrained
+    model is expected. Its vocabulary holds single letters and their
+    word-piece continuations, so any lowercase text tokenizes.
+
+    Args:
+        path (str): Directory of the model.
+        hidden_size (int): Size of the embeddings.
+        seed (int): Random seed of the weights.
+
+    Returns:
+        str: Directory of the model.
+    """
+    import torch
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    if (Path(path) / 'config.json').is_file():
+        return path
+
+    Path(path).mkdir(parents=True, exist_ok=True)
+    letters = list(string.ascii_lowercase + string.digits)
+    vocab = SPECIAL_TOKENS + letters + ['##{0}'.format(it) for it in letters]
+    vocab_path = Path(path) / 'vocab.txt'
+    vocab_path.write_text('\n'.join(vocab))
+    BertTokenizerFast(str(vocab_path)).save_pretrained(path)
+
+    torch.manual_seed(seed)
+    model = BertModel(BertConfig(
+        vocab_size=len(vocab),
+        hidden_size=hidden_size,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=hidden_size * 2,
+    ))
+    model.save_pretrained(path)
+    return path
@@ -0,0 +1,235 @@
+"""Clean and join the parsed yawipa datasets into the final dataset.
+
+A columnar equivalent of clean_etym, clean_def and innerjoin in experio.jl.
+Only the word and row number of the english rows are held in memory while
+grouping and joining, the text columns are read from the memory-mapped
+input files once the final rows are known.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from experio.console import console
+from experio.core.dataset.reader import ROW_COLUMN, ArrowReader, Filter
+
+FINAL_SCHEMA = pa.schema([
+    ('word', pa.string()),
+    ('etym', pa.string()),
+    ('def', pa.string()),
+])
+ETYM_FILTERS = [('lang', '==', 'eng')]
+DEF_FILTERS = [('lang', '==', 'eng'), ('pos', '!=', 'Proper noun')]
+MAX_DEFS = 3
+
+# r"{{.*}}\s" of experio.jl. Julia compiles it with PCRE2 UCP, where \s
+# also matches unicode spaces, which the \s of RE2 does not
+CONTEXT_REGEX = r'\{\{.*\}\}[\t\n\v\f\r\p{Z}]'
+
+
+def filtered_words(
+    reader: ArrowReader,
+    filters: list[Filter],
+    workers: int,
+    batch_size: int = 1 << 18,
+) -> tuple[pa.ChunkedArray, np.ndarray]:
+    """Find the rows of a file that match filters, with their word.
+
+    Batches are filtered in parallel threads, the arrow kernels release
+    the GIL.
+
+    Args:
+        reader (ArrowReader): Reader of the file.
+        filters (list[Filter]): Filters rows must match.
+        workers (int): Number of threads.
+        batch_size (int): Number of rows filtered at once.
+
+    Returns:
+        tuple[pa.ChunkedArray, np.ndarray]: Word and row number of every
+            matching row, in file order.
+    """
+    columns = ['word'] + sorted({name for name, _, _ in filters} - {'word'})
+
+    def select(batch: pa.RecordBatch) -> pa.RecordBatch:
+        batch = batch.filter(reader.mask(batch, filters))
+        return pa.RecordBatch.from_arrays(
+            [batch.column(0), batch.column(batch.num_columns - 1)],
+            names=['word', ROW_COLUMN],
+        )
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        batches = list(pool.map(select, reader.batches(
+            columns,
+            batch_size=batch_size,
+            row_index=True,
+        )))
+    table = pa.Table.from_batches(batches, schema=pa.schema([
+        ('word', pa.string()),
+        (ROW_COLUMN, pa.int64()),
+    ]))
+    return table.column('word'), table.column(ROW_COLUMN).to_numpy()
+
+
+def group_heads(
+    words: pa.ChunkedArray,
+    rows: np.ndarray,
+    size: int,
+) -> tuple[pa.Array, np.ndarray, np.ndarray]:
+    """Keep the first rows of every word.
+
+    Args:
+        words (pa.ChunkedArray): Word of every row.
+        rows (np.ndarray): Row numbers, increasing.
+        size (int): Number of rows kept per word.
+
+    Returns:
+        tuple[pa.Array, np.ndarray, np.ndarray]: Word, row number and row
+            number of the first row of the word, of the kept rows ordered
+            by word and then row.
+    """
+    # stable, so the rows of a word stay in file order
+    order = pc.sort_indices(words).to_numpy()
+    ordered = words.take(pa.array(order)).combine_chunks()
+    changes = np.empty(len(order), dtype=bool)
+    changes[:1] = True
+    changes[1:] = pc.not_equal(ordered[1:], ordered[:-1]).to_numpy(
+        zero_copy_only=False,
+    )
+    starts = np.flatnonzero(changes)
+    groups = np.cumsum(changes) - 1
+    ranks = np.arange(len(order)) - starts[groups]
+
+    keep = np.flatnonzero(ranks < size)
+    return (
+        ordered.take(pa.array(keep)),
+        rows[order[keep]],
+        rows[order[starts[groups[keep]]]],
+    )
+
+
+def final_rows(
+    etym_path: str,
+    def_path: str,
+    workers: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Find the etymology and definition row of every final row.
+
+    The english etymologies keep their first row per word, the english
+    definitions that are not proper nouns their first three rows per word,
+    and both are joined on the word.
+
+    DataFrames groups by order of first appearance, and its innerjoin
+    probes the longer table in its order. So the final rows follow the
+    first definition of their word when there are more definitions than
+    etymologies, and the etymology of their word otherwise, and the
+    definitions of a word stay in file order.
+
+    Args:
+        etym_path (str): Path of etym.arrow.
+        def_path (str): Path of def.arrow.
+        workers (int): Number of threads.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Etymology and definition row
+            numbers of the final rows, in order.
+    """
+    etym_words, etym_rows, _ = group_heads(
+        *filtered_words(ArrowReader(etym_path), ETYM_FILTERS, workers),
+        size=1,
+    )
+    def_words, def_rows, def_firsts = group_heads(
+        *filtered_words(ArrowReader(def_path), DEF_FILTERS, workers),
+        size=MAX_DEFS,
+    )
+
+    # etymology words are unique, so every definition matches at most one
+    matches = pc.index_in(def_words, value_set=etym_words)
+    found = np.flatnonzero(pc.is_valid(matches).to_numpy(
+        zero_copy_only=False,
+    ))
+    matched_etyms = etym_rows[pc.fill_null(matches, 0).to_numpy()[found]]
+    def_rows = def_rows[found]
+
+    if len(def_words) > len(etym_words):
+        order = np.lexsort((def_rows, def_firsts[found]))
+    else:
+        order = np.lexsort((def_rows, matched_etyms))
+    return matched_etyms[order], def_rows[order]
+
+
+def build_final(
+    etym_path: str,
+    def_path: str,
+    final_path: str,
+    workers: Optional[int] = None,
+    batch_size: int = 65536,
+) -> int:
+    """Clean and join the parsed datasets into the final arrow file.
+
+    The output matches load_dataset in experio.jl row for row. Batches of
+    final rows are gathered and cleaned in parallel threads and written in
+    order, so memory is bounded by the row numbers and a few batches. The
+    file is written under a temporary name and only renamed into place
+    once complete.
+
+    Args:
+        etym_path (str): Path of etym.arrow.
+        def_path (str): Path of def.arrow.
+        final_path (str): Path of final.arrow.
+        workers (Optional[int]): Number of threads. Defaults to the number
+            of cores.
+        batch_size (int): Number of rows per written batch.
+
+    Returns:
+        int: Number of rows written.
+    """
+    workers = workers or os.cpu_count() or 1
+    console.log('Cleaning {0} and {1} into {2}.'.format(
+        etym_path,
+        def_path,
+        final_path,
+    ))
+    start = time.perf_counter()
+    etym_rows, def_rows = final_rows(etym_path, def_path, workers)
+
+    etyms = ArrowReader(etym_path).column('etym')
+    def_table = ArrowReader(def_path).table(['word', 'def'])
+
+    def gather(offset: int) -> pa.RecordBatch:
+        etym_idxs = pa.array(etym_rows[offset:offset + batch_size])
+        def_idxs = pa.array(def_rows[offset:offset + batch_size])
+        defs = pc.replace_substring_regex(
+            def_table.column('def').take(def_idxs).combine_chunks(),
+            pattern=CONTEXT_REGEX,
+            replacement='',
+        )
+        return pa.RecordBatch.from_arrays(
+            [
+                def_table.column('word').take(def_idxs).combine_chunks(),
+                etyms.take(etym_idxs).combine_chunks(),
+                defs,
+            ],
+            schema=FINAL_SCHEMA,
+        )
+
+    tmp_path = '{0}.tmp'.format(final_path)
+    offsets = list(range(0, len(def_rows), batch_size))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        with pa.OSFile(tmp_path, 'wb') as sink:
+            with pa.ipc.new_file(sink, FINAL_SCHEMA) as writer:
+                # a few batches in flight at a time
+                for it in range(0, len(offsets), workers):
+                    for batch in pool.map(gather, offsets[it:it + workers]):
+                        writer.write_batch(batch)
+    os.replace(tmp_path, final_path)
+
+    console.log('Wrote {0} rows in {1:.1f}s.'.format(
+        len(def_rows),
+        time.perf_counter() - start,
+    ))
+    return len(def_rows)
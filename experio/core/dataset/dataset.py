@@ -1,14 +1,13 @@
 """Module for dataset object."""
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
-from urllib.request import urlretrieve
-
-from tqdm import tqdm
 
 from experio import const
 from experio.console import console
-from experio.core.dataset.download import report_hook
+from experio.core.dataset.download import download
+from experio.metrics import metrics
 
 
 class Dataset(object):
@@ -23,6 +22,8 @@ class Dataset(object):
         name: str,
         url: str,
         base_path: Optional[str] = const.BASE_PATH,
+        sha256: Optional[str] = None,
+        fetch: bool = True,
     ):
         """Initialize dataset object.
 
@@ -30,33 +31,64 @@ class Dataset(object):
             name (str): Name of dataset.
             url (str): URL of dataset.
             base_path (Optional[str]): Base path of the dataset.
+            sha256 (Optional[str]): Expected sha256 hex digest of the
+                dataset, or None to only verify its size.
+            fetch (bool): Whether to download the dataset if it is
+                missing. Use download_datasets to download several
+                datasets at once.
         """
         self.name = name
         self.url = url
         self.base_path = base_path
+        self.sha256 = sha256
         self.file_path = '{0}.txt'.format(Path(self.base_path) / self.name)
+        self.arrow_path = '{0}.arrow'.format(Path(self.base_path) / self.name)
 
         # download text file
-        if not Path(self.file_path).is_file():
+        if fetch and not Path(self.file_path).is_file():
             console.log('Dataset not found.')
             self.download()
 
-    def download(self) -> None:
-        """Download dataset."""
+    def download(self, position: int = 0) -> None:
+        """Download dataset.
+
+        The file only appears at file_path once it is complete and
+        verified, and an interrupted download resumes where it stopped.
+
+        Args:
+            position (int): Line of the progress bar.
+        """
         console.log(
             'Downloading "{0}" to {1}.'.format(self.url, self.file_path),
         )
-        # progress bar
-        with tqdm(
-            unit='B',
-            unit_scale=True,
-            unit_divisor=1024,
-            miniters=1,
-            desc=self.file_path,
-        ) as tq:
-            urlretrieve(
+        with metrics.timer('dataset.download') as stage:
+            download(
                 self.url,
-                filename=self.file_path,
-                reporthook=report_hook(tq),
-                data=None,
+                self.file_path,
+                sha256=self.sha256,
+                position=position,
             )
+            stage.add(Path(self.file_path).stat().st_size)
+
+
+def download_datasets(datasets: list[Dataset]) -> None:
+    """Download the missing datasets concurrently.
+
+    Args:
+        datasets (list[Dataset]): Datasets to download.
+    """
+    missing = [
+        dataset for dataset in datasets
+        if not Path(dataset.file_path).is_file()
+    ]
+    if not missing:
+        return
+
+    console.log('{0} datasets not found.'.format(len(missing)))
+    with ThreadPoolExecutor(max_workers=len(missing)) as pool:
+        futures = [
+            pool.submit(dataset.download, position)
+            for position, dataset in enumerate(missing)
+        ]
+        for future in futures:
+            future.result()
@@ -1,7 +1,23 @@
 """Module for downloading and extracting data-files from the internet."""
 
+import hashlib
+import json
+import os
+import zlib
+from pathlib import Path
+from typing import Optional
+
+import requests
+import urllib3
 from tqdm import tqdm
 
+from experio.console import console
+
+CHUNK_SIZE = 1 << 20
+TIMEOUT = 60
+ENCODINGS = ('gzip', 'deflate')
+TRANSFER_ERRORS = (requests.RequestException, urllib3.exceptions.HTTPError)
+
 
 def report_hook(instance: tqdm):
     """Wrap tqdm instance.
@@ -28,3 +44,179 @@ def report_hook(instance: tqdm):
         last_b[0] = blocks
 
     return update_to
+
+
+def download(
+    url: str,
+    file_path: str,
+    sha256: Optional[str] = None,
+    retries: int = 3,
+    position: int = 0,
+) -> None:
+    """Download a file, resuming from a partial download.
+
+    The transfer is written to file_path.part, with the transfer encoding
+    and validator of the response in file_path.part.json. A dropped
+    connection resumes with an HTTP Range request, and the file is only
+    decoded, verified and renamed to file_path once it is complete.
+
+    Args:
+        url (str): URL of the file.
+        file_path (str): Path of the downloaded file.
+        sha256 (Optional[str]): Expected sha256 hex digest of the file.
+        retries (int): Number of times a dropped transfer is resumed.
+        position (int): Line of the progress bar.
+
+    Raises:
+        OSError: If the transfer stays incomplete or the file does not
+            match its checksum.
+    """
+    part_path = '{0}.part'.format(file_path)
+    for attempt in range(retries + 1):
+        if attempt:
+            console.log('Resuming "{0}".'.format(url))
+        try:
+            complete = _transfer(url, part_path, position)
+        except TRANSFER_ERRORS as error:
+            console.log('Download of "{0}" failed: {1}'.format(url, error))
+            complete = False
+        if complete:
+            break
+    else:
+        raise OSError('Download of "{0}" is incomplete.'.format(url))
+
+    meta = json.loads(Path('{0}.json'.format(part_path)).read_text())
+    tmp_path = '{0}.tmp'.format(file_path)
+    digest = _decode(part_path, tmp_path, meta['encoding'])
+    if sha256 is not None and digest != sha256:
+        os.remove(tmp_path)
+        raise OSError('Checksum of "{0}" does not match.'.format(url))
+
+    os.replace(tmp_path, file_path)
+    os.remove(part_path)
+    os.remove('{0}.json'.format(part_path))
+
+
+def _transfer(url: str, part_path: str, position: int) -> bool:
+    meta_path = Path('{0}.json'.format(part_path))
+    meta = {}
+    if meta_path.is_file() and Path(part_path).is_file():
+        meta = json.loads(meta_path.read_text())
+    offset = Path(part_path).stat().st_size if meta else 0
+
+    headers = {'Accept-Encoding': ', '.join(ENCODINGS)}
+    if offset:
+        headers['Range'] = 'bytes={0}-'.format(offset)
+        if meta.get('validator'):
+            # the server sends the whole file if it changed since
+            headers['If-Range'] = meta['validator']
+
+    with requests.get(
+        url,
+        headers=headers,
+        stream=True,
+        timeout=TIMEOUT,
+    ) as response:
+        if response.status_code == 416 and offset == meta.get('length'):
+            return True
+        response.raise_for_status()
+
+        if response.status_code == 206 and not _range_matches(
+            response.headers.get('Content-Range'),
+            offset,
+            meta.get('length'),
+        ):
+            # appending another range would corrupt the part file
+            console.log('Unexpected range for "{0}", restarting.'.format(
+                url,
+            ))
+            meta_path.unlink()
+            os.remove(part_path)
+            return False
+
+        if response.status_code != 206:
+            offset = 0
+            meta = {
+                'encoding': response.headers.get('Content-Encoding'),
+                'validator': response.headers.get(
+                    'ETag',
+                    response.headers.get('Last-Modified'),
+                ),
+                'length': _length(response.headers.get('Content-Length')),
+            }
+            meta_path.write_text(json.dumps(meta))
+
+        with open(part_path, 'ab') as part:
+            part.truncate(offset)
+            with tqdm(
+                unit='B',
+                unit_scale=True,
+                unit_divisor=1024,
+                initial=offset,
+                total=meta['length'],
+                desc=Path(part_path).name,
+                position=position,
+            ) as tq:
+                stream = response.raw.stream(CHUNK_SIZE, decode_content=False)
+                for chunk in stream:
+                    part.write(chunk)
+                    tq.update(len(chunk))
+
+    size = Path(part_path).stat().st_size
+    return meta['length'] is None or size == meta['length']
+
+
+def _length(header: Optional[str]) -> Optional[int]:
+    if header is None:
+        return None
+    return int(header)
+
+
+def _range_matches(
+    header: Optional[str],
+    offset: int,
+    length: Optional[int],
+) -> bool:
+    """Check that a partial response continues the saved transfer.
+
+    Args:
+        header (Optional[str]): Content-Range header of the response, such
+            as bytes 100-199/200.
+        offset (int): Number of bytes already saved.
+        length (Optional[int]): Length of the whole transfer, if known.
+
+    Returns:
+        bool: Whether the range starts at offset and, when both are known,
+            its total matches length.
+    """
+    if header is None:
+        return False
+    unit, _, spec = header.strip().partition(' ')
+    byte_range, _, total = spec.partition('/')
+    start, _, _ = byte_range.partition('-')
+    if unit != 'bytes' or not start.isdecimal() or int(start) != offset:
+        return False
+    if length is None or total == '*':
+        return True
+    return total.isdecimal() and int(total) == length
+
+
+def _decode(part_path: str, file_path: str, encoding: Optional[str]) -> str:
+    decoder = None
+    if encoding == 'gzip':
+        decoder = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    elif encoding == 'deflate':
+        decoder = zlib.decompressobj()
+
+    digest = hashlib.sha256()
+    with open(part_path, 'rb') as part, open(file_path, 'wb') as out:
+        for chunk in iter(lambda: part.read(CHUNK_SIZE), b''):
+            if decoder is not None:
+                chunk = decoder.decompress(chunk)
+            digest.update(chunk)
+            out.write(chunk)
+        if decoder is not None:
+            tail = decoder.flush()
+            digest.update(tail)
+            out.write(tail)
+    return digest.hexdigest()
@@ -1,15 +1,22 @@
 """Wiktionary datasets from experio."""
 
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Iterator, Optional
 
-import pandas as pd
 import pyarrow as pa
 
 from experio import const
 from experio.console import console
+from experio.core.dataset.clean import build_final
+from experio.core.dataset.dataset import download_datasets
+from experio.core.dataset.index import WordIndex
+from experio.core.dataset.reader import ArrowReader, Filter
 from experio.core.dataset.yawipa import DefinitionDataset, EtymologyDataset
-from experio.jl import jl
+from experio.jl import get_julia
+from experio.metrics import metrics
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 class EtymDefDataset(object):
@@ -18,20 +25,28 @@ class EtymDefDataset(object):
     name: str
     file_path: str
 
-    def __init__(self, base_path: Optional[str] = const.BASE_PATH):
+    def __init__(
+        self,
+        base_path: Optional[str] = const.BASE_PATH,
+        julia: bool = False,
+    ):
         """Initialize the dataset.
 
         Args:
             base_path (Optional[str]): Base path of the dataset. Defaults to
                 const.BASE_PATH.
+            julia (bool): Whether to clean and join the datasets with
+                load_dataset of experio.jl instead of build_final.
         """
         self.name = 'final'
         self.base_path = base_path
+        self.julia = julia
         self.file_path = '{0}.arrow'.format(Path(self.base_path) / self.name)
 
-        # initialize base datasets
-        EtymologyDataset()
-        DefinitionDataset()
+        # initialize base datasets, downloading both at once
+        self.etym_dataset = EtymologyDataset(fetch=False)
+        self.def_dataset = DefinitionDataset(fetch=False)
+        download_datasets([self.etym_dataset, self.def_dataset])
 
         # create arrow file datasets
         if not Path(self.file_path).is_file():
@@ -40,13 +55,69 @@ class EtymDefDataset(object):
 
     def load(self):
         """Load the dataset."""
-        jl.eval('load_dataset()')
+        with metrics.timer('dataset.load'):
+            self.etym_dataset.parse()
+            self.def_dataset.parse()
+            if self.julia:
+                # load_dataset reuses the arrow files instead of building them
+                get_julia().eval('load_dataset()')
+            else:
+                build_final(
+                    self.etym_dataset.arrow_path,
+                    self.def_dataset.arrow_path,
+                    self.file_path,
+                )
+
+    def reader(self) -> ArrowReader:
+        """Open a memory-mapped reader of the dataset.
+
+        Returns:
+            ArrowReader: Reader of the dataset.
+        """
+        return ArrowReader(self.file_path)
+
+    def word_index(self) -> WordIndex:
+        """Open the index from words to rows of the dataset.
+
+        Returns:
+            WordIndex: Index of the dataset, built on first use.
+        """
+        return WordIndex(self.file_path)
 
-    def dataset(self) -> pd.DataFrame:
+    def batches(
+        self,
+        columns: Optional[list[str]] = None,
+        filters: Optional[list[Filter]] = None,
+        batch_size: int = 65536,
+    ) -> Iterator[pa.RecordBatch]:
+        """Stream record batches of the dataset.
+
+        Args:
+            columns (Optional[list[str]]): Columns to read. Defaults to all
+                columns.
+            filters (Optional[list[Filter]]): Filters rows must match, see
+                ArrowReader.batches.
+            batch_size (int): Maximum number of rows per batch.
+
+        Returns:
+            Iterator[pa.RecordBatch]: Zero-copy batches of the dataset.
+        """
+        return self.reader().batches(columns, filters, batch_size)
+
+    def dataset(
+        self,
+        columns: Optional[list[str]] = None,
+        filters: Optional[list[Filter]] = None,
+    ) -> 'pd.DataFrame':
         """Get the dataset.
 
+        Args:
+            columns (Optional[list[str]]): Columns to read. Defaults to all
+                columns.
+            filters (Optional[list[Filter]]): Filters rows must match, see
+                ArrowReader.batches.
+
         Returns:
-            pd.DataFrame: The dataset as pandas dataframe.
+            pd.DataFrame: The dataset as pandas dataframe, indexed by row.
         """
-        reader = pa.ipc.open_file(self.file_path)
-        return reader.read_all().to_pandas()
+        return self.reader().to_pandas(columns, filters)
@@ -0,0 +1,237 @@
+"""Index from words to their rows in an arrow dataset."""
+
+import os
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from beartype import beartype
+
+from experio.console import console
+from experio.core.dataset.reader import ArrowReader
+
+WORD_COLUMN = 'word'
+
+
+class WordIndex(object):
+    """Sorted vocabulary with CSR offsets into the rows of a dataset.
+
+    The rows of the dataset are ordered by word in self.rows, so the rows
+    of the i-th word of the vocabulary are rows[offsets[i]:offsets[i + 1]],
+    in file order. Words are found by binary search in the vocabulary,
+    which is kept as an arrow string array rather than python strings.
+    The index is saved next to the dataset as <stem>.index.npz and rebuilt
+    when the dataset is newer.
+    """
+
+    def __init__(self, file_path: str):
+        """Open the index of a dataset, building it if missing or stale.
+
+        Args:
+            file_path (str): Path of the arrow dataset.
+        """
+        self.file_path = file_path
+        self.path = '{0}.index.npz'.format(Path(file_path).with_suffix(''))
+
+        if not Path(self.path).is_file():
+            console.log('Word index not found.')
+            self.build()
+        elif Path(self.path).stat().st_mtime < Path(file_path).stat().st_mtime:
+            console.log('Word index is stale.')
+            self.build()
+
+        with np.load(self.path) as saved:
+            self.offsets = saved['offsets']
+            self.rows = saved['rows']
+            self.vocab = pa.StringArray.from_buffers(
+                len(self.offsets) - 1,
+                pa.py_buffer(saved['vocab_offsets']),
+                pa.py_buffer(saved['vocab_data']),
+            )
+        self._codes = None
+
+    def __len__(self) -> int:
+        """Get the number of distinct words.
+
+        Returns:
+            int: Size of the vocabulary.
+        """
+        return len(self.vocab)
+
+    def __contains__(self, word: str) -> bool:
+        """Check whether a word is in the dataset.
+
+        Args:
+            word (str): Word to find.
+
+        Returns:
+            bool: Whether the word has rows.
+        """
+        return self.find(word) >= 0
+
+    def build(self) -> None:
+        """Build and save the index from the word column of the dataset."""
+        console.log('Building word index of {0}.'.format(self.file_path))
+        words = ArrowReader(self.file_path).column(WORD_COLUMN)
+        words = words.combine_chunks()
+
+        # stable, so the rows of a word stay in file order
+        rows = pc.sort_indices(words).to_numpy().astype(np.int64)
+        ordered = words.take(pa.array(rows))
+        changes = np.empty(len(rows), dtype=bool)
+        changes[:1] = True
+        changes[1:] = pc.not_equal(ordered[1:], ordered[:-1]).to_numpy(
+            zero_copy_only=False,
+        )
+        starts = np.flatnonzero(changes)
+        offsets = np.append(starts, len(rows)).astype(np.int64)
+
+        vocab = ordered.take(pa.array(starts))
+        _, vocab_offsets, vocab_data = vocab.buffers()
+        tmp_path = '{0}.tmp.npz'.format(self.path)
+        np.savez(
+            tmp_path,
+            offsets=offsets,
+            rows=rows,
+            vocab_offsets=np.frombuffer(vocab_offsets, dtype=np.int32)[
+                :len(vocab) + 1
+            ],
+            vocab_data=np.frombuffer(vocab_data, dtype=np.uint8),
+        )
+        os.replace(tmp_path, self.path)
+        console.log('Indexed {0} rows of {1} words.'.format(
+            len(rows),
+            len(vocab),
+        ))
+
+    @beartype
+    def find(self, word: str) -> int:
+        """Find the position of a word in the vocabulary.
+
+        Args:
+            word (str): Word to find.
+
+        Returns:
+            int: Position of the word, -1 if it is not in the dataset.
+        """
+        low = 0
+        high = len(self.vocab)
+        while low < high:
+            mid = (low + high) // 2
+            if self.vocab[mid].as_py() < word:
+                low = mid + 1
+            else:
+                high = mid
+        if low < len(self.vocab) and self.vocab[low].as_py() == word:
+            return low
+        return -1
+
+    @beartype
+    def word(self, word_id: int) -> str:
+        """Get a word of the vocabulary.
+
+        Args:
+            word_id (int): Position of the word.
+
+        Returns:
+            str: The word.
+        """
+        return self.vocab[word_id].as_py()
+
+    @beartype
+    def word_rows(self, word: str) -> np.ndarray:
+        """Get the dataset rows of a word.
+
+        Rows index the dataset, its definitions and both embedding
+        matrices alike.
+
+        Args:
+            word (str): Word to find.
+
+        Returns:
+            np.ndarray: Rows of the word in file order, empty if it is not
+                in the dataset.
+        """
+        word_id = self.find(word)
+        if word_id < 0:
+            return self.rows[:0]
+        return self.id_rows(np.array([word_id]))
+
+    @beartype
+    def word_ids(self, words: list[str]) -> np.ndarray:
+        """Find the positions of many words at once.
+
+        Args:
+            words (list[str]): Words to find.
+
+        Returns:
+            np.ndarray: Position of every word, -1 if it is not in the
+                dataset.
+        """
+        ids = pc.index_in(
+            pa.array(words, type=pa.string()),
+            value_set=self.vocab,
+        )
+        return ids.fill_null(-1).to_numpy().astype(np.int64)
+
+    @beartype
+    def id_rows(self, word_ids: np.ndarray) -> np.ndarray:
+        """Get the dataset rows of many words.
+
+        Args:
+            word_ids (np.ndarray): Positions of the words.
+
+        Returns:
+            np.ndarray: Rows of the words, grouped in the given word order.
+        """
+        starts = self.offsets[word_ids]
+        counts = self.offsets[word_ids + 1] - starts
+        # position of every row in self.rows, without a python loop
+        shift = np.repeat(starts - np.cumsum(counts) + counts, counts)
+        return self.rows[np.arange(counts.sum()) + shift]
+
+    def codes(self) -> np.ndarray:
+        """Get the vocabulary position of the word of every dataset row.
+
+        Returns:
+            np.ndarray: Word position of every row.
+        """
+        if self._codes is None:
+            codes = np.empty(len(self.rows), dtype=np.int64)
+            codes[self.rows] = np.repeat(
+                np.arange(len(self.vocab)),
+                np.diff(self.offsets),
+            )
+            self._codes = codes
+        return self._codes
+
+    @beartype
+    def split(
+        self,
+        split_percent: float,
+        random_seed: int,
+        rows: Optional[np.ndarray] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Split rows by word, so no word is on both sides.
+
+        Args:
+            split_percent (float): Share of the words on the first side.
+            random_seed (int): Seed of the word shuffle.
+            rows (Optional[np.ndarray]): Rows to split. Defaults to all
+                rows of the dataset.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Sorted rows of both sides.
+        """
+        if rows is None:
+            rows = np.arange(len(self.rows))
+        codes = self.codes()[rows]
+        words = np.unique(codes)
+        rng = np.random.default_rng(random_seed)
+        first = np.zeros(len(self.vocab), dtype=bool)
+        first[rng.permutation(words)[:int(len(words) * split_percent)]] = True
+
+        mask = first[codes]
+        return np.sort(rows[mask]), np.sort(rows[~mask])
@@ -0,0 +1,291 @@
+"""Compressed dataset partitioned by language and word prefix."""
+
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from experio.console import console
+from experio.core.dataset.reader import ROW_COLUMN, ArrowReader
+
+# high-repetition string columns, stored dictionary encoded
+CATEGORICAL = ('lang', 'pos')
+LANG_COLUMN = 'lang'
+WORD_COLUMN = 'word'
+MANIFEST = 'manifest.json'
+
+
+def prefix_range(prefix: str, low: str, high: str) -> bool:
+    """Check whether words starting with a prefix can be in a word range.
+
+    Args:
+        prefix (str): Prefix of the words.
+        low (str): Smallest word of the range.
+        high (str): Largest word of the range.
+
+    Returns:
+        bool: Whether the range may hold a word with the prefix.
+    """
+    return high >= prefix and low[:len(prefix)] <= prefix
+
+
+class PartitionedDataset(object):
+    """Dataset split into compressed arrow files by language and prefix.
+
+    Every partition holds the rows of one language, if the dataset has a
+    lang column, whose words start with the same characters. Its rows are
+    sorted by word and keep their row number in the source file in a row
+    column. Categorical columns are dictionary encoded and record batches
+    are compressed. The manifest keeps the smallest and largest word of
+    every partition and of every record batch, so a scan only reads the
+    batches that can hold the words it looks for.
+    """
+
+    def __init__(self, path: str):
+        """Open a partitioned dataset.
+
+        Args:
+            path (str): Directory of the dataset.
+        """
+        self.path = Path(path)
+        self.manifest = json.loads((self.path / MANIFEST).read_text())
+        self.partitions = self.manifest['partitions']
+
+    def __len__(self) -> int:
+        """Get the number of rows.
+
+        Returns:
+            int: Number of rows of all partitions.
+        """
+        return sum(partition['rows'] for partition in self.partitions)
+
+    @property
+    def size(self) -> int:
+        """Get the size of the partition files on disk.
+
+        Returns:
+            int: Number of bytes.
+        """
+        return sum(partition['bytes'] for partition in self.partitions)
+
+    @classmethod
+    def write(
+        cls,
+        file_path: str,
+        path: str,
+        compression: str = 'zstd',
+        prefix_length: int = 1,
+        batch_size: int = 16384,
+        min_rows: int = 65536,
+    ) -> 'PartitionedDataset':
+        """Partition an arrow file.
+
+        Rows are grouped by partition with a sort of the row numbers, and
+        one partition at a time is gathered from the memory-mapped file,
+        so memory is bounded by the largest partition. The directory is
+        written under a temporary name and only renamed into place once
+        complete.
+
+        Args:
+            file_path (str): Path of the arrow file.
+            path (str): Directory of the partitioned dataset.
+            compression (str): IPC compression codec, zstd or lz4.
+            prefix_length (int): Number of leading characters of the words
+                of a partition.
+            batch_size (int): Number of rows per record batch.
+            min_rows (int): Languages with fewer rows are not split by
+                prefix, so rare languages do not make thousands of tiny
+                files.
+
+        Returns:
+            PartitionedDataset: The written dataset.
+        """
+        console.log('Partitioning {0} into {1}.'.format(file_path, path))
+        table = ArrowReader(file_path).table()
+        has_lang = LANG_COLUMN in table.column_names
+        prefixes = pc.utf8_slice_codeunits(
+            table.column(WORD_COLUMN),
+            0,
+            prefix_length,
+        )
+        if has_lang:
+            counts = pc.value_counts(table.column(LANG_COLUMN))
+            small = counts.field('values').filter(pc.less(
+                counts.field('counts'),
+                min_rows,
+            ))
+            prefixes = pc.if_else(
+                pc.is_in(table.column(LANG_COLUMN), value_set=small),
+                '',
+                prefixes,
+            )
+        elif table.num_rows < min_rows:
+            prefixes = pc.if_else(pc.is_valid(prefixes), '', prefixes)
+        keys = [(WORD_COLUMN, 'ascending')]
+        columns = {'prefix': prefixes, WORD_COLUMN: table.column(WORD_COLUMN)}
+        if has_lang:
+            keys.insert(0, (LANG_COLUMN, 'ascending'))
+            columns[LANG_COLUMN] = table.column(LANG_COLUMN)
+        keys.insert(int(has_lang), ('prefix', 'ascending'))
+        keyed = pa.table(columns)
+        order = pc.sort_indices(keyed, sort_keys=keys).to_numpy()
+
+        # partitions are runs of equal keys in the sorted order
+        changes = np.zeros(len(order), dtype=bool)
+        changes[:1] = True
+        for name, _ in keys[:-1]:
+            column = keyed.column(name).take(pa.array(order)).combine_chunks()
+            changes[1:] |= pc.not_equal(column[1:], column[:-1]).to_numpy(
+                zero_copy_only=False,
+            )
+        bounds = np.append(np.flatnonzero(changes), len(order))
+
+        tmp_path = Path('{0}.tmp'.format(path))
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        tmp_path.mkdir(parents=True)
+        options = pa.ipc.IpcWriteOptions(compression=compression)
+        partitions = []
+        for it, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])):
+            rows = order[start:stop]
+            part = table.take(pa.array(rows))
+            arrays = [
+                (
+                    pc.dictionary_encode(part.column(name).combine_chunks())
+                    if name in CATEGORICAL
+                    else part.column(name).combine_chunks()
+                )
+                for name in part.column_names
+            ]
+            part = pa.Table.from_arrays(
+                arrays + [pa.array(rows.astype(np.int64))],
+                names=part.column_names + [ROW_COLUMN],
+            )
+
+            name = 'part-{0:05d}.arrow'.format(it)
+            batches = part.to_batches(max_chunksize=batch_size)
+            with pa.OSFile(str(tmp_path / name), 'wb') as sink:
+                writer = pa.ipc.new_file(sink, part.schema, options=options)
+                for batch in batches:
+                    writer.write_batch(batch)
+                writer.close()
+
+            words = part.column(WORD_COLUMN)
+            partitions.append({
+                'file': name,
+                'lang': (
+                    part.column(LANG_COLUMN)[0].as_py() if has_lang else None
+                ),
+                'prefix': prefixes[int(rows[0])].as_py(),
+                'rows': len(rows),
+                'bytes': (tmp_path / name).stat().st_size,
+                'min_word': words[0].as_py(),
+                'max_word': words[-1].as_py(),
+                'batches': [
+                    {
+                        'rows': batch.num_rows,
+                        'min_word': batch.column(WORD_COLUMN)[0].as_py(),
+                        'max_word': batch.column(WORD_COLUMN)[-1].as_py(),
+                    }
+                    for batch in batches
+                ],
+            })
+
+        (tmp_path / MANIFEST).write_text(json.dumps({
+            'source': str(file_path),
+            'compression': compression,
+            'prefix_length': prefix_length,
+            'partitions': partitions,
+        }))
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        console.log('Wrote {0} rows in {1} partitions.'.format(
+            len(order),
+            len(partitions),
+        ))
+        return cls(path)
+
+    def scan(
+        self,
+        columns: Optional[list[str]] = None,
+        lang: Optional[str] = None,
+        prefix: Optional[str] = None,
+    ) -> Iterator[pa.RecordBatch]:
+        """Iterate over the record batches that match a query.
+
+        Partitions of other languages are skipped, and so are partitions
+        and batches whose word range cannot hold the prefix, so only the
+        bytes of the remaining batches are read and decompressed.
+
+        Args:
+            columns (Optional[list[str]]): Columns to read. Defaults to all
+                columns.
+            lang (Optional[str]): Language of the rows, None for all.
+            prefix (Optional[str]): Prefix of the words, None for all.
+
+        Yields:
+            pa.RecordBatch: Batch of the matching rows, ordered by word
+                within a partition.
+        """
+        for partition in self.partitions:
+            if lang is not None and partition['lang'] != lang:
+                continue
+            if prefix is not None and not prefix_range(
+                prefix,
+                partition['min_word'],
+                partition['max_word'],
+            ):
+                continue
+
+            source = pa.memory_map(str(self.path / partition['file']), 'r')
+            reader = pa.ipc.open_file(source)
+            names = columns or reader.schema.names
+            for it, stats in enumerate(partition['batches']):
+                if prefix is not None and not prefix_range(
+                    prefix,
+                    stats['min_word'],
+                    stats['max_word'],
+                ):
+                    continue
+                batch = reader.get_batch(it)
+                if prefix is not None:
+                    batch = batch.filter(pc.starts_with(
+                        batch.column(WORD_COLUMN),
+                        pattern=prefix,
+                    ))
+                if batch.num_rows:
+                    yield pa.RecordBatch.from_arrays(
+                        [batch.column(name) for name in names],
+                        names=names,
+                    )
+
+    def table(
+        self,
+        columns: Optional[list[str]] = None,
+        lang: Optional[str] = None,
+        prefix: Optional[str] = None,
+    ) -> pa.Table:
+        """Read the rows that match a query as one table.
+
+        Args:
+            columns (Optional[list[str]]): Columns to read.
+            lang (Optional[str]): Language of the rows, None for all.
+            prefix (Optional[str]): Prefix of the words, None for all.
+
+        Returns:
+            pa.Table: The matching rows.
+        """
+        batches = list(self.scan(columns, lang, prefix))
+        if not batches:
+            reader = pa.ipc.open_file(
+                str(self.path / self.partitions[0]['file']),
+            )
+            names = columns or reader.schema.names
+            return pa.schema([
+                reader.schema.field(name) for name in names
+            ]).empty_table()
+        return pa.Table.from_batches(batches)
@@ -0,0 +1,196 @@
+"""Streaming, column-projected reader of arrow files."""
+
+from typing import TYPE_CHECKING, Any, Iterator, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# filters are (column, operator, value) tuples, combined with and
+Filter = tuple[str, str, Any]
+OPERATORS = {
+    '==': pc.equal,
+    '!=': pc.not_equal,
+    '<': pc.less,
+    '<=': pc.less_equal,
+    '>': pc.greater,
+    '>=': pc.greater_equal,
+}
+ROW_COLUMN = 'row'
+
+
+class ArrowReader(object):
+    """Memory-mapped reader of an arrow IPC file.
+
+    Record batches are read straight from the memory-mapped file, so the
+    columns of a batch are views of the page cache rather than copies.
+    """
+
+    def __init__(self, file_path: str):
+        """Open the file.
+
+        Args:
+            file_path (str): Path of the arrow file.
+        """
+        self.file_path = file_path
+        self.source = pa.memory_map(file_path, 'r')
+        self.reader = pa.ipc.open_file(self.source)
+
+    def __len__(self) -> int:
+        """Get the number of rows of the file.
+
+        Returns:
+            int: Number of rows.
+        """
+        return sum(
+            self.reader.get_batch(it).num_rows
+            for it in range(self.reader.num_record_batches)
+        )
+
+    @property
+    def schema(self) -> pa.Schema:
+        """Get the schema of the file.
+
+        Returns:
+            pa.Schema: Schema of the file.
+        """
+        return self.reader.schema
+
+    def batches(
+        self,
+        columns: Optional[list[str]] = None,
+        filters: Optional[list[Filter]] = None,
+        batch_size: int = 65536,
+        row_index: bool = False,
+    ) -> Iterator[pa.RecordBatch]:
+        """Iterate over record batches of the file.
+
+        Args:
+            columns (Optional[list[str]]): Columns to read. Defaults to all
+                columns.
+            filters (Optional[list[Filter]]): Filters rows must match, as
+                (column, operator, value) tuples. Operators are ==, !=, <,
+                <=, >, >=, in and startswith.
+            batch_size (int): Maximum number of rows per batch.
+            row_index (bool): Whether to add the row number of every row in
+                the file as a "row" column.
+
+        Yields:
+            pa.RecordBatch: Batch of the selected rows and columns.
+        """
+        columns = columns or self.schema.names
+        offset = 0
+        for it in range(self.reader.num_record_batches):
+            file_batch = self.reader.get_batch(it)
+            for start in range(0, file_batch.num_rows, batch_size):
+                batch = file_batch.slice(start, batch_size)
+                arrays = [batch.column(name) for name in columns]
+                names = list(columns)
+                if row_index:
+                    # only built on request, numpy conversion is not free
+                    arrays.append(pa.array(np.arange(
+                        offset + start,
+                        offset + start + batch.num_rows,
+                    )))
+                    names.append(ROW_COLUMN)
+                projected = pa.RecordBatch.from_arrays(arrays, names=names)
+
+                if filters:
+                    projected = projected.filter(self.mask(batch, filters))
+                if projected.num_rows:
+                    yield projected
+            offset += file_batch.num_rows
+
+    def mask(self, batch: pa.RecordBatch, filters: list[Filter]) -> pa.Array:
+        """Compute which rows of a batch match all filters.
+
+        Args:
+            batch (pa.RecordBatch): Batch to filter.
+            filters (list[Filter]): Filters rows must match.
+
+        Returns:
+            pa.Array: Boolean mask of the matching rows.
+
+        Raises:
+            ValueError: If an operator is unknown.
+        """
+        mask = None
+        for column, operator, value in filters:
+            array = batch.column(column)
+            if operator == 'in':
+                match = pc.is_in(array, value_set=pa.array(list(value)))
+            elif operator == 'startswith':
+                match = pc.starts_with(array, pattern=value)
+            elif operator in OPERATORS:
+                match = OPERATORS[operator](array, pa.scalar(value))
+            else:
+                raise ValueError('Unknown operator "{0}".'.format(operator))
+            mask = match if mask is None else pc.and_(mask, match)
+        return mask
+
+    def table(
+        self,
+        columns: Optional[list[str]] = None,
+        filters: Optional[list[Filter]] = None,
+        row_index: bool = False,
+    ) -> pa.Table:
+        """Read the selected rows and columns as one table.
+
+        Args:
+            columns (Optional[list[str]]): Columns to read.
+            filters (Optional[list[Filter]]): Filters rows must match.
+            row_index (bool): Whether to add a "row" column.
+
+        Returns:
+            pa.Table: Table of zero-copy column chunks where possible.
+        """
+        batches = list(self.batches(
+            columns,
+            filters,
+            batch_size=max(len(self), 1),
+            row_index=row_index,
+        ))
+        if not batches:
+            names = list(columns or self.schema.names)
+            schema = pa.schema([self.schema.field(name) for name in names])
+            if row_index:
+                schema = schema.append(pa.field(ROW_COLUMN, pa.int64()))
+            return schema.empty_table()
+        return pa.Table.from_batches(batches)
+
+    def column(
+        self,
+        name: str,
+        filters: Optional[list[Filter]] = None,
+    ) -> pa.ChunkedArray:
+        """Read one column.
+
+        Args:
+            name (str): Name of the column.
+            filters (Optional[list[Filter]]): Filters rows must match.
+
+        Returns:
+            pa.ChunkedArray: The column. Use to_numpy for a numpy view of
+                numeric columns.
+        """
+        return self.table([name], filters).column(name)
+
+    def to_pandas(
+        self,
+        columns: Optional[list[str]] = None,
+        filters: Optional[list[Filter]] = None,
+    ) -> 'pd.DataFrame':
+        """Read the selected rows and columns into pandas.
+
+        Args:
+            columns (Optional[list[str]]): Columns to read.
+            filters (Optional[list[Filter]]): Filters rows must match.
+
+        Returns:
+            pd.DataFrame: The rows, indexed by their row in the file.
+        """
+        df = self.table(columns, filters, row_index=True).to_pandas()
+        return df.set_index(ROW_COLUMN).rename_axis(None)
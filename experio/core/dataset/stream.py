@@ -0,0 +1,186 @@
+"""Stream yawipa text dumps into arrow files."""
+
+import os
+import time
+from typing import Callable, Iterator
+
+import pyarrow as pa
+
+from experio.console import console
+
+DEF_SCHEMA = pa.schema([
+    ('lang', pa.string()),
+    ('word', pa.string()),
+    ('pos', pa.string()),
+    ('def', pa.string()),
+])
+ETYM_SCHEMA = pa.schema([
+    ('lang', pa.string()),
+    ('word', pa.string()),
+    ('etym', pa.string()),
+])
+
+# fields indexed by the julia builders, shorter lines are skipped
+DEF_FIELDS = 4
+ETYM_FIELDS = 2
+
+
+def def_row(fields: list[str]) -> tuple[str, str, str, str]:
+    """Build a definition row, as build_def in experio.jl.
+
+    Args:
+        fields (list[str]): Tab separated fields of a line.
+
+    Returns:
+        tuple[str, str, str, str]: Language, word, part of speech and
+            definition.
+    """
+    return fields[0], fields[1], fields[2], ''.join(fields[4:])
+
+
+def etym_row(fields: list[str]) -> tuple[str, str, str]:
+    """Build an etymology row, as build_etym in experio.jl.
+
+    Args:
+        fields (list[str]): Tab separated fields of a line.
+
+    Returns:
+        tuple[str, str, str]: Language, word and etymology.
+    """
+    return fields[0], fields[1], '[({0})]'.format(')('.join(fields[4:]))
+
+
+def read_lines(
+    path: str,
+    chunk_size: int = 1 << 26,
+) -> Iterator[list[str]]:
+    """Read the lines of a text file in large chunks.
+
+    Args:
+        path (str): Path of the text file.
+        chunk_size (int): Number of bytes read at once.
+
+    Yields:
+        list[str]: Lines of a chunk, without line endings.
+    """
+    rest = b''
+    with open(path, 'rb') as txt:
+        while True:
+            chunk = txt.read(chunk_size)
+            if not chunk:
+                break
+            lines = (rest + chunk).split(b'\n')
+            rest = lines.pop()
+            yield [
+                line.decode('utf-8', errors='replace').rstrip('\r')
+                for line in lines
+            ]
+    if rest:
+        yield [rest.decode('utf-8', errors='replace').rstrip('\r')]
+
+
+def parse(
+    txt_path: str,
+    arrow_path: str,
+    schema: pa.Schema,
+    build_row: Callable[[list[str]], tuple],
+    min_fields: int,
+    chunk_size: int = 1 << 26,
+) -> int:
+    """Parse a yawipa text dump into an arrow file.
+
+    Every chunk of lines is written as one record batch, so memory is
+    bounded by the chunk size. The arrow file is written under a temporary
+    name and only renamed into place once complete.
+
+    Args:
+        txt_path (str): Path of the text dump.
+        arrow_path (str): Path of the arrow file.
+        schema (pa.Schema): Schema of the arrow file.
+        build_row (Callable[[list[str]], tuple]): Builds a row from the
+            tab separated fields of a line.
+        min_fields (int): Minimum number of fields of a line.
+        chunk_size (int): Number of bytes read at once.
+
+    Returns:
+        int: Number of rows written.
+    """
+    console.log('Parsing {0} to {1}.'.format(txt_path, arrow_path))
+    start = time.perf_counter()
+    tmp_path = '{0}.tmp'.format(arrow_path)
+    num_lines = 0
+    num_rows = 0
+
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, schema) as writer:
+            for lines in read_lines(txt_path, chunk_size):
+                num_lines += len(lines)
+                rows = [
+                    build_row(fields)
+                    for fields in (line.split('\t') for line in lines)
+                    if len(fields) >= min_fields
+                ]
+                if not rows:
+                    continue
+                num_rows += len(rows)
+                columns = [
+                    pa.array(column, type=field.type)
+                    for column, field in zip(zip(*rows), schema)
+                ]
+                writer.write_batch(
+                    pa.record_batch(columns, schema=schema),
+                )
+    os.replace(tmp_path, arrow_path)
+
+    elapsed = time.perf_counter() - start
+    console.log(
+        'Parsed {0} lines ({1} skipped) in {2:.1f}s.'.format(
+            num_lines,
+            num_lines - num_rows,
+            elapsed,
+        ),
+        '{0:.0f} lines/sec.'.format(num_lines / max(elapsed, 1e-9)),
+    )
+    return num_rows
+
+
+def parse_def(txt_path: str, arrow_path: str, **kwargs) -> int:
+    """Parse the yawipa definitions dump into an arrow file.
+
+    Args:
+        txt_path (str): Path of def.txt.
+        arrow_path (str): Path of def.arrow.
+        kwargs: Keyword arguments of parse.
+
+    Returns:
+        int: Number of rows written.
+    """
+    return parse(
+        txt_path,
+        arrow_path,
+        DEF_SCHEMA,
+        def_row,
+        DEF_FIELDS,
+        **kwargs,
+    )
+
+
+def parse_etym(txt_path: str, arrow_path: str, **kwargs) -> int:
+    """Parse the yawipa etymologies dump into an arrow file.
+
+    Args:
+        txt_path (str): Path of etym.txt.
+        arrow_path (str): Path of etym.arrow.
+        kwargs: Keyword arguments of parse.
+
+    Returns:
+        int: Number of rows written.
+    """
+    return parse(
+        txt_path,
+        arrow_path,
+        ETYM_SCHEMA,
+        etym_row,
+        ETYM_FIELDS,
+        **kwargs,
+    )
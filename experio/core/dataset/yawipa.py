@@ -1,28 +1,51 @@
 """Wiktionary datasets from yawipa."""
 
+from pathlib import Path
+
 from experio import const
 from experio.core.dataset.dataset import Dataset
+from experio.core.dataset.stream import parse_def, parse_etym
 
 
 class DefinitionDataset(Dataset):
     """Wikitionary definitions dataset."""
 
-    def __init__(self):
-        """Initialize dataset."""
+    def __init__(self, fetch: bool = True):
+        """Initialize dataset.
+
+        Args:
+            fetch (bool): Whether to download the dataset if it is missing.
+        """
         name = 'def'
         super().__init__(
             name=name,
             url='{0}/{1}'.format(const.YAWIPA_URL, name),
+            fetch=fetch,
         )
 
+    def parse(self) -> None:
+        """Parse the text file into an arrow file if it is missing."""
+        if not Path(self.arrow_path).is_file():
+            parse_def(self.file_path, self.arrow_path)
+
 
 class EtymologyDataset(Dataset):
     """Wikitionary etymologies dataset."""
 
-    def __init__(self):
-        """Initialize dataset."""
+    def __init__(self, fetch: bool = True):
+        """Initialize dataset.
+
+        Args:
+            fetch (bool): Whether to download the dataset if it is missing.
+        """
         name = 'etym'
         super().__init__(
             name=name,
             url='{0}/{1}'.format(const.YAWIPA_URL, name),
+            fetch=fetch,
         )
+
+    def parse(self) -> None:
+        """Parse the text file into an arrow file if it is missing."""
+        if not Path(self.arrow_path).is_file():
+            parse_etym(self.file_path, self.arrow_path)
@@ -0,0 +1,70 @@
+"""Pack rows of text into batches for the encoder."""
+
+from typing import Optional
+
+import numpy as np
+from beartype import beartype
+
+
+@beartype
+def fixed_batches(num_rows: int, batch_size: int) -> list[np.ndarray]:
+    """Split rows into consecutive batches of a fixed number of rows.
+
+    Args:
+        num_rows (int): Number of rows.
+        batch_size (int): Number of rows per batch.
+
+    Returns:
+        list[np.ndarray]: Row indices of every batch.
+    """
+    return [
+        np.arange(it, min(it + batch_size, num_rows))
+        for it in range(0, num_rows, batch_size)
+    ]
+
+
+@beartype
+def token_batches(
+    lengths: np.ndarray,
+    token_budget: int,
+    max_rows: Optional[int] = None,
+) -> list[np.ndarray]:
+    """Pack rows of similar length into batches bounded by a token budget.
+
+    Rows are sorted by decreasing length, so every batch is padded to the
+    length of its first row and the largest batch comes first. A batch
+    holds as many rows as fit in the budget once padded, and at least one.
+
+    Args:
+        lengths (np.ndarray): Number of tokens of every row.
+        token_budget (int): Maximum number of padded tokens per batch.
+        max_rows (Optional[int]): Maximum number of rows per batch.
+
+    Returns:
+        list[np.ndarray]: Row indices of every batch.
+    """
+    order = np.argsort(-lengths, kind='stable')
+    batches = []
+    start = 0
+    while start < len(order):
+        num_rows = max(1, token_budget // max(int(lengths[order[start]]), 1))
+        if max_rows is not None:
+            num_rows = min(num_rows, max_rows)
+        batches.append(order[start:start + num_rows])
+        start += num_rows
+    return batches
+
+
+@beartype
+def padding_ratio(lengths: np.ndarray, batches: list[np.ndarray]) -> float:
+    """Compute the share of padding tokens in a list of batches.
+
+    Args:
+        lengths (np.ndarray): Number of tokens of every row.
+        batches (list[np.ndarray]): Row indices of every batch.
+
+    Returns:
+        float: Padding tokens over padded tokens.
+    """
+    padded = sum(len(batch) * int(lengths[batch].max()) for batch in batches)
+    return 1 - int(lengths.sum()) / max(padded, 1)
@@ -0,0 +1,352 @@
+"""Caches of text embeddings."""
+
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional
+
+import numpy as np
+from beartype import beartype
+
+from experio.console import console
+
+KEY_DTYPE = 'S20'
+
+
+def model_slug(model_name: str) -> str:
+    """Turn a model name or path into a file name.
+
+    Args:
+        model_name (str): Name or local path of the pretrained model.
+
+    Returns:
+        str: File name of the model.
+    """
+    return re.sub(r'[^\w.-]+', '-', model_name).strip('-')
+
+
+class EmbeddingCache(object):
+    """Append-only cache of embeddings keyed by text and model.
+
+    Every entry is keyed by the sha1 of the model name and the embedded
+    text. Vectors are appended to a vectors file and their keys to a keys
+    file, in that order, so an interrupted append never leaves a key
+    without its vector. compact writes the entries still in use to a new
+    generation of files and switches to it by replacing meta.json.
+    """
+
+    def __init__(self, base_path: str, model_name: str):
+        """Open the cache of a model.
+
+        Args:
+            base_path (str): Directory holding the caches of all models.
+            model_name (str): Name or local path of the pretrained model.
+        """
+        self.path = Path(base_path) / model_slug(model_name)
+        self.model_name = model_name
+        self.meta_path = self.path / 'meta.json'
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.load()
+
+    def __len__(self) -> int:
+        """Get the number of cached embeddings.
+
+        Returns:
+            int: Number of embeddings.
+        """
+        return len(self.keys)
+
+    def load(self) -> None:
+        """Load the keys and memory-map the vectors of the cache."""
+        self.dim = None
+        self.generation = 0
+        if self.meta_path.is_file():
+            meta = json.loads(self.meta_path.read_text())
+            self.dim = meta['dim']
+            self.generation = meta['generation']
+
+        self.keys_path = self.path / 'keys.{0}.bin'.format(self.generation)
+        self.vectors_path = self.path / 'vectors.{0}.bin'.format(
+            self.generation,
+        )
+        # keys live at the start of a larger buffer, so appends do not
+        # copy all of them every time
+        self._key_buffer = np.empty(0, dtype=KEY_DTYPE)
+        num_rows = 0
+        if self.dim is not None and self.keys_path.is_file():
+            self._key_buffer = np.fromfile(self.keys_path, dtype=KEY_DTYPE)
+            row_bytes = self.dim * np.dtype(np.float32).itemsize
+            num_rows = min(
+                len(self._key_buffer),
+                self.vectors_path.stat().st_size // row_bytes,
+            )
+        self.keys = self._key_buffer[:num_rows]
+        self.map_vectors()
+
+        self.index = {key: row for row, key in enumerate(self.keys)}
+
+    def map_vectors(self) -> None:
+        """Memory-map the vectors of the cached keys."""
+        self.vectors = np.empty((0, self.dim or 0), dtype=np.float32)
+        if len(self.keys):
+            self.vectors = np.memmap(
+                self.vectors_path,
+                dtype=np.float32,
+                mode='r',
+                shape=(len(self.keys), self.dim),
+            )
+
+    @beartype
+    def text_keys(self, texts: list[str]) -> np.ndarray:
+        """Compute the cache keys of texts.
+
+        Args:
+            texts (list[str]): Texts to key.
+
+        Returns:
+            np.ndarray: Keys of the texts.
+        """
+        prefix = hashlib.sha1(self.model_name.encode('utf-8'))
+        prefix.update(b'\0')
+        keys = np.empty(len(texts), dtype=KEY_DTYPE)
+        for it, text in enumerate(texts):
+            digest = prefix.copy()
+            digest.update(text.encode('utf-8'))
+            keys[it] = digest.digest()
+        return keys
+
+    @beartype
+    def lookup(self, keys: np.ndarray) -> np.ndarray:
+        """Find the rows of keys in the cache.
+
+        Args:
+            keys (np.ndarray): Keys to find.
+
+        Returns:
+            np.ndarray: Row of every key, -1 if it is not cached.
+        """
+        return np.fromiter(
+            (self.index.get(key, -1) for key in keys),
+            dtype=np.int64,
+            count=len(keys),
+        )
+
+    @beartype
+    def append(self, keys: np.ndarray, vectors: np.ndarray) -> None:
+        """Append embeddings to the cache.
+
+        Only the appended keys are added to the keys in memory and the
+        vectors are remapped to the new row count, so an append costs the
+        size of the appended entries rather than the size of the cache.
+
+        Args:
+            keys (np.ndarray): Keys of the embeddings.
+            vectors (np.ndarray): Embeddings, one row per key.
+        """
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            self.write_meta(self.generation)
+
+        # drop the tail of an interrupted append before appending
+        row_bytes = self.dim * np.dtype(np.float32).itemsize
+        with open(self.vectors_path, 'ab') as vectors_file:
+            vectors_file.truncate(len(self) * row_bytes)
+            np.ascontiguousarray(vectors, dtype=np.float32).tofile(
+                vectors_file,
+            )
+        with open(self.keys_path, 'ab') as keys_file:
+            keys_file.truncate(len(self) * np.dtype(KEY_DTYPE).itemsize)
+            np.asarray(keys, dtype=KEY_DTYPE).tofile(keys_file)
+
+        start = len(self)
+        stop = start + len(keys)
+        if stop > len(self._key_buffer):
+            buffer = np.empty(
+                max(stop, 2 * len(self._key_buffer)),
+                dtype=KEY_DTYPE,
+            )
+            buffer[:start] = self.keys
+            self._key_buffer = buffer
+        self._key_buffer[start:stop] = keys
+        self.keys = self._key_buffer[:stop]
+        for row, key in enumerate(self.keys[start:stop], start):
+            self.index[key] = row
+        self.map_vectors()
+
+    @beartype
+    def gather(
+        self,
+        rows: np.ndarray,
+        out_path: str,
+        block_size: int = 65536,
+    ) -> np.ndarray:
+        """Save cached embeddings in a given row order.
+
+        Args:
+            rows (np.ndarray): Cache row of every output row.
+            out_path (str): Path of the .npy file.
+            block_size (int): Number of rows copied at once.
+
+        Returns:
+            np.ndarray: Memory-mapped saved embeddings.
+        """
+        tmp_path = '{0}.tmp'.format(out_path)
+        out = np.lib.format.open_memmap(
+            tmp_path,
+            mode='w+',
+            dtype=np.float32,
+            shape=(len(rows), self.dim),
+        )
+        for start in range(0, len(rows), block_size):
+            block = rows[start:start + block_size]
+            out[start:start + len(block)] = self.vectors[block]
+        out.flush()
+        os.replace(tmp_path, out_path)
+        return np.load(out_path, mmap_mode='r')
+
+    @beartype
+    def compact(self, keys: np.ndarray, block_size: int = 65536) -> None:
+        """Rewrite the cache with only the given keys.
+
+        Args:
+            keys (np.ndarray): Keys to keep.
+            block_size (int): Number of rows copied at once.
+        """
+        rows = np.unique(self.lookup(np.unique(keys)))
+        rows = rows[rows >= 0]
+        if len(rows) == len(self):
+            return
+
+        console.log('Compacting embedding cache from {0} to {1} rows.'.format(
+            len(self),
+            len(rows),
+        ))
+        generation = self.generation + 1
+        keys_path = self.path / 'keys.{0}.bin'.format(generation)
+        vectors_path = self.path / 'vectors.{0}.bin'.format(generation)
+        with open(vectors_path, 'wb') as vectors_file:
+            for start in range(0, len(rows), block_size):
+                block = rows[start:start + block_size]
+                self.vectors[block].tofile(vectors_file)
+        self.keys[rows].tofile(keys_path)
+
+        old_paths = (self.keys_path, self.vectors_path)
+        self.write_meta(generation)
+        for path in old_paths:
+            path.unlink()
+        self.load()
+
+    def write_meta(self, generation: int) -> None:
+        """Atomically write the metadata of the cache.
+
+        Args:
+            generation (int): Generation of the keys and vectors files.
+        """
+        tmp_path = '{0}.tmp'.format(self.meta_path)
+        Path(tmp_path).write_text(json.dumps({
+            'model': self.model_name,
+            'dim': self.dim,
+            'generation': generation,
+        }))
+        os.replace(tmp_path, self.meta_path)
+
+
+class TextCache(object):
+    """Two-tier cache in front of an embedding function.
+
+    Texts are first looked up in a bounded in-memory LRU keyed by the text
+    itself, then in an on-disk EmbeddingCache. The remaining misses are
+    embedded together in one call and added to both tiers.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[list[str]], np.ndarray],
+        disk: Optional[EmbeddingCache] = None,
+        max_size: int = 65536,
+    ):
+        """Initialize the cache.
+
+        Args:
+            embed (Callable[[list[str]], np.ndarray]): Embeds a list of
+                texts, such as Encoder.generate_embeddings.
+            disk (Optional[EmbeddingCache]): On-disk tier, or None to only
+                cache in memory.
+            max_size (int): Maximum number of embeddings kept in memory.
+        """
+        self.embed = embed
+        self.disk = disk
+        self.max_size = max_size
+        self.memory = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def __call__(self, texts: list[str]) -> np.ndarray:
+        """Embed texts through the cache.
+
+        Args:
+            texts (list[str]): Texts to embed.
+
+        Returns:
+            np.ndarray: Array of embeddings, one row per text.
+        """
+        found = {}
+        for text in texts:
+            if text in found:
+                continue
+            vector = self.memory.get(text)
+            if vector is not None:
+                self.memory.move_to_end(text)
+                self.memory_hits += 1
+                found[text] = vector
+
+        missing = list(dict.fromkeys(
+            text for text in texts if text not in found
+        ))
+        if missing and self.disk is not None:
+            missing = self._disk_lookup(missing, found)
+        if missing:
+            self.misses += len(missing)
+            vectors = self.embed(missing)
+            if self.disk is not None:
+                self.disk.append(self.disk.text_keys(missing), vectors)
+            for text, vector in zip(missing, vectors):
+                self._remember(text, vector)
+                found[text] = vector
+
+        return np.stack([found[text] for text in texts])
+
+    def stats(self) -> dict:
+        """Get the hit and miss counters of the cache.
+
+        Returns:
+            dict: Memory hits, disk hits, misses and memory size.
+        """
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'size': len(self.memory),
+        }
+
+    def _disk_lookup(self, texts: list[str], found: dict) -> list[str]:
+        rows = self.disk.lookup(self.disk.text_keys(texts))
+        missing = []
+        for text, row in zip(texts, rows):
+            if row < 0:
+                missing.append(text)
+                continue
+            self.disk_hits += 1
+            vector = np.array(self.disk.vectors[row])
+            self._remember(text, vector)
+            found[text] = vector
+        return missing
+
+    def _remember(self, text: str, vector: np.ndarray) -> None:
+        self.memory[text] = vector
+        if len(self.memory) > self.max_size:
+            self.memory.popitem(last=False)
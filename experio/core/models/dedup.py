@@ -0,0 +1,203 @@
+"""Embeddings saved once per distinct text, with a map from rows."""
+
+import os
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+from beartype import beartype
+
+
+def dedup_paths(file_path: str) -> tuple[str, str]:
+    """Get the files of deduplicated embeddings.
+
+    Args:
+        file_path (str): Path of the embeddings, as a row-aligned .npy.
+
+    Returns:
+        tuple[str, str]: Paths of the distinct embeddings and of the row
+            map, <stem>.unique.npy and <stem>.rows.npy.
+    """
+    stem = Path(file_path).with_suffix('')
+    return '{0}.unique.npy'.format(stem), '{0}.rows.npy'.format(stem)
+
+
+class DedupEmbeddings(object):
+    """Row-aligned view of embeddings stored once per distinct text.
+
+    Rows with the same text share one vector of the unique matrix, and
+    rows[i] is the vector of row i. Indexing the view gathers the rows it
+    selects, so it reads like the row-aligned matrix without storing the
+    repeated vectors. Both files are memory-mapped.
+    """
+
+    def __init__(self, file_path: str):
+        """Open saved embeddings.
+
+        Args:
+            file_path (str): Path of the embeddings, see dedup_paths.
+        """
+        self.file_path = file_path
+        self.unique_path, self.rows_path = dedup_paths(file_path)
+        self.unique = np.load(self.unique_path, mmap_mode='r')
+        self.rows = np.load(self.rows_path, mmap_mode='r')
+
+    def __len__(self) -> int:
+        """Get the number of rows.
+
+        Returns:
+            int: Number of rows.
+        """
+        return len(self.rows)
+
+    def __getitem__(self, idx) -> np.ndarray:
+        """Get the embeddings of some rows.
+
+        Args:
+            idx: Index, slice or array of indices of rows.
+
+        Returns:
+            np.ndarray: Embeddings of the rows.
+        """
+        return self.unique[self.rows[idx]]
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        """Gather the full row-aligned matrix.
+
+        Args:
+            dtype: Type of the array, defaults to the stored type.
+            copy: Unused, the matrix is always a new array.
+
+        Returns:
+            np.ndarray: Embeddings of all rows.
+        """
+        return np.asarray(self[:], dtype=dtype)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        """Get the shape of the row-aligned matrix.
+
+        Returns:
+            tuple[int, int]: Number of rows and dimension.
+        """
+        return len(self.rows), self.unique.shape[1]
+
+    @property
+    def dtype(self) -> np.dtype:
+        """Get the type of the embeddings.
+
+        Returns:
+            np.dtype: Type of the stored vectors.
+        """
+        return self.unique.dtype
+
+    @property
+    def ndim(self) -> int:
+        """Get the number of dimensions of the row-aligned matrix.
+
+        Returns:
+            int: Always 2.
+        """
+        return 2
+
+    @staticmethod
+    @beartype
+    def save_rows(file_path: str, rows: np.ndarray) -> None:
+        """Atomically save the row map of deduplicated embeddings.
+
+        The distinct embeddings are saved first, the map is written last
+        and replaces the previous one in one step.
+
+        Args:
+            file_path (str): Path of the embeddings, see dedup_paths.
+            rows (np.ndarray): Vector of every row in the unique matrix.
+        """
+        _, rows_path = dedup_paths(file_path)
+        tmp_path = '{0}.tmp.npy'.format(rows_path)
+        np.save(tmp_path, rows.astype(np.int32))
+        os.replace(tmp_path, rows_path)
+
+
+@beartype
+def first_seen(keys: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Number distinct keys in order of first appearance.
+
+    Args:
+        keys (np.ndarray): Key of every row.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Distinct keys in order of first
+            appearance, and the position of the key of every row among
+            them.
+    """
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    order = np.argsort(first)
+    ranks = np.empty_like(order)
+    ranks[order] = np.arange(len(order))
+    return keys[first[order]], ranks[inverse.reshape(-1)]
+
+
+@beartype
+def first_rows(rows: np.ndarray, num_vectors: int) -> np.ndarray:
+    """Map distinct vectors back to rows.
+
+    Args:
+        rows (np.ndarray): Vector of every row, such as
+            DedupEmbeddings.rows.
+        num_vectors (int): Number of distinct vectors.
+
+    Returns:
+        np.ndarray: First row of every vector, -1 for vectors of no row.
+    """
+    vectors, first = np.unique(rows, return_index=True)
+    row_of = np.full(num_vectors, -1, dtype=np.int64)
+    row_of[vectors] = first
+    return row_of
+
+
+def embedding_paths(file_path: str) -> list[str]:
+    """Get the files holding saved embeddings.
+
+    Args:
+        file_path (str): Path of the embeddings.
+
+    Returns:
+        list[str]: The .npy itself if it exists, else the files of the
+            deduplicated embeddings.
+    """
+    if Path(file_path).is_file():
+        return [file_path]
+    return list(dedup_paths(file_path))
+
+
+def open_embeddings(
+    file_path: str,
+) -> Union[np.ndarray, DedupEmbeddings]:
+    """Open saved embeddings, row-aligned or deduplicated.
+
+    Args:
+        file_path (str): Path of the embeddings.
+
+    Returns:
+        Union[np.ndarray, DedupEmbeddings]: Memory-mapped row-aligned
+            matrix if file_path exists, else the deduplicated embeddings.
+    """
+    if Path(file_path).is_file():
+        return np.load(file_path, mmap_mode='r')
+    return DedupEmbeddings(file_path)
+
+
+def embeddings_mtime(file_path: str) -> Optional[float]:
+    """Get when saved embeddings last changed.
+
+    Args:
+        file_path (str): Path of the embeddings.
+
+    Returns:
+        Optional[float]: Latest modification time of their files, None if
+            any is missing.
+    """
+    paths = embedding_paths(file_path)
+    if not all(Path(path).is_file() for path in paths):
+        return None
+    return max(Path(path).stat().st_mtime for path in paths)
@@ -1,131 +1,345 @@
 """Generate embeddings from input text with universal encoder decluter."""
 
+import hashlib
+import json
+import os
 from pathlib import Path
 from typing import Optional
 
 import numpy as np
-import pandas as pd
-import torch
-from beartype import beartype
-from tqdm import tqdm
-from transformers import AutoModel, AutoTokenizer
 
 from experio import const
 from experio.console import console
 from experio.core.dataset.experio import EtymDefDataset
+from experio.core.models.cache import EmbeddingCache, TextCache
+from experio.core.models.dedup import (
+    DedupEmbeddings,
+    dedup_paths,
+    first_seen,
+)
+from experio.core.models.encoder import MODEL, Encoder
+from experio.core.models.shards import sharded_embeddings
+from experio.core.models.store import EmbeddingStore
 
 
-class Embeddings(object):
+def provenance_path(file_path: str) -> str:
+    """Get the file describing the texts and model of saved embeddings.
+
+    Args:
+        file_path (str): Path of the embeddings.
+
+    Returns:
+        str: Path of <stem>.provenance.json.
+    """
+    return '{0}.provenance.json'.format(Path(file_path).with_suffix(''))
+
+
+class Embeddings(Encoder):
     """Generate embeddings from input text with universal encoder decluter."""
 
-    def __init__(self, base_path: Optional[str] = const.BASE_PATH):
+    def __init__(
+        self,
+        base_path: Optional[str] = const.BASE_PATH,
+        encoding: Optional[str] = None,
+        token_budget: Optional[int] = None,
+        workers: Optional[int] = None,
+        model_name: str = MODEL,
+        quantize: bool = False,
+    ):
         """Initialize the dataset.
 
         Args:
             base_path (Optional[str]): Base path of the dataset. Defaults to
                 const.BASE_PATH.
+            encoding (Optional[str]): Encoding of the normalized embedding
+                stores (float32, float16 or int8). Defaults to None, which
+                opens no stores.
+            token_budget (Optional[int]): Maximum number of padded tokens
+                per batch when generating embeddings, see batch_embeddings.
+            workers (Optional[int]): Number of worker processes generating
+                embeddings in resumable shards. Defaults to None, which
+                generates them in this process.
+            model_name (str): Name or local path of the pretrained model.
+            quantize (bool): Whether to embed with the int8 quantized
+                model. Its embeddings, manifest and stores are saved with a
+                _quantized suffix, such as def_embed_quantized.npy, so they
+                never overwrite the float32 ones.
         """
-        self.word_path = '{0}/words_embed.npy'.format(base_path)
-        self.def_path = '{0}/def_embed.npy'.format(base_path)
+        suffix = '_quantized' if quantize else ''
+        self.base_path = base_path
+        self.word_path = '{0}/words_embed{1}.npy'.format(base_path, suffix)
+        self.def_path = '{0}/def_embed{1}.npy'.format(base_path, suffix)
+        self.dataset_path = '{0}/final.arrow'.format(base_path)
+        self.manifest_path = '{0}/embed_manifest{1}.json'.format(
+            base_path,
+            suffix,
+        )
+        self.encoding = encoding
+        self.workers = workers
         self.word_embeddings = None
         self.def_embeddings = None
+        self.word_store = None
+        self.def_store = None
 
         # make paths if they don't exist
         Path(base_path).mkdir(parents=True, exist_ok=True)
-        self.load_models()
+        super().__init__(model_name, token_budget, quantize)
+        self.cache = EmbeddingCache(
+            '{0}/embed_cache'.format(base_path),
+            self.model_id,
+        )
+        self.text_cache = TextCache(
+            self.generate_embeddings,
+            EmbeddingCache(
+                '{0}/query_cache'.format(base_path),
+                self.model_id,
+            ),
+        )
 
-        # create embeddings
-        if not Path(self.word_path).is_file():
+        # create or update embeddings, older row-aligned files are rebuilt
+        saved_paths = dedup_paths(self.word_path) + dedup_paths(self.def_path)
+        if not all(Path(path).is_file() for path in saved_paths):
             console.log('Embeddings not found.')
             self.dataset_embeddings()
+        elif self.manifest() != self.saved_manifest():
+            console.log('Embeddings are stale.')
+            self.dataset_embeddings()
 
         self.load_embeddings()
 
-    def dataset_embeddings(self):
-        """Generate embeddings from the dataset."""
-        df = EtymDefDataset().dataset()
-        df['word_etym'] = df['word'] + ' ' + df['etym']
-        if not Path(self.word_path).is_file():
-            console.log('Generating word/etym embeddings...')
-            self.word_embeddings = self.batch_embeddings(df['word_etym'])
-            np.save(self.word_path, self.word_embeddings)
-
-        if not Path(self.def_path).is_file():
-            console.log('Generating def embeddings...')
-            self.def_embeddings = self.batch_embeddings(df['def'])
-            np.save(self.def_path, self.def_embeddings)
-
-    def load_models(self) -> None:
-        """Load the models."""
-        model = 'johngiorgi/declutr-small'
-        self.tokenizer = AutoTokenizer.from_pretrained(model)
-        self.model = AutoModel.from_pretrained(model)
-
-    @beartype
-    def generate_embeddings(
-        self,
-        text: list[str],
-        min_val: int = 1e-9,
-    ) -> np.ndarray:
-        """Generate all embeddings using decluter.
+    def query_embeddings(self, text: list[str]) -> np.ndarray:
+        """Embed ad-hoc sentences through the in-memory and on-disk cache.
 
         Args:
             text (list[str]): List of sentences to embed.
-            min_val (int): Minimum value to use for normalization.
 
         Returns:
             np.ndarray: Array of embeddings.
         """
-        inputs = self.tokenizer(
-            text,
-            padding=True,
-            truncation=True,
-            return_tensors='pt',
-        )
+        return self.text_cache(text)
 
-        # embed the text
-        with torch.no_grad():
-            sequence_output = self.model(**inputs)[0]
+    def manifest(self) -> dict:
+        """Describe the dataset and model the embeddings are built from.
 
-        # mean pool the token-level embeddings to get sentence-level embeddings
-        embeddings = torch.sum(
-            sequence_output * inputs['attention_mask'].unsqueeze(-1),
-            dim=1,
+        Returns:
+            dict: Size and modification time of the dataset and model name.
+        """
+        if not Path(self.dataset_path).is_file():
+            return {}
+        stat = Path(self.dataset_path).stat()
+        return {
+            'dataset_size': stat.st_size,
+            'dataset_mtime': stat.st_mtime_ns,
+            'model': self.model_id,
+        }
+
+    def saved_manifest(self) -> dict:
+        """Get the manifest saved with the embeddings.
+
+        Returns:
+            dict: The saved manifest, empty if there is none.
+        """
+        if not Path(self.manifest_path).is_file():
+            return {}
+        return json.loads(Path(self.manifest_path).read_text())
+
+    def dataset_embeddings(self):
+        """Generate embeddings from the dataset.
+
+        Only rows whose text is not in the embedding cache are embedded,
+        so rebuilding after a dataset update reuses all unchanged rows.
+        """
+        df = EtymDefDataset(self.base_path).dataset()
+        df['word_etym'] = df['word'] + ' ' + df['etym']
+
+        console.log('Generating word/etym embeddings...')
+        word_keys = self.cache.text_keys(list(df['word_etym']))
+        self.seed_cache(word_keys, self.word_path)
+        self.word_embeddings = self.column_embeddings(
+            list(df['word_etym']),
+            word_keys,
+            self.word_path,
+            'word_etym',
         )
-        embeddings = embeddings / torch.clamp(
-            torch.sum(inputs['attention_mask'], dim=1, keepdims=True),
-            min=min_val,
+
+        console.log('Generating def embeddings...')
+        def_keys = self.cache.text_keys(list(df['def']))
+        self.seed_cache(def_keys, self.def_path)
+        self.def_embeddings = self.column_embeddings(
+            list(df['def']),
+            def_keys,
+            self.def_path,
+            'def',
         )
 
-        return embeddings.cpu().numpy()
+        # drop the embeddings of rows that disappeared
+        self.cache.compact(np.concatenate([word_keys, def_keys]))
+        Path(self.manifest_path).write_text(json.dumps(self.manifest()))
 
-    def load_embeddings(self) -> None:
-        """Load the embeddings."""
-        self.word_embeddings = np.load(self.word_path)
-        self.def_embeddings = np.load(self.def_path)
+    def provenance(self, keys: np.ndarray) -> dict:
+        """Describe the texts and model of embeddings.
 
-    @beartype
-    def batch_embeddings(
+        Args:
+            keys (np.ndarray): Cache keys of the rows, which hash the model
+                name and the text of every row.
+
+        Returns:
+            dict: Model name, number of rows and digest of the keys.
+        """
+        digest = hashlib.sha1(np.ascontiguousarray(keys).tobytes())
+        return {
+            'model': self.model_id,
+            'rows': len(keys),
+            'digest': digest.hexdigest(),
+        }
+
+    def seed_cache(
+        self,
+        keys: np.ndarray,
+        path: str,
+        block_size: int = 65536,
+    ) -> None:
+        """Add saved embeddings to the cache.
+
+        Saved embeddings are reused instead of embedding every row again,
+        such as when the cache was removed, but only if their provenance,
+        saved next to them by column_embeddings, matches the texts and
+        model of the current rows. Files without provenance may hold the
+        vectors of other texts or of another model, so their rows are
+        embedded again.
+
+        Args:
+            keys (np.ndarray): Cache keys of the current rows.
+            path (str): Path of the .npy embeddings.
+            block_size (int): Number of rows appended at once.
+        """
+        saved_path = Path(provenance_path(path))
+        if not saved_path.is_file():
+            return
+        if json.loads(saved_path.read_text()) != self.provenance(keys):
+            return
+        if not all(Path(saved).is_file() for saved in dedup_paths(path)):
+            return
+
+        saved = DedupEmbeddings(path)
+        missing = np.flatnonzero(self.cache.lookup(keys) < 0)
+        new_keys, first = np.unique(keys[missing], return_index=True)
+        console.log('Seeding embedding cache with {0} saved texts.'.format(
+            len(new_keys),
+        ))
+        rows = missing[first]
+        for start in range(0, len(rows), block_size):
+            self.cache.append(
+                new_keys[start:start + block_size],
+                saved[rows[start:start + block_size]],
+            )
+
+    def column_embeddings(
+        self,
+        texts: list[str],
+        keys: np.ndarray,
+        path: str,
+        column: str,
+    ) -> DedupEmbeddings:
+        """Generate and save the embeddings of a dataset column.
+
+        Args:
+            texts (list[str]): Sentences of the column.
+            keys (np.ndarray): Cache keys of the sentences.
+            path (str): Path of the .npy embeddings.
+            column (str): Text column of the dataset, see column_texts.
+
+        Returns:
+            DedupEmbeddings: Embeddings saved once per distinct sentence.
+        """
+        rows = self.cache.lookup(keys)
+        missing = np.flatnonzero(rows < 0)
+        new_keys, first = np.unique(keys[missing], return_index=True)
+        console.log('{0}/{1} rows cached, embedding {2} new texts.'.format(
+            len(texts) - len(missing),
+            len(texts),
+            len(new_keys),
+        ))
+
+        if len(new_keys):
+            self.cache.append(new_keys, self.new_embeddings(
+                texts,
+                missing[first],
+                column,
+                path,
+            ))
+
+        # the provenance only describes complete files
+        Path(provenance_path(path)).unlink(missing_ok=True)
+        unique_keys, row_map = first_seen(keys)
+        self.cache.gather(self.cache.lookup(unique_keys), dedup_paths(path)[0])
+        DedupEmbeddings.save_rows(path, row_map)
+        Path(provenance_path(path)).write_text(
+            json.dumps(self.provenance(keys)),
+        )
+
+        if Path(path).is_file():
+            # kept for the user, but no longer read in place of the new files
+            legacy_path = '{0}.legacy.npy'.format(Path(path).with_suffix(''))
+            console.log('Moving row-aligned embeddings to {0}.'.format(
+                legacy_path,
+            ))
+            os.replace(path, legacy_path)
+        return DedupEmbeddings(path)
+
+    def new_embeddings(
         self,
-        df: pd.Series,
-        batch_size=256,
+        texts: list[str],
+        rows: np.ndarray,
+        column: str,
+        path: str,
     ) -> np.ndarray:
-        """Generate embeddings in batches.
+        """Generate embeddings of rows missing from the cache.
+
+        In this process the rows are read from the token store of the
+        column, which is only opened, and built if needed, here, so a
+        fully cached rebuild tokenizes nothing. Worker processes tokenize
+        the text of their shards.
 
         Args:
-            df (pd.Series): Series of sentences to embed.
-            batch_size (int): Batch size.
+            texts (list[str]): Sentences of the column.
+            rows (np.ndarray): Rows to embed.
+            column (str): Text column of the dataset, see column_texts.
+            path (str): Path of the .npy embeddings they belong to.
 
         Returns:
             np.ndarray: Array of embeddings.
         """
-        embeddings = []
+        if self.workers is None:
+            return self.store_embeddings(
+                self.token_store(self.dataset_path, column),
+                rows,
+                token_budget=self.token_budget,
+            )
+
+        new_path = '{0}.new.npy'.format(path)
+        embeddings = np.array(sharded_embeddings(
+            [texts[idx] for idx in rows],
+            new_path,
+            shard_dir='{0}.shards'.format(path),
+            workers=self.workers,
+            model_name=self.model_name,
+            token_budget=self.token_budget,
+            quantize=self.quantize,
+        ))
+        Path(new_path).unlink()
+        return embeddings
 
-        for it in tqdm(range(0, len(df), batch_size)):
-            if it + batch_size > len(df):
-                batch = df.iloc[it:]
-            else:
-                batch = df.iloc[it:it + batch_size]
-            embeddings.append(self.generate_embeddings(list(batch.values)))
+    def load_embeddings(self) -> None:
+        """Load the embeddings.
+
+        The embeddings are memory-mapped, so processes loading the same
+        files share one page-cached copy. Rows with the same text share
+        one saved vector, and indexing returns the vectors of the rows.
+        """
+        self.word_embeddings = DedupEmbeddings(self.word_path)
+        self.def_embeddings = DedupEmbeddings(self.def_path)
 
-        return np.concatenate(embeddings)
+        if self.encoding is not None:
+            self.word_store = EmbeddingStore(self.word_path, self.encoding)
+            self.def_store = EmbeddingStore(self.def_path, self.encoding)
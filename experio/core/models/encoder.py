@@ -0,0 +1,328 @@
+"""Encode text with the universal sentence encoder declutr."""
+
+import time
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+from beartype import beartype
+from tqdm import tqdm
+
+from experio.console import console
+from experio.core.models.batching import (
+    fixed_batches,
+    padding_ratio,
+    token_batches,
+)
+from experio.core.models.quantize import quantized_model
+from experio.core.models.tokens import TokenStore
+from experio.metrics import metrics
+
+MODEL = 'johngiorgi/declutr-small'
+
+
+class Encoder(object):
+    """Encode text with the universal sentence encoder declutr."""
+
+    def __init__(
+        self,
+        model_name: str = MODEL,
+        token_budget: Optional[int] = None,
+        quantize: bool = False,
+    ):
+        """Initialize the encoder.
+
+        Args:
+            model_name (str): Name or local path of the pretrained model.
+            token_budget (Optional[int]): Maximum number of padded tokens
+                per batch when generating embeddings, see batch_embeddings.
+            quantize (bool): Whether to run the model with int8 dynamically
+                quantized Linear layers, see quantized_model.
+        """
+        self.model_name = model_name
+        self.token_budget = token_budget
+        self.quantize = quantize
+        self.load_models()
+
+    @property
+    def model_id(self) -> str:
+        """Identify the model the embeddings come from.
+
+        Returns:
+            str: Model name, suffixed with +int8 when quantized, since the
+                quantized model gives slightly different embeddings.
+        """
+        if self.quantize:
+            return '{0}+int8'.format(self.model_name)
+        return self.model_name
+
+    def load_models(self) -> None:
+        """Load the models."""
+        from transformers import AutoModel, AutoTokenizer
+
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
+        if self.quantize:
+            self.model = quantized_model(self.model_name)
+        else:
+            self.model = AutoModel.from_pretrained(self.model_name)
+
+    @beartype
+    def generate_embeddings(
+        self,
+        text: list[str],
+        min_val: int = 1e-9,
+    ) -> np.ndarray:
+        """Generate all embeddings using decluter.
+
+        Args:
+            text (list[str]): List of sentences to embed.
+            min_val (int): Minimum value to use for normalization.
+
+        Returns:
+            np.ndarray: Array of embeddings.
+        """
+        with metrics.timer('embeddings.tokenize', items=len(text)):
+            inputs = self.tokenizer(
+                text,
+                padding=True,
+                truncation=True,
+                return_tensors='pt',
+            )
+        return self.embed_tokens(inputs, min_val)
+
+    def embed_tokens(self, inputs: dict, min_val: int = 1e-9) -> np.ndarray:
+        """Generate the embeddings of tokenized sentences.
+
+        Args:
+            inputs (dict): Padded inputs of the model, tensors or arrays,
+                with at least input_ids and attention_mask.
+            min_val (int): Minimum value to use for normalization.
+
+        Returns:
+            np.ndarray: Array of embeddings.
+        """
+        import torch
+
+        inputs = {
+            name: torch.as_tensor(tensor) for name, tensor in inputs.items()
+        }
+        with metrics.timer(
+            'embeddings.generate',
+            items=len(inputs['input_ids']),
+        ):
+            # embed the text
+            with torch.no_grad():
+                sequence_output = self.model(**inputs)[0]
+
+            # mean pool the token-level embeddings to get sentence-level
+            # embeddings
+            embeddings = torch.sum(
+                sequence_output * inputs['attention_mask'].unsqueeze(-1),
+                dim=1,
+            )
+            embeddings = embeddings / torch.clamp(
+                torch.sum(inputs['attention_mask'], dim=1, keepdims=True),
+                min=min_val,
+            )
+
+        return embeddings.cpu().numpy()
+
+    def token_store(self, file_path: str, column: str) -> TokenStore:
+        """Open the pre-tokenized store of a dataset column.
+
+        Args:
+            file_path (str): Path of the arrow dataset.
+            column (str): Text column, see column_texts.
+
+        Returns:
+            TokenStore: Token ids of the column, built on first use.
+        """
+        return TokenStore(file_path, column, self.tokenizer, self.model_name)
+
+    @beartype
+    def token_lengths(
+        self,
+        text: list[str],
+        batch_size: int = 4096,
+    ) -> np.ndarray:
+        """Count the tokens of sentences as the encoder sees them.
+
+        Args:
+            text (list[str]): List of sentences.
+            batch_size (int): Number of sentences tokenized at once.
+
+        Returns:
+            np.ndarray: Number of tokens of every sentence.
+        """
+        lengths = []
+        for it in range(0, len(text), batch_size):
+            inputs = self.tokenizer(
+                text[it:it + batch_size],
+                truncation=True,
+                return_attention_mask=False,
+                return_length=True,
+            )
+            lengths.extend(inputs['length'])
+        return np.asarray(lengths, dtype=np.int64)
+
+    @beartype
+    def batch_embeddings(
+        self,
+        df: Iterable[str],
+        batch_size: int = 256,
+        token_budget: Optional[int] = None,
+        verbose: bool = True,
+    ) -> np.ndarray:
+        """Generate embeddings in batches.
+
+        By default batches hold batch_size rows in dataset order. With a
+        token budget, rows are sorted by token length and packed into
+        batches of at most token_budget padded tokens, which wastes far
+        less of the forward pass on padding. The embeddings are returned in
+        the original row order either way.
+
+        Args:
+            df (Iterable[str]): Series of sentences to embed.
+            batch_size (int): Batch size.
+            token_budget (Optional[int]): Maximum number of padded tokens
+                per batch. Defaults to None, which uses fixed batches.
+            verbose (bool): Whether to show progress and throughput.
+
+        Returns:
+            np.ndarray: Array of embeddings.
+        """
+        texts = list(df)
+        lengths = None
+        if token_budget is None:
+            batches = fixed_batches(len(texts), batch_size)
+        else:
+            lengths = self.token_lengths(texts)
+            batches = token_batches(lengths, token_budget)
+
+        return self.embed_batches(
+            batches,
+            lambda batch: self.generate_embeddings(
+                [texts[idx] for idx in batch],
+            ),
+            lengths,
+            batch_size,
+            verbose,
+        )
+
+    @beartype
+    def store_embeddings(
+        self,
+        store: TokenStore,
+        rows: Optional[np.ndarray] = None,
+        batch_size: int = 256,
+        token_budget: Optional[int] = None,
+        verbose: bool = True,
+    ) -> np.ndarray:
+        """Generate embeddings of pre-tokenized rows in batches.
+
+        Like batch_embeddings, but the inputs are read from a token store,
+        so no text is tokenized and token batches use the stored lengths.
+
+        Args:
+            store (TokenStore): Token ids of a dataset column.
+            rows (Optional[np.ndarray]): Rows to embed. Defaults to all.
+            batch_size (int): Batch size.
+            token_budget (Optional[int]): Maximum number of padded tokens
+                per batch. Defaults to None, which uses fixed batches.
+            verbose (bool): Whether to show progress and throughput.
+
+        Returns:
+            np.ndarray: Array of embeddings of the rows, in order.
+        """
+        if rows is None:
+            rows = np.arange(len(store))
+        lengths = store.lengths[rows]
+        if token_budget is None:
+            batches = fixed_batches(len(rows), batch_size)
+        else:
+            batches = token_batches(lengths, token_budget)
+
+        return self.embed_batches(
+            batches,
+            lambda batch: self.embed_tokens(store.batch(rows[batch])),
+            lengths,
+            batch_size,
+            verbose,
+        )
+
+    def embed_batches(
+        self,
+        batches: list[np.ndarray],
+        embed: Callable[[np.ndarray], np.ndarray],
+        lengths: Optional[np.ndarray],
+        batch_size: int,
+        verbose: bool,
+    ) -> np.ndarray:
+        """Embed batches of rows into one array in row order.
+
+        Args:
+            batches (list[np.ndarray]): Row indices of every batch.
+            embed (Callable[[np.ndarray], np.ndarray]): Embeds the rows of
+                a batch.
+            lengths (Optional[np.ndarray]): Number of tokens of every row,
+                if known, to log the padding ratio.
+            batch_size (int): Number of rows of fixed batches.
+            verbose (bool): Whether to show progress and throughput.
+
+        Returns:
+            np.ndarray: Array of embeddings.
+        """
+        num_rows = sum(len(batch) for batch in batches)
+        start = time.perf_counter()
+
+        with metrics.timer('embeddings.batch', items=num_rows):
+            embeddings = None
+            for batch in tqdm(batches, disable=not verbose):
+                batch_embeddings = embed(batch)
+                if embeddings is None:
+                    embeddings = np.empty(
+                        (num_rows, batch_embeddings.shape[1]),
+                        dtype=batch_embeddings.dtype,
+                    )
+                embeddings[batch] = batch_embeddings
+
+        if verbose:
+            self.log_throughput(
+                time.perf_counter() - start,
+                batches,
+                lengths,
+                batch_size,
+            )
+
+        return embeddings
+
+    def log_throughput(
+        self,
+        elapsed: float,
+        batches: list[np.ndarray],
+        lengths: Optional[np.ndarray],
+        batch_size: int,
+    ) -> None:
+        """Log the throughput and padding of batch_embeddings.
+
+        Args:
+            elapsed (float): Seconds spent embedding.
+            batches (list[np.ndarray]): Row indices of every batch.
+            lengths (Optional[np.ndarray]): Number of tokens of every row,
+                if known.
+            batch_size (int): Number of rows of fixed batches.
+        """
+        num_rows = sum(len(batch) for batch in batches)
+        console.log('Embedded {0} rows at {1:.1f} rows/sec.'.format(
+            num_rows,
+            num_rows / max(elapsed, 1e-9),
+        ))
+        if lengths is not None:
+            console.log(
+                'Padding ratio {0:.1%}'.format(
+                    padding_ratio(lengths, batches),
+                ),
+                '(fixed batches: {0:.1%}).'.format(padding_ratio(
+                    lengths,
+                    fixed_batches(num_rows, batch_size),
+                )),
+            )
@@ -0,0 +1,200 @@
+"""Batched evaluation of the definition predictor."""
+
+import json
+import time
+from typing import Optional
+
+import numpy as np
+import torch
+
+from experio.console import console
+from experio.core.models.dedup import first_rows
+from experio.core.search.exact import ExactSearch, normalize
+
+KS = (1, 5, 10)
+
+
+def predict(
+    model: torch.nn.Module,
+    inputs: np.ndarray,
+    batch_size: int = 4096,
+) -> np.ndarray:
+    """Run a model over many inputs in batched forward passes.
+
+    Args:
+        model (torch.nn.Module): Model.
+        inputs (np.ndarray): Input rows.
+        batch_size (int): Number of rows per forward pass.
+
+    Returns:
+        np.ndarray: float32 output of every row.
+    """
+    model.eval()
+    outputs = []
+    with torch.no_grad():
+        for start in range(0, len(inputs), batch_size):
+            batch = np.asarray(
+                inputs[start:start + batch_size],
+                dtype=np.float32,
+            )
+            outputs.append(model(torch.from_numpy(batch)).numpy())
+    if not outputs:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.concatenate(outputs)
+
+
+def row_cosine(first: np.ndarray, second: np.ndarray) -> np.ndarray:
+    """Compute the cosine similarity of matching rows of two arrays.
+
+    Args:
+        first (np.ndarray): First array of row vectors.
+        second (np.ndarray): Second array of row vectors.
+
+    Returns:
+        np.ndarray: Cosine similarity of every row.
+    """
+    return np.einsum('ij,ij->i', normalize(first), normalize(second))
+
+
+def hit_ranks(relevant: np.ndarray) -> np.ndarray:
+    """Find the rank of the first relevant neighbor of every query.
+
+    Args:
+        relevant (np.ndarray): Boolean matrix of whether each of the k
+            neighbors of a query is relevant, most similar first.
+
+    Returns:
+        np.ndarray: One based rank of the first relevant neighbor, 0 if
+            none of the neighbors is relevant.
+    """
+    found = relevant.any(axis=1)
+    return np.where(found, relevant.argmax(axis=1) + 1, 0)
+
+
+def retrieval_metrics(ranks: np.ndarray, ks: tuple = KS) -> dict:
+    """Compute recall@k and MRR from the ranks of the first hits.
+
+    Args:
+        ranks (np.ndarray): One based rank of the first relevant
+            neighbor of every query, 0 for a miss.
+        ks (tuple): Cut-offs to report recall at.
+
+    Returns:
+        dict: recall@k for every k and MRR at the largest k.
+    """
+    hit = (ranks > 0) & (ranks <= max(ks))
+    metrics = {
+        'recall@{0}'.format(k): float(np.mean(hit & (ranks <= k)))
+        for k in ks
+    }
+    reciprocal = np.where(hit, 1 / np.maximum(ranks, 1), 0)
+    metrics['mrr@{0}'.format(max(ks))] = float(np.mean(reciprocal))
+    return metrics
+
+
+def evaluate_predictor(
+    model: torch.nn.Module,
+    inputs: np.ndarray,
+    targets: np.ndarray,
+    rows: np.ndarray,
+    search: ExactSearch,
+    codes: Optional[np.ndarray] = None,
+    ks: tuple = KS,
+    batch_size: int = 4096,
+    candidate_rows: Optional[np.ndarray] = None,
+) -> tuple[dict, np.ndarray, np.ndarray]:
+    """Evaluate a predictor on held-out rows against all definitions.
+
+    Every row is predicted in batched forward passes and its prediction
+    searched against the whole definition matrix with blocked top-k. A
+    neighbor is relevant if it is a definition of the same word as the
+    row, or the row itself when no word codes are given.
+
+    The search can run over the distinct definitions only, such as
+    DedupEmbeddings.unique, with candidate_rows mapping every row to its
+    vector. A distinct definition is then relevant if any of its rows is,
+    and neighbors are returned as the first row of their vector.
+
+    Args:
+        model (torch.nn.Module): Model.
+        inputs (np.ndarray): Input embeddings of all rows.
+        targets (np.ndarray): Definition embeddings of all rows.
+        rows (np.ndarray): Rows to evaluate.
+        search (ExactSearch): Search over the definition embeddings.
+        codes (Optional[np.ndarray]): Word of every row, such as
+            WordIndex.codes().
+        ks (tuple): Cut-offs to report recall at.
+        batch_size (int): Number of rows per forward pass.
+        candidate_rows (Optional[np.ndarray]): Search vector of every row,
+            such as DedupEmbeddings.rows, when the search runs over
+            distinct definitions. Defaults to None, where the search holds
+            one vector per row.
+
+    Returns:
+        tuple[dict, np.ndarray, np.ndarray]: Report, predictions and
+            neighbors of every evaluated row.
+    """
+    start = time.perf_counter()
+    preds = predict(model, inputs[rows], batch_size)
+    cosine = row_cosine(preds, targets[rows])
+    predict_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    neighbors, _ = search.search(preds, max(ks))
+    search_time = time.perf_counter() - start
+
+    if candidate_rows is None:
+        if codes is None:
+            relevant = neighbors == rows[:, None]
+        else:
+            relevant = codes[neighbors] == codes[rows][:, None]
+    else:
+        candidate_rows = np.asarray(candidate_rows, dtype=np.int64)
+        if codes is None:
+            relevant = neighbors == candidate_rows[rows][:, None]
+        else:
+            # (vector, word) pairs of all rows, so a vector is relevant
+            # if any of its rows has the word of the query
+            num_codes = int(codes.max()) + 1
+            pairs = np.unique(candidate_rows * num_codes + codes)
+            wanted = neighbors * num_codes + codes[rows][:, None]
+            found = np.minimum(
+                np.searchsorted(pairs, wanted),
+                len(pairs) - 1,
+            )
+            relevant = pairs[found] == wanted
+        neighbors = first_rows(candidate_rows, len(search))[neighbors]
+    ranks = hit_ranks(relevant)
+
+    report = {
+        'queries': int(len(rows)),
+        'candidates': int(len(search)),
+        'cosine_mean': float(np.mean(cosine)),
+        'cosine_median': float(np.median(cosine)),
+        **retrieval_metrics(ranks, ks),
+        'predict_seconds': predict_time,
+        'search_seconds': search_time,
+    }
+    console.log(
+        'Evaluated {0} rows in {1:.1f}s.'.format(
+            len(rows),
+            predict_time + search_time,
+        ),
+        ', '.join(
+            '{0} {1:.3f}'.format(name, value)
+            for name, value in report.items()
+            if name.startswith(('recall', 'mrr', 'cosine'))
+        ),
+    )
+    return report, preds, neighbors
+
+
+def save_report(report: dict, file_path: str) -> None:
+    """Save an evaluation report as JSON.
+
+    Args:
+        report (dict): Report of evaluate_predictor.
+        file_path (str): Path of the JSON file.
+    """
+    with open(file_path, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
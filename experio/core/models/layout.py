@@ -0,0 +1,153 @@
+"""Training data laid out contiguously by split."""
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from experio.console import console
+
+
+def layout_digest(
+    splits: dict[str, np.ndarray],
+    source: Optional[dict] = None,
+) -> str:
+    """Identify a split of some embeddings.
+
+    Args:
+        splits (dict[str, np.ndarray]): Rows of every split, in order.
+        source (Optional[dict]): Description of the embeddings, such as
+            their manifest.
+
+    Returns:
+        str: Hex digest of the splits and the source.
+    """
+    digest = hashlib.sha1()
+    for name, rows in splits.items():
+        digest.update(name.encode())
+        digest.update(np.ascontiguousarray(rows, dtype=np.int64).tobytes())
+        digest.update(b'\0')
+    digest.update(json.dumps(source, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+class SplitLayout(object):
+    """Inputs and targets of named splits, stored one split after another.
+
+    The rows of all splits are copied once into x.npy and y.npy, split by
+    split, such as train rows then test rows, so every split is a
+    contiguous slice. The files are memory-mapped copy-on-write and the
+    splits are torch.from_numpy views of them, so loading the splits
+    copies nothing and processes training on the same layout share one
+    page-cached copy.
+    """
+
+    def __init__(self, path: str):
+        """Open a layout.
+
+        Args:
+            path (str): Directory of the layout.
+        """
+        self.path = Path(path)
+        self.meta = json.loads((self.path / 'meta.json').read_text())
+        self.x = np.load(self.path / 'x.npy', mmap_mode='c')
+        self.y = np.load(self.path / 'y.npy', mmap_mode='c')
+
+    def split(self, name: str) -> tuple:
+        """Get the inputs and targets of a split without copying them.
+
+        Args:
+            name (str): Name of the split, such as train or test.
+
+        Returns:
+            tuple[torch.Tensor, torch.Tensor]: Inputs and targets.
+        """
+        import torch
+
+        start, stop = self.meta['splits'][name]
+        return (
+            torch.from_numpy(self.x[start:stop]),
+            torch.from_numpy(self.y[start:stop]),
+        )
+
+    def rows(self, name: str) -> np.ndarray:
+        """Get the embedding rows of a split, in layout order.
+
+        Args:
+            name (str): Name of the split.
+
+        Returns:
+            np.ndarray: Rows of the split.
+        """
+        return np.load(self.path / '{0}_rows.npy'.format(name))
+
+    @classmethod
+    def open(
+        cls,
+        path: str,
+        inputs,
+        targets,
+        splits: dict[str, np.ndarray],
+        source: Optional[dict] = None,
+        block_size: int = 65536,
+    ) -> 'SplitLayout':
+        """Open the layout of a split, building it if missing or stale.
+
+        Args:
+            path (str): Directory of the layout.
+            inputs: Row-aligned input embeddings, such as
+                Embeddings.word_embeddings.
+            targets: Row-aligned target embeddings, such as
+                Embeddings.def_embeddings.
+            splits (dict[str, np.ndarray]): Rows of every split, in the
+                order they are stored.
+            source (Optional[dict]): Description of the embeddings, the
+                layout is rebuilt when it changes.
+            block_size (int): Number of rows copied at once.
+
+        Returns:
+            SplitLayout: The layout.
+        """
+        digest = layout_digest(splits, source)
+        meta_path = Path(path) / 'meta.json'
+        if not meta_path.is_file():
+            console.log('Split layout not found.')
+        elif json.loads(meta_path.read_text())['digest'] != digest:
+            console.log('Split layout is stale.')
+        else:
+            return cls(path)
+
+        console.log('Building split layout in {0}.'.format(path))
+        tmp_path = Path('{0}.tmp'.format(path))
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        tmp_path.mkdir(parents=True)
+        rows = np.concatenate(list(splits.values()))
+        for name, source_arr in (('x', inputs), ('y', targets)):
+            out = np.lib.format.open_memmap(
+                tmp_path / '{0}.npy'.format(name),
+                mode='w+',
+                dtype=np.float32,
+                shape=(len(rows), source_arr.shape[1]),
+            )
+            for start in range(0, len(rows), block_size):
+                block = rows[start:start + block_size]
+                out[start:start + len(block)] = source_arr[block]
+            out.flush()
+            del out
+        bounds = {}
+        start = 0
+        for name, split_rows in splits.items():
+            np.save(tmp_path / '{0}_rows.npy'.format(name), split_rows)
+            bounds[name] = [start, start + len(split_rows)]
+            start += len(split_rows)
+        (tmp_path / 'meta.json').write_text(json.dumps({
+            'digest': digest,
+            'splits': bounds,
+        }))
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        return cls(path)
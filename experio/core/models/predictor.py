@@ -0,0 +1,47 @@
+"""Model for predicting definition embedding given word embedding."""
+
+import math
+
+import torch
+
+from experio.console import console
+
+HIDDEN_LAYERS = 3
+
+
+def build_predictor(
+    input_neurons: int,
+    output_neurons: int,
+    hidden_layers: int = HIDDEN_LAYERS,
+) -> torch.nn.Module:
+    """Build the definition predictor.
+
+    Args:
+        input_neurons (int): Dimension of the word embeddings.
+        output_neurons (int): Dimension of the definition embeddings.
+        hidden_layers (int): Number of hidden to hidden layers.
+
+    Returns:
+        torch.nn.Module: Model.
+    """
+    hidden_neurons = int(
+        math.sqrt(input_neurons * output_neurons) / hidden_layers,
+    )
+
+    console.log('input_neurons: {0}'.format(input_neurons))
+    console.log('output_neurons: {0}'.format(output_neurons))
+    console.log('hidden layers: {0}'.format(hidden_layers))
+    console.log('hidden_neurons per layer: {0}'.format(hidden_neurons))
+
+    layers = [
+        torch.nn.Linear(input_neurons, hidden_neurons),
+        torch.nn.ReLU(),
+    ]
+    for _ in range(hidden_layers):
+        layers.extend([
+            torch.nn.Linear(hidden_neurons, hidden_neurons),
+            torch.nn.ReLU(),
+        ])
+    layers.append(torch.nn.Linear(hidden_neurons, output_neurons))
+
+    return torch.nn.Sequential(*layers)
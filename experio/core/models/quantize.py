@@ -0,0 +1,265 @@
+"""Dynamic int8 quantization of the encoder."""
+
+import os
+import pickle  # noqa: S403
+import time
+import types
+from pathlib import Path
+
+import numpy as np
+
+from experio import const
+from experio.console import console
+from experio.core.models.cache import model_slug
+from experio.core.search.exact import ExactSearch, normalize
+
+QUANTIZED_PATH = '{0}/quantized'.format(const.BASE_PATH)
+
+
+class WeightsUnpickler(pickle.Unpickler):
+    """Unpickler of tensors and plain containers only.
+
+    Any other global, such as an arbitrary function a crafted file would
+    call on load, is refused, like the weights-only loading of newer
+    torch versions.
+    """
+
+    def find_class(self, module: str, name: str):
+        """Resolve an allowed global of a pickle.
+
+        Args:
+            module (str): Module of the global.
+            name (str): Name of the global.
+
+        Returns:
+            object: The global.
+
+        Raises:
+            UnpicklingError: If the global is not a tensor rebuild
+                function, storage type, dtype or OrderedDict.
+        """
+        import torch
+
+        allowed = (
+            (module == 'torch._utils' and name.startswith('_rebuild_'))
+            or (module == 'collections' and name == 'OrderedDict')
+            or (module in {'torch', 'torch.storage'} and (
+                name.endswith('Storage')
+                or isinstance(getattr(torch, name, None), torch.dtype)
+            ))
+        )
+        if not allowed:
+            raise pickle.UnpicklingError(
+                'Refusing to load global {0}.{1}.'.format(module, name),
+            )
+        return super().find_class(module, name)
+
+
+def load_weights(file, **kwargs):
+    """Unpickle a file with WeightsUnpickler.
+
+    Args:
+        file: Binary file to read.
+        kwargs: Arguments of the unpickler.
+
+    Returns:
+        object: The unpickled weights.
+    """
+    return WeightsUnpickler(file, **kwargs).load()  # noqa: S301
+
+
+# pickle module for torch.load that only unpickles weights
+weights_pickle = types.ModuleType('weights_pickle')
+weights_pickle.Unpickler = WeightsUnpickler
+weights_pickle.load = load_weights
+
+
+def quantized_model(model_name: str, cache_dir: str = QUANTIZED_PATH):
+    """Load a pretrained model with int8 dynamically quantized Linear layers.
+
+    The weights of the Linear layers are stored as int8 and their
+    activations are quantized on the fly, which mostly speeds up the
+    matrix multiplies on CPU. The quantized weights are cached to disk, so
+    later loads skip the float32 checkpoint and the quantization. The
+    cache is rebuilt for another torch version.
+
+    Args:
+        model_name (str): Name or local path of the pretrained model.
+        cache_dir (str): Directory of the quantized weights.
+
+    Returns:
+        torch.nn.Module: The quantized model, in eval mode.
+    """
+    import torch
+    from transformers import AutoConfig, AutoModel
+
+    path = Path(cache_dir) / '{0}.int8.pt'.format(model_slug(model_name))
+    if path.is_file():
+        saved = torch.load(path, pickle_module=weights_pickle)
+        if saved['torch'] == str(torch.__version__):
+            model = quantize(AutoModel.from_config(
+                AutoConfig.from_pretrained(model_name),
+            ))
+            load_quantized(model, saved)
+            return model
+        console.log('Quantized model is from another torch version.')
+
+    console.log('Quantizing {0}.'.format(model_name))
+    model = quantize(AutoModel.from_pretrained(model_name))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = '{0}.tmp'.format(path)
+    torch.save(dump_quantized(model), tmp_path)
+    os.replace(tmp_path, path)
+    return model
+
+
+def quantize(model):
+    """Quantize the Linear layers of a model to int8.
+
+    Args:
+        model (torch.nn.Module): Float32 model.
+
+    Returns:
+        torch.nn.Module: Quantized model, in eval mode.
+    """
+    import torch
+
+    model.eval()
+    return torch.quantization.quantize_dynamic(
+        model,
+        {torch.nn.Linear},
+        dtype=torch.qint8,
+    )
+
+
+def dump_quantized(model) -> dict:
+    """Get the weights of a quantized model as plain tensors.
+
+    Quantized weights are kept as their int8 values with their scale and
+    zero point, so the file holds no quantized tensor objects and loads
+    with WeightsUnpickler, which runs no arbitrary code.
+
+    Args:
+        model (torch.nn.Module): Quantized model.
+
+    Returns:
+        dict: Torch version, float tensors and quantized Linear weights.
+    """
+    import torch
+
+    linear = {}
+    for name, module in model.named_modules():
+        # a quantized Linear packs its weights in a child module
+        packed = getattr(module, '_packed_params', None)
+        if not isinstance(packed, torch.nn.Module):
+            continue
+        weight = module.weight()
+        if weight.qscheme() != torch.per_tensor_affine:
+            raise ValueError('Unsupported quantization scheme.')
+        linear[name] = {
+            'int8': weight.int_repr(),
+            'scale': torch.tensor(weight.q_scale()),
+            'zero_point': torch.tensor(weight.q_zero_point()),
+            'bias': module.bias(),
+        }
+
+    tensors = {
+        name: tensor
+        for name, tensor in model.state_dict().items()
+        if isinstance(tensor, torch.Tensor)
+        and not tensor.is_quantized
+        and name.rsplit('.', 1)[0] not in linear
+    }
+    return {
+        'torch': str(torch.__version__),
+        'tensors': tensors,
+        'linear': linear,
+    }
+
+
+def load_quantized(model, saved: dict) -> None:
+    """Load the weights of dump_quantized into a quantized model.
+
+    Args:
+        model (torch.nn.Module): Quantized model of the same architecture.
+        saved (dict): Weights of dump_quantized.
+    """
+    import torch
+
+    # the Linear layers of the new model fill the missing entries, their
+    # weights are replaced right after
+    state = model.state_dict()
+    state.update(saved['tensors'])
+    model.load_state_dict(state)
+    modules = dict(model.named_modules())
+    for name, params in saved['linear'].items():
+        scale = float(params['scale'])
+        zero_point = int(params['zero_point'])
+        # the dequantized values requantize to the same int8 values
+        weight = torch.quantize_per_tensor(
+            (params['int8'].float() - zero_point) * scale,
+            scale,
+            zero_point,
+            torch.qint8,
+        )
+        modules[name].set_weight_bias(weight, params['bias'])
+
+
+def compare_encoders(
+    reference,
+    candidate,
+    texts: list[str],
+    k_neighbors: int = 10,
+) -> dict:
+    """Compare the embeddings and throughput of two encoders.
+
+    Args:
+        reference (Encoder): Reference encoder, such as float32.
+        candidate (Encoder): Encoder to compare, such as int8.
+        texts (list[str]): Sentences to embed with both.
+        k_neighbors (int): Number of neighbors compared per sentence.
+
+    Returns:
+        dict: Cosine agreement of the embeddings of every sentence, mean
+            overlap of the nearest neighbors of every sentence among the
+            others, and rows/sec of both encoders.
+    """
+    report = {'rows': len(texts)}
+    embeddings = []
+    for name, encoder in (('reference', reference), ('candidate', candidate)):
+        start = time.perf_counter()
+        embeddings.append(normalize(encoder.batch_embeddings(
+            texts,
+            token_budget=encoder.token_budget,
+            verbose=False,
+        )))
+        elapsed = time.perf_counter() - start
+        report['{0}_rows_per_sec'.format(name)] = len(texts) / elapsed
+
+    cosine = np.einsum('ij,ij->i', *embeddings)
+    report['cosine_mean'] = float(cosine.mean())
+    report['cosine_min'] = float(cosine.min())
+    report['cosine_p01'] = float(np.percentile(cosine, 1))
+
+    # a sentence is its own nearest neighbor, so it is left out
+    neighbors = [
+        [
+            [idx for idx in row if idx != it][:k_neighbors]
+            for it, row in enumerate(ExactSearch(
+                arr,
+                normalized=True,
+            ).search(arr, k_neighbors + 1)[0])
+        ]
+        for arr in embeddings
+    ]
+    overlap = [
+        len(set(ref) & set(cand)) / k_neighbors
+        for ref, cand in zip(*neighbors)
+    ]
+    report['neighbor_overlap@{0}'.format(k_neighbors)] = float(
+        np.mean(overlap),
+    )
+    report['speedup'] = (
+        report['candidate_rows_per_sec'] / report['reference_rows_per_sec']
+    )
+    return report
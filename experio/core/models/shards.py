@@ -0,0 +1,195 @@
+"""Generate embeddings in resumable shards across worker processes."""
+
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from beartype import beartype
+from tqdm import tqdm
+
+from experio.console import console
+from experio.core.models.batching import fixed_batches
+from experio.core.models.encoder import MODEL, Encoder
+
+# encoder of a worker process, loaded once by its initializer
+_worker = {}
+
+
+def _init_worker(
+    model_name: str,
+    token_budget: Optional[int],
+    quantize: bool,
+    num_threads: int,
+) -> None:
+    import torch
+
+    torch.set_num_threads(num_threads)
+    _worker['encoder'] = Encoder(model_name, token_budget, quantize)
+
+
+def _embed_shard(texts: list[str], path: str) -> str:
+    encoder = _worker['encoder']
+    embeddings = encoder.batch_embeddings(
+        texts,
+        token_budget=encoder.token_budget,
+        verbose=False,
+    )
+
+    # a shard only exists on disk once it is complete
+    tmp_path = '{0}.tmp.npy'.format(path)
+    np.save(tmp_path, embeddings)
+    os.replace(tmp_path, path)
+    return path
+
+
+def shard_manifest(
+    texts: list[str],
+    shard_size: int,
+    model_name: str,
+    quantize: bool = False,
+) -> dict:
+    """Describe a sharded job, so stale shards are never resumed.
+
+    Args:
+        texts (list[str]): Sentences to embed.
+        shard_size (int): Number of sentences per shard.
+        model_name (str): Name or local path of the pretrained model.
+        quantize (bool): Whether the model is int8 quantized.
+
+    Returns:
+        dict: Manifest of the job.
+    """
+    digest = hashlib.sha1()
+    for text in texts:
+        digest.update(text.encode('utf-8'))
+        digest.update(b'\0')
+    return {
+        'rows': len(texts),
+        'shard_size': shard_size,
+        'model': model_name,
+        'quantize': quantize,
+        'digest': digest.hexdigest(),
+    }
+
+
+@beartype
+def sharded_embeddings(
+    texts: list[str],
+    out_path: str,
+    shard_dir: str,
+    shard_size: int = 16384,
+    workers: Optional[int] = None,
+    threads_per_worker: Optional[int] = None,
+    model_name: str = MODEL,
+    token_budget: Optional[int] = None,
+    quantize: bool = False,
+) -> np.ndarray:
+    """Generate embeddings in shards with a pool of worker processes.
+
+    Every finished shard is saved to shard_dir, and a restarted job only
+    embeds the shards that are missing. Once all shards exist they are
+    merged into out_path and shard_dir is removed.
+
+    Args:
+        texts (list[str]): Sentences to embed.
+        out_path (str): Path of the merged .npy embeddings.
+        shard_dir (str): Directory of the shards.
+        shard_size (int): Number of sentences per shard.
+        workers (Optional[int]): Number of worker processes. Defaults to
+            the number of cores.
+        threads_per_worker (Optional[int]): Number of torch threads of
+            every worker. Defaults to splitting the cores between workers.
+        model_name (str): Name or local path of the pretrained model.
+        token_budget (Optional[int]): Maximum number of padded tokens per
+            batch, see Encoder.batch_embeddings.
+        quantize (bool): Whether to run the int8 quantized model.
+
+    Returns:
+        np.ndarray: Memory-mapped merged embeddings.
+    """
+    cores = os.cpu_count() or 1
+    workers = workers or cores
+    threads_per_worker = threads_per_worker or max(1, cores // workers)
+
+    # start over if the shards belong to another job
+    manifest = shard_manifest(texts, shard_size, model_name, quantize)
+    manifest_path = Path(shard_dir) / 'manifest.json'
+    if manifest_path.is_file():
+        if json.loads(manifest_path.read_text()) != manifest:
+            console.log('Discarding shards of a different job.')
+            shutil.rmtree(shard_dir)
+    Path(shard_dir).mkdir(parents=True, exist_ok=True)
+    manifest_path.write_text(json.dumps(manifest))
+
+    shards = fixed_batches(len(texts), shard_size)
+    paths = [
+        str(Path(shard_dir) / '{0:05d}.npy'.format(it))
+        for it in range(len(shards))
+    ]
+    pending = [it for it, path in enumerate(paths) if not Path(path).is_file()]
+    console.log('{0}/{1} shards done, embedding {2} with {3} workers.'.format(
+        len(shards) - len(pending),
+        len(shards),
+        len(pending),
+        workers,
+    ))
+
+    if pending:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(
+                model_name,
+                token_budget,
+                quantize,
+                threads_per_worker,
+            ),
+        ) as pool:
+            futures = [
+                pool.submit(
+                    _embed_shard,
+                    texts[shards[it][0]:shards[it][-1] + 1],
+                    paths[it],
+                )
+                for it in pending
+            ]
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                future.result()
+
+    merge_shards(paths, out_path)
+    shutil.rmtree(shard_dir)
+    return np.load(out_path, mmap_mode='r')
+
+
+@beartype
+def merge_shards(paths: list[str], out_path: str) -> None:
+    """Concatenate saved shards into one .npy file.
+
+    Args:
+        paths (list[str]): Paths of the shards, in row order.
+        out_path (str): Path of the merged .npy file.
+    """
+    console.log('Merging {0} shards into {1}.'.format(len(paths), out_path))
+    shards = [np.load(path, mmap_mode='r') for path in paths]
+    tmp_path = '{0}.tmp'.format(out_path)
+    merged = np.lib.format.open_memmap(
+        tmp_path,
+        mode='w+',
+        dtype=shards[0].dtype,
+        shape=(sum(len(shard) for shard in shards), shards[0].shape[1]),
+    )
+
+    start = 0
+    for shard in shards:
+        merged[start:start + len(shard)] = shard
+        start += len(shard)
+
+    merged.flush()
+    os.replace(tmp_path, out_path)
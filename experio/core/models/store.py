@@ -0,0 +1,131 @@
+"""Memory-mapped store of normalized, optionally quantized embeddings."""
+
+import os
+from pathlib import Path
+
+import numpy as np
+
+from experio.console import console
+from experio.core.models.dedup import embeddings_mtime, open_embeddings
+from experio.core.search.exact import normalize
+
+ENCODINGS = {
+    'float32': np.float32,
+    'float16': np.float16,
+    'int8': np.int8,
+}
+INT8_MAX = 127
+
+
+class EmbeddingStore(object):
+    """Memory-mapped store of L2-normalized embeddings.
+
+    The store is derived from a saved .npy embedding matrix and opened
+    with memory mapping, so processes reading the same store share one
+    page-cached copy and opening it does not depend on its size. Rows are
+    normalized before encoding, so cosine similarity is a dot product and
+    the store can be searched directly with ExactSearch(store,
+    normalized=True). The int8 encoding keeps one float32 scale per row.
+    """
+
+    def __init__(self, source_path: str, encoding: str = 'float32'):
+        """Open the store, building it if it is missing or stale.
+
+        Args:
+            source_path (str): Path of the .npy embeddings, row-aligned or
+                deduplicated, see open_embeddings.
+            encoding (str): One of float32, float16 or int8.
+
+        Raises:
+            ValueError: If the encoding is unknown.
+            FileNotFoundError: If the source embeddings are missing.
+        """
+        if encoding not in ENCODINGS:
+            raise ValueError('Unknown encoding "{0}".'.format(encoding))
+
+        stem = str(Path(source_path).with_suffix(''))
+        self.source_path = source_path
+        self.encoding = encoding
+        self.path = '{0}.{1}.npy'.format(stem, encoding)
+        self.scale_path = '{0}.{1}.scale.npy'.format(stem, encoding)
+
+        source_time = embeddings_mtime(source_path)
+        if source_time is None:
+            raise FileNotFoundError(
+                'Embeddings {0} not found.'.format(source_path),
+            )
+        if not Path(self.path).is_file():
+            console.log('Embedding store not found.')
+            self.build()
+        elif Path(self.path).stat().st_mtime < source_time:
+            console.log('Embedding store is stale.')
+            self.build()
+
+        self.vectors = np.load(self.path, mmap_mode='r')
+        self.scales = None
+        if encoding == 'int8':
+            self.scales = np.load(self.scale_path, mmap_mode='r')
+
+    def __len__(self) -> int:
+        """Get the number of stored embeddings.
+
+        Returns:
+            int: Number of embeddings.
+        """
+        return len(self.vectors)
+
+    def __getitem__(self, idx) -> np.ndarray:
+        """Get decoded rows of the store.
+
+        Args:
+            idx: Index, slice or array of indices.
+
+        Returns:
+            np.ndarray: Normalized float32 embeddings.
+        """
+        rows = np.asarray(self.vectors[idx], dtype=np.float32)
+        if self.scales is None:
+            return rows
+        scales = np.asarray(self.scales[idx], dtype=np.float32)
+        return rows * scales[..., None]
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        """Get the shape of the stored matrix.
+
+        Returns:
+            tuple[int, int]: Number of rows and dimension.
+        """
+        return self.vectors.shape
+
+    def build(self, block_size: int = 65536) -> None:
+        """Normalize and encode the source embeddings into the store.
+
+        Args:
+            block_size (int): Number of rows encoded at once.
+        """
+        console.log('Building {0} embedding store.'.format(self.encoding))
+        source = open_embeddings(self.source_path)
+        tmp_path = '{0}.tmp'.format(self.path)
+        vectors = np.lib.format.open_memmap(
+            tmp_path,
+            mode='w+',
+            dtype=ENCODINGS[self.encoding],
+            shape=source.shape,
+        )
+        scales = np.empty(len(source), dtype=np.float32)
+
+        for start in range(0, len(source), block_size):
+            block = normalize(source[start:start + block_size])
+            stop = start + len(block)
+            if self.encoding == 'int8':
+                scale = np.max(np.abs(block), axis=1) / INT8_MAX
+                scale = np.maximum(scale, np.finfo(np.float32).tiny)
+                block = np.rint(block / scale[:, None])
+                scales[start:stop] = scale
+            vectors[start:stop] = block
+
+        vectors.flush()
+        if self.encoding == 'int8':
+            np.save(self.scale_path, scales)
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,197 @@
+"""Train many predictor configurations at once across worker processes."""
+
+import itertools
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Optional
+
+from tqdm import tqdm
+
+from experio.console import console
+from experio.core.models.layout import SplitLayout
+from experio.core.models.predictor import HIDDEN_LAYERS
+from experio.core.models.training import (
+    BATCH_SIZE,
+    LEARNING_RATE,
+    RANDOM_SEED,
+)
+
+SPLITS = ('train', 'val', 'test')
+
+# memory-mapped splits of a worker process, loaded once by its initializer
+_worker = {}
+
+
+def _init_worker(layout_path: str, num_threads: int) -> None:
+    import torch
+
+    torch.set_num_threads(num_threads)
+    # copy-on-write views, so the pages stay shared with the other workers
+    layout = SplitLayout(layout_path)
+    for name in SPLITS:
+        split_x, split_y = layout.split(name)
+        _worker['{0}_x'.format(name)] = split_x
+        _worker['{0}_y'.format(name)] = split_y
+
+
+def _train_config(config: dict, checkpoint_path: str) -> dict:
+    import torch
+
+    from experio.core.models.predictor import build_predictor
+    from experio.core.models.training import (
+        evaluate_loss,
+        save_checkpoint,
+        train_predictor,
+    )
+
+    start = time.perf_counter()
+    torch.manual_seed(config['random_seed'])
+    model = build_predictor(
+        _worker['train_x'].shape[1],
+        _worker['train_y'].shape[1],
+        hidden_layers=config['hidden_layers'],
+    )
+    losses = train_predictor(
+        model,
+        _worker['train_x'],
+        _worker['train_y'],
+        epochs=config['epochs'],
+        batch_size=config['batch_size'],
+        learning_rate=config['learning_rate'],
+        random_seed=config['random_seed'],
+    )
+    val_loss = evaluate_loss(model, _worker['val_x'], _worker['val_y'])
+
+    save_checkpoint(model.state_dict(), checkpoint_path)
+    return dict(
+        config,
+        train_loss=losses[-1] if losses else None,
+        val_loss=val_loss,
+        seconds=time.perf_counter() - start,
+        checkpoint=checkpoint_path,
+    )
+
+
+def sweep_grid(
+    hidden_layers: tuple = (HIDDEN_LAYERS,),
+    learning_rate: tuple = (LEARNING_RATE,),
+    epochs: tuple = (3,),
+    batch_size: tuple = (BATCH_SIZE,),
+    random_seed: tuple = (RANDOM_SEED,),
+) -> list[dict]:
+    """Build every combination of hyperparameter values.
+
+    Args:
+        hidden_layers (tuple): Numbers of hidden layers.
+        learning_rate (tuple): Learning rates.
+        epochs (tuple): Numbers of epochs.
+        batch_size (tuple): Batch sizes.
+        random_seed (tuple): Random seeds of the weights and shuffling.
+
+    Returns:
+        list[dict]: One configuration per combination.
+    """
+    names = (
+        'hidden_layers',
+        'learning_rate',
+        'epochs',
+        'batch_size',
+        'random_seed',
+    )
+    values = (hidden_layers, learning_rate, epochs, batch_size, random_seed)
+    return [
+        dict(zip(names, combination))
+        for combination in itertools.product(*values)
+    ]
+
+
+def run_sweep(
+    layout_path: str,
+    configs: list[dict],
+    out_path: str,
+    workers: Optional[int] = None,
+    threads_per_worker: Optional[int] = None,
+) -> list[dict]:
+    """Train and evaluate predictor configurations in a process pool.
+
+    Every worker memory-maps the splits of the same SplitLayout, so all
+    workers share one page-cached copy and nothing is copied. Every
+    configuration is trained on the train split and ranked by its loss on
+    the validation split. Only the best configuration is scored on the
+    test split, so the test loss is not used to pick it. The results are
+    saved as one table to out_path/results.json, best first, and only the
+    checkpoint of the best configuration is kept, as out_path/best.pt.
+
+    Args:
+        layout_path (str): Directory of a SplitLayout with train, val and
+            test splits.
+        configs (list[dict]): Configurations, see sweep_grid.
+        out_path (str): Directory of the sweep.
+        workers (Optional[int]): Number of worker processes. Defaults to
+            the number of cores, at most one per configuration.
+        threads_per_worker (Optional[int]): Number of torch threads of
+            every worker. Defaults to splitting the cores between workers.
+
+    Returns:
+        list[dict]: Configurations with their losses, best first. The
+            best one also has its test loss.
+    """
+    import torch
+
+    from experio.core.models.predictor import build_predictor
+    from experio.core.models.training import evaluate_loss
+
+    cores = os.cpu_count() or 1
+    workers = workers or min(cores, len(configs))
+    threads_per_worker = threads_per_worker or max(1, cores // workers)
+
+    checkpoint_path = Path(out_path) / 'checkpoints'
+    checkpoint_path.mkdir(parents=True, exist_ok=True)
+
+    console.log('Training {0} configurations with {1} workers.'.format(
+        len(configs),
+        workers,
+    ))
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(str(layout_path), threads_per_worker),
+    ) as pool:
+        futures = [
+            pool.submit(
+                _train_config,
+                config,
+                str(checkpoint_path / '{0:04d}.pt'.format(it)),
+            )
+            for it, config in enumerate(configs)
+        ]
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            results.append(future.result())
+
+    results.sort(key=lambda result: result['val_loss'])
+    best = results[0]
+    os.replace(best['checkpoint'], Path(out_path) / 'best.pt')
+
+    # score the chosen configuration on the held-out test split
+    test_x, test_y = SplitLayout(layout_path).split('test')
+    model = build_predictor(
+        test_x.shape[1],
+        test_y.shape[1],
+        hidden_layers=best['hidden_layers'],
+    )
+    model.load_state_dict(torch.load(Path(out_path) / 'best.pt'))
+    best['test_loss'] = evaluate_loss(model, test_x, test_y)
+    shutil.rmtree(checkpoint_path)
+    for result in results:
+        del result['checkpoint']
+    (Path(out_path) / 'results.json').write_text(json.dumps(results, indent=2))
+
+    console.log('Best configuration: {0}'.format(json.dumps(best)))
+    return results
@@ -0,0 +1,184 @@
+"""Store of the pre-tokenized text columns of a dataset."""
+
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from beartype import beartype
+
+from experio.console import console
+from experio.core.dataset.reader import ArrowReader
+from experio.core.models.cache import model_slug
+
+# word_etym is not stored in the dataset, it joins the word and its etymology
+TOKEN_COLUMNS = ('word_etym', 'def')
+
+
+def column_texts(reader: ArrowReader, column: str) -> pa.ChunkedArray:
+    """Read a text column of the dataset as the encoder embeds it.
+
+    Args:
+        reader (ArrowReader): Reader of the dataset.
+        column (str): word_etym, or a string column of the dataset.
+
+    Returns:
+        pa.ChunkedArray: Text of every row.
+    """
+    if column == 'word_etym':
+        return pc.binary_join_element_wise(
+            reader.column('word'),
+            reader.column('etym'),
+            ' ',
+        )
+    return reader.column(column)
+
+
+class TokenStore(object):
+    """Token ids of a text column, tokenized once for all embedding runs.
+
+    The ids of all rows are concatenated in one flat int32 array, and the
+    ids of row i are ids[offsets[i]:offsets[i + 1]], as the tokenizer of
+    the encoder returns them with truncation. Both arrays are saved as .npy
+    files in <stem>.tokens/<model> next to the dataset and memory-mapped.
+    They are rebuilt when the dataset changes.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        column: str,
+        tokenizer: Any,
+        model_name: str,
+        batch_size: int = 4096,
+    ):
+        """Open the store of a column, tokenizing it if missing or stale.
+
+        Args:
+            file_path (str): Path of the arrow dataset.
+            column (str): Text column, see column_texts.
+            tokenizer (Any): Tokenizer of the encoder.
+            model_name (str): Name or local path of the pretrained model
+                the tokenizer belongs to.
+            batch_size (int): Number of rows tokenized at once when
+                building the store.
+        """
+        self.file_path = file_path
+        self.column = column
+        self.tokenizer = tokenizer
+        self.model_name = model_name
+        self.batch_size = batch_size
+
+        base_path = Path('{0}.tokens'.format(Path(file_path).with_suffix('')))
+        base_path = base_path / model_slug(model_name)
+        self.ids_path = base_path / '{0}.ids.npy'.format(column)
+        self.offsets_path = base_path / '{0}.offsets.npy'.format(column)
+        self.manifest_path = base_path / '{0}.json'.format(column)
+
+        if not self.manifest_path.is_file():
+            console.log('Tokens of {0} not found.'.format(column))
+            self.build()
+        elif self.saved_manifest()['dataset'] != self.dataset_manifest():
+            console.log('Tokens of {0} are stale.'.format(column))
+            self.build()
+
+        self.pad_id = self.saved_manifest()['pad_id']
+        self.ids = np.load(self.ids_path, mmap_mode='r')
+        self.offsets = np.load(self.offsets_path)
+        self.lengths = np.diff(self.offsets)
+
+    def __len__(self) -> int:
+        """Get the number of rows.
+
+        Returns:
+            int: Number of rows of the column.
+        """
+        return len(self.lengths)
+
+    def dataset_manifest(self) -> dict:
+        """Describe the dataset the tokens are built from.
+
+        Returns:
+            dict: Size and modification time of the dataset.
+        """
+        stat = Path(self.file_path).stat()
+        return {'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+
+    def saved_manifest(self) -> dict:
+        """Get the manifest saved with the tokens.
+
+        Returns:
+            dict: Dataset, padding id and number of rows and tokens.
+        """
+        return json.loads(self.manifest_path.read_text())
+
+    def build(self) -> None:
+        """Tokenize the column and save its ids and offsets."""
+        console.log('Tokenizing {0} of {1}.'.format(
+            self.column,
+            self.file_path,
+        ))
+        texts = column_texts(ArrowReader(self.file_path), self.column)
+        ids = []
+        lengths = []
+        for start in range(0, len(texts), self.batch_size):
+            inputs = self.tokenizer(
+                texts.slice(start, self.batch_size).to_pylist(),
+                truncation=True,
+                return_attention_mask=False,
+                return_token_type_ids=False,
+            )
+            for row_ids in inputs['input_ids']:
+                ids.append(np.asarray(row_ids, dtype=np.int32))
+                lengths.append(len(row_ids))
+
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        flat = np.concatenate(ids) if ids else np.empty(0, dtype=np.int32)
+
+        # the manifest is written last, so a store only exists once complete
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        for path, array in (
+            (self.ids_path, flat),
+            (self.offsets_path, offsets),
+        ):
+            tmp_path = '{0}.tmp.npy'.format(path)
+            np.save(tmp_path, array)
+            os.replace(tmp_path, path)
+        self.manifest_path.write_text(json.dumps({
+            'dataset': self.dataset_manifest(),
+            'model': self.model_name,
+            'pad_id': self.tokenizer.pad_token_id or 0,
+            'rows': len(lengths),
+            'tokens': len(flat),
+        }))
+        console.log('Tokenized {0} rows into {1} tokens.'.format(
+            len(lengths),
+            len(flat),
+        ))
+
+    @beartype
+    def batch(self, rows: np.ndarray) -> dict[str, np.ndarray]:
+        """Get the padded inputs of the encoder for some rows.
+
+        Args:
+            rows (np.ndarray): Rows of the batch.
+
+        Returns:
+            dict[str, np.ndarray]: input_ids and attention_mask, padded to
+                the longest row of the batch.
+        """
+        lengths = self.lengths[rows]
+        positions = np.arange(lengths.max(initial=0))
+        mask = positions < lengths[:, None]
+        input_ids = np.full(mask.shape, self.pad_id, dtype=np.int64)
+        input_ids[mask] = self.ids[
+            (self.offsets[rows][:, None] + positions)[mask]
+        ]
+        return {
+            'input_ids': input_ids,
+            'attention_mask': mask.astype(np.int64),
+        }
@@ -0,0 +1,289 @@
+"""Mini-batch training of the definition predictor."""
+
+import copy
+import os
+import time
+from pathlib import Path
+from typing import Iterator, Optional
+
+import torch
+
+from experio.console import console
+from experio.metrics import metrics
+
+BATCH_SIZE = 256
+LEARNING_RATE = 0.001
+RANDOM_SEED = 5
+LAST_CHECKPOINT = 'last.pt'
+BEST_CHECKPOINT = 'best.pt'
+
+
+def predictor_loss(
+    y_pred: torch.Tensor,
+    y_label: torch.Tensor,
+) -> torch.Tensor:
+    """Compute the mean squared error plus the mean cosine distance.
+
+    Both terms are differentiable, so the cosine distance is optimized
+    together with the squared error.
+
+    Args:
+        y_pred (torch.Tensor): Predicted embeddings.
+        y_label (torch.Tensor): Expected embeddings.
+
+    Returns:
+        torch.Tensor: Scalar loss.
+    """
+    mse = torch.nn.functional.mse_loss(y_pred, y_label)
+    cosine = torch.nn.functional.cosine_similarity(y_pred, y_label, dim=-1)
+    return mse + torch.mean(1 - cosine)
+
+
+def batches(
+    num_rows: int,
+    batch_size: int = BATCH_SIZE,
+    generator: Optional[torch.Generator] = None,
+) -> Iterator[torch.Tensor]:
+    """Iterate over mini-batches of row indices.
+
+    Args:
+        num_rows (int): Number of rows.
+        batch_size (int): Number of rows per batch.
+        generator (Optional[torch.Generator]): Generator to shuffle the
+            rows with, or None to keep them in order.
+
+    Yields:
+        torch.Tensor: Row indices of a batch.
+    """
+    if generator is None:
+        order = torch.arange(num_rows)
+    else:
+        order = torch.randperm(num_rows, generator=generator)
+    yield from torch.split(order, batch_size)
+
+
+def evaluate_loss(
+    model: torch.nn.Module,
+    x_data: torch.Tensor,
+    y_label: torch.Tensor,
+    batch_size: int = 4096,
+) -> float:
+    """Compute the loss of a model over a dataset.
+
+    Args:
+        model (torch.nn.Module): Model.
+        x_data (torch.Tensor): Inputs.
+        y_label (torch.Tensor): Labels.
+        batch_size (int): Number of rows evaluated at once.
+
+    Returns:
+        float: Mean loss over the rows.
+    """
+    model.eval()
+    total = 0.0
+    timer = metrics.timer('training.evaluate', items=len(x_data))
+    with timer, torch.no_grad():
+        for idxs in batches(len(x_data), batch_size):
+            loss = predictor_loss(model(x_data[idxs]), y_label[idxs])
+            total += loss.item() * len(idxs)
+    return total / max(len(x_data), 1)
+
+
+def save_checkpoint(state: dict, file_path: str) -> None:
+    """Save a checkpoint atomically.
+
+    The checkpoint is written under a temporary name and renamed into
+    place, so an interrupted save never leaves a truncated file.
+
+    Args:
+        state (dict): Tensors and plain values to save.
+        file_path (str): Path of the checkpoint.
+    """
+    tmp_path = '{0}.tmp'.format(file_path)
+    torch.save(state, tmp_path)
+    os.replace(tmp_path, file_path)
+
+
+def best_checkpoint(checkpoint_path: str) -> Optional[dict]:
+    """Load the checkpoint with the lowest validation loss.
+
+    Args:
+        checkpoint_path (str): Directory of the checkpoints.
+
+    Returns:
+        Optional[dict]: Model state, epoch and validation loss, None if
+            there is no checkpoint.
+    """
+    file_path = Path(checkpoint_path) / BEST_CHECKPOINT
+    if not file_path.is_file():
+        return None
+    return torch.load(file_path)
+
+
+def train_predictor(
+    model: torch.nn.Module,
+    train_x: torch.Tensor,
+    train_y: torch.Tensor,
+    epochs: int = 3,
+    batch_size: int = BATCH_SIZE,
+    learning_rate: float = LEARNING_RATE,
+    num_threads: Optional[int] = None,
+    random_seed: int = RANDOM_SEED,
+    val_x: Optional[torch.Tensor] = None,
+    val_y: Optional[torch.Tensor] = None,
+    patience: Optional[int] = None,
+    checkpoint_path: Optional[str] = None,
+    data_id: Optional[str] = None,
+) -> list[float]:
+    """Train a model with shuffled mini-batches.
+
+    With validation data, the model is evaluated on it after every epoch,
+    training stops once the validation loss has not improved for patience
+    epochs, and the model ends with the weights of its best epoch.
+
+    With a checkpoint directory, the model, optimizer and shuffling state
+    are saved after every epoch to last.pt, and the best weights to
+    best.pt. A run with the same directory, hyperparameters, model shape
+    and data resumes from last.pt, so an interrupted run loses at most one
+    epoch, and a finished run trains no further. Checkpoints of any other
+    run are discarded.
+
+    Args:
+        model (torch.nn.Module): Model.
+        train_x (torch.Tensor): Training data.
+        train_y (torch.Tensor): Training labels.
+        epochs (int): Maximum number of passes over the training data.
+        batch_size (int): Number of rows per optimizer step.
+        learning_rate (float): Learning rate of Adam.
+        num_threads (Optional[int]): Number of torch threads. Defaults to
+            the torch default.
+        random_seed (int): Random seed for shuffling.
+        val_x (Optional[torch.Tensor]): Validation data, held out from
+            training.
+        val_y (Optional[torch.Tensor]): Validation labels.
+        patience (Optional[int]): Number of epochs without improvement of
+            the validation loss before stopping. Defaults to None, which
+            never stops early.
+        checkpoint_path (Optional[str]): Directory of the checkpoints.
+            Defaults to None, which saves none.
+        data_id (Optional[str]): Identity of the training data, such as
+            the digest of its SplitLayout, checked with the number of rows
+            before resuming.
+
+    Returns:
+        list[float]: Mean training loss of every epoch, including the
+            epochs of a resumed run.
+    """
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+
+    optimizer = torch.optim.Adam(model.parameters(), lr=learning_rate)
+    generator = torch.Generator().manual_seed(random_seed)
+    validate = val_x is not None and val_y is not None
+    config = {
+        'batch_size': batch_size,
+        'learning_rate': learning_rate,
+        'random_seed': random_seed,
+        'train_rows': len(train_x),
+        'val_rows': len(val_x) if validate else 0,
+        'data': data_id,
+        'model': {
+            name: list(tensor.shape)
+            for name, tensor in model.state_dict().items()
+        },
+    }
+    state = {
+        'epoch': 0,
+        'epoch_losses': [],
+        'val_losses': [],
+        'best_loss': None,
+        'bad_epochs': 0,
+        'stopped': False,
+    }
+    best_state = None
+
+    last_path = None
+    if checkpoint_path is not None:
+        Path(checkpoint_path).mkdir(parents=True, exist_ok=True)
+        last_path = Path(checkpoint_path) / LAST_CHECKPOINT
+        best_path = Path(checkpoint_path) / BEST_CHECKPOINT
+    if last_path is not None and last_path.is_file():
+        checkpoint = torch.load(last_path)
+        if checkpoint['config'] == config:
+            model.load_state_dict(checkpoint['model'])
+            optimizer.load_state_dict(checkpoint['optimizer'])
+            generator.set_state(checkpoint['generator'])
+            state = checkpoint['state']
+            console.log('Resuming training after epoch {0}.'.format(
+                state['epoch'],
+            ))
+        else:
+            console.log('Checkpoint is from another run, starting over.')
+            best_path.unlink(missing_ok=True)
+
+    while state['epoch'] < epochs and not state['stopped']:
+        model.train()
+        start = time.perf_counter()
+        total = 0.0
+        with metrics.timer('training.epoch', items=len(train_x)):
+            for idxs in batches(len(train_x), batch_size, generator):
+                # forward pass
+                loss = predictor_loss(model(train_x[idxs]), train_y[idxs])
+
+                # backward pass
+                optimizer.zero_grad()
+                loss.backward()
+                optimizer.step()
+                total += loss.item() * len(idxs)
+
+        elapsed = time.perf_counter() - start
+        state['epoch'] += 1
+        state['epoch_losses'].append(total / max(len(train_x), 1))
+        console.log(
+            'Epoch {0}/{1}'.format(state['epoch'], epochs),
+            'Loss: {0:.4f}'.format(state['epoch_losses'][-1]),
+            '{0:.0f} samples/sec'.format(len(train_x) / max(elapsed, 1e-9)),
+        )
+
+        if validate:
+            val_loss = evaluate_loss(model, val_x, val_y)
+            state['val_losses'].append(val_loss)
+            if state['best_loss'] is None or val_loss < state['best_loss']:
+                state['best_loss'] = val_loss
+                state['bad_epochs'] = 0
+                best_state = copy.deepcopy(model.state_dict())
+                if checkpoint_path is not None:
+                    save_checkpoint({
+                        'model': best_state,
+                        'epoch': state['epoch'],
+                        'val_loss': val_loss,
+                    }, best_path)
+            else:
+                state['bad_epochs'] += 1
+            console.log('Validation loss: {0:.4f} (best {1:.4f})'.format(
+                val_loss,
+                state['best_loss'],
+            ))
+            if patience is not None and state['bad_epochs'] >= patience:
+                console.log('No improvement for {0} epochs, stopping.'.format(
+                    state['bad_epochs'],
+                ))
+                state['stopped'] = True
+
+        if last_path is not None:
+            save_checkpoint({
+                'model': model.state_dict(),
+                'optimizer': optimizer.state_dict(),
+                'generator': generator.get_state(),
+                'config': config,
+                'state': state,
+            }, last_path)
+
+    # end with the weights of the best epoch
+    if validate and best_state is None and checkpoint_path is not None:
+        best = best_checkpoint(checkpoint_path)
+        best_state = best['model'] if best else None
+    if best_state is not None:
+        model.load_state_dict(best_state)
+
+    return state['epoch_losses']
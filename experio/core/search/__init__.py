@@ -0,0 +1 @@
+"""Module for searching embedding matrices."""
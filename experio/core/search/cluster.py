@@ -0,0 +1,75 @@
+"""K-means clustering used to train search indices."""
+
+import numpy as np
+from beartype import beartype
+
+
+@beartype
+def assign(
+    data: np.ndarray,
+    centroids: np.ndarray,
+    block_size: int = 16384,
+) -> np.ndarray:
+    """Assign every row to its nearest centroid by euclidean distance.
+
+    Args:
+        data (np.ndarray): Matrix of row vectors.
+        centroids (np.ndarray): Matrix of centroids.
+        block_size (int): Number of rows assigned at once.
+
+    Returns:
+        np.ndarray: Index of the nearest centroid of every row.
+    """
+    centroid_norms = np.sum(centroids ** 2, axis=1)
+    labels = np.empty(len(data), dtype=np.int64)
+
+    for start in range(0, len(data), block_size):
+        block = np.asarray(data[start:start + block_size], dtype=np.float32)
+
+        # |x - c|^2 without the |x|^2 term, constant per row
+        dists = centroid_norms - 2 * block @ centroids.T
+        labels[start:start + block_size] = np.argmin(dists, axis=1)
+
+    return labels
+
+
+@beartype
+def kmeans(
+    data: np.ndarray,
+    n_clusters: int,
+    n_iter: int = 20,
+    seed: int = 5,
+) -> np.ndarray:
+    """Cluster rows with Lloyd's algorithm.
+
+    Args:
+        data (np.ndarray): Matrix of row vectors.
+        n_clusters (int): Number of clusters.
+        n_iter (int): Number of iterations.
+        seed (int): Random seed for initialization.
+
+    Returns:
+        np.ndarray: Matrix of centroids.
+    """
+    rng = np.random.default_rng(seed)
+    data = np.asarray(data, dtype=np.float32)
+    n_clusters = min(n_clusters, len(data))
+    centroids = data[rng.choice(len(data), n_clusters, replace=False)]
+
+    for _ in range(n_iter):
+        labels = assign(data, centroids)
+
+        # sum the rows of every cluster with one sorted reduction
+        order = np.argsort(labels, kind='stable')
+        counts = np.bincount(labels, minlength=n_clusters)
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        sums = np.add.reduceat(data[order], starts[filled], axis=0)
+        centroids[filled] = sums / counts[filled, None]
+
+        # reseed empty clusters with random rows
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = data[rng.choice(len(data), len(empty))]
+
+    return centroids
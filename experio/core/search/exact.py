@@ -0,0 +1,165 @@
+"""Exact cosine nearest neighbour search over embedding matrices."""
+
+import numpy as np
+from beartype import beartype
+
+from experio.metrics import metrics
+
+
+@beartype
+def normalize(arr: np.ndarray, min_val: float = 1e-9) -> np.ndarray:
+    """L2-normalize the rows of an array.
+
+    Args:
+        arr (np.ndarray): Array of row vectors.
+        min_val (float): Minimum norm to use for normalization.
+
+    Returns:
+        np.ndarray: Normalized float32 copy of the array.
+    """
+    arr = np.asarray(arr, dtype=np.float32)
+    norms = np.linalg.norm(arr, axis=-1, keepdims=True)
+    return arr / np.maximum(norms, min_val)
+
+
+@beartype
+def top_k(
+    scores: np.ndarray,
+    k_neighbors: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Select the highest scores of every row, sorted in descending order.
+
+    Args:
+        scores (np.ndarray): Two dimensional array of scores.
+        k_neighbors (int): Number of scores to keep per row.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: Column indices and scores.
+    """
+    k_neighbors = min(k_neighbors, scores.shape[1])
+    if k_neighbors < scores.shape[1]:
+        idxs = np.argpartition(-scores, k_neighbors - 1, axis=1)
+        idxs = idxs[:, :k_neighbors]
+    else:
+        idxs = np.broadcast_to(
+            np.arange(k_neighbors),
+            (scores.shape[0], k_neighbors),
+        )
+    part = np.take_along_axis(scores, idxs, axis=1)
+
+    # argpartition leaves the selection unordered
+    order = np.argsort(-part, axis=1, kind='stable')
+    return (
+        np.take_along_axis(idxs, order, axis=1),
+        np.take_along_axis(part, order, axis=1),
+    )
+
+
+class ExactSearch(object):
+    """Exact cosine similarity search with blocked matrix multiplies."""
+
+    def __init__(
+        self,
+        embeddings: np.ndarray,
+        block_size: int = 16384,
+        query_batch: int = 256,
+        normalized: bool = False,
+    ):
+        """Initialize the search.
+
+        Peak memory of a search is bounded by a score matrix of
+        query_batch x block_size float32 values, regardless of the number
+        of queries or the size of the embedding matrix.
+
+        Args:
+            embeddings (np.ndarray): Matrix of embeddings to search, or an
+                EmbeddingStore with normalized=True.
+            block_size (int): Number of embeddings scored at once.
+            query_batch (int): Number of queries scored at once.
+            normalized (bool): Whether the embeddings are already
+                L2-normalized, in which case no copy is made.
+        """
+        if normalized:
+            self.embeddings = embeddings
+        else:
+            self.embeddings = normalize(embeddings)
+        self.block_size = block_size
+        self.query_batch = query_batch
+
+    def __len__(self) -> int:
+        """Get the number of searchable embeddings.
+
+        Returns:
+            int: Number of embeddings.
+        """
+        return len(self.embeddings)
+
+    def block(self, start: int, stop: int) -> np.ndarray:
+        """Get a block of normalized embeddings.
+
+        Args:
+            start (int): First row of the block.
+            stop (int): Row after the last row of the block.
+
+        Returns:
+            np.ndarray: Normalized float32 embeddings.
+        """
+        return np.asarray(self.embeddings[start:stop], dtype=np.float32)
+
+    @beartype
+    def search(
+        self,
+        queries: np.ndarray,
+        k_neighbors: int = 10,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Find the most similar embeddings to one or more queries.
+
+        Args:
+            queries (np.ndarray): Query vector or matrix of query vectors.
+            k_neighbors (int): Number of neighbors to return per query.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Indices and cosine similarities
+                of the neighbors, most similar first. One dimensional when
+                a single query vector is given.
+        """
+        single = queries.ndim == 1
+        queries = normalize(np.atleast_2d(queries))
+
+        idxs = []
+        scores = []
+        with metrics.timer('search.exact', items=len(queries)):
+            for start in range(0, len(queries), self.query_batch):
+                batch = queries[start:start + self.query_batch]
+                batch_idxs, batch_scores = self._search_batch(
+                    batch,
+                    k_neighbors,
+                )
+                idxs.append(batch_idxs)
+                scores.append(batch_scores)
+
+        idxs = np.concatenate(idxs)
+        scores = np.concatenate(scores)
+        if single:
+            return idxs[0], scores[0]
+        return idxs, scores
+
+    def _search_batch(
+        self,
+        queries: np.ndarray,
+        k_neighbors: int,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        best_idxs = np.empty((len(queries), 0), dtype=np.int64)
+        best_scores = np.empty((len(queries), 0), dtype=np.float32)
+
+        for start in range(0, len(self), self.block_size):
+            block = self.block(start, start + self.block_size)
+            block_idxs, block_scores = top_k(queries @ block.T, k_neighbors)
+
+            # merge the block candidates into the running top-k
+            idxs = np.concatenate([best_idxs, block_idxs + start], axis=1)
+            scores = np.concatenate([best_scores, block_scores], axis=1)
+            keep, best_scores = top_k(scores, k_neighbors)
+            best_idxs = np.take_along_axis(idxs, keep, axis=1)
+
+        return best_idxs, best_scores
@@ -0,0 +1,463 @@
+"""Approximate nearest neighbour search with an inverted file index."""
+
+import hashlib
+import json
+import math
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+from beartype import beartype
+
+from experio import const
+from experio.console import console
+from experio.core.models.dedup import (
+    DedupEmbeddings,
+    embedding_paths,
+    open_embeddings,
+)
+from experio.core.search.cluster import assign, kmeans
+from experio.core.search.exact import ExactSearch, normalize, top_k
+from experio.metrics import metrics
+
+PQ_CENTROIDS = 256
+
+
+class IVFIndex(object):
+    """Inverted file index over L2-normalized embeddings.
+
+    Rows are bucketed by their nearest coarse centroid and a query only
+    scores the rows of its nprobe most similar buckets. With product
+    quantization, the residual of every row to its centroid is stored as
+    one byte per subvector instead of the full float32 vector.
+    """
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        codebooks: Optional[np.ndarray] = None,
+        nprobe: int = 8,
+    ):
+        """Initialize an empty index.
+
+        Args:
+            centroids (np.ndarray): Coarse centroids, one per list.
+            codebooks (Optional[np.ndarray]): Product quantizer codebooks
+                of shape (subvectors, 256, dim / subvectors), or None to
+                store full vectors.
+            nprobe (int): Default number of lists scanned per query.
+        """
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.codebooks = codebooks
+        self.nprobe = nprobe
+
+        dim = self.centroids.shape[1]
+        if codebooks is None:
+            self.data = np.empty((0, dim), dtype=np.float32)
+        else:
+            self.data = np.empty((0, len(codebooks)), dtype=np.uint8)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.lists = np.empty(0, dtype=np.int32)
+        # description of the indexed embeddings, saved with the index
+        self.source = None
+        self._order = None
+        self._offsets = None
+
+    def __len__(self) -> int:
+        """Get the number of indexed rows.
+
+        Returns:
+            int: Number of rows.
+        """
+        return len(self.ids)
+
+    @classmethod
+    @beartype
+    def train(
+        cls,
+        embeddings: np.ndarray,
+        n_lists: Optional[int] = None,
+        n_subvectors: Optional[int] = None,
+        sample_size: int = 131072,
+        n_iter: int = 20,
+        seed: int = 5,
+    ) -> 'IVFIndex':
+        """Train the centroids of an index on a sample of embeddings.
+
+        Args:
+            embeddings (np.ndarray): Embeddings to sample from.
+            n_lists (Optional[int]): Number of lists. Defaults to four times
+                the square root of the number of embeddings.
+            n_subvectors (Optional[int]): Number of product quantizer
+                subvectors, or None to store full vectors.
+            sample_size (int): Maximum number of embeddings to train on.
+            n_iter (int): Number of k-means iterations.
+            seed (int): Random seed for sampling.
+
+        Returns:
+            IVFIndex: Index without any rows added.
+
+        Raises:
+            ValueError: If the dimension is not divisible by n_subvectors.
+        """
+        dim = embeddings.shape[1]
+        if n_subvectors is not None and dim % n_subvectors:
+            raise ValueError(
+                'Dimension {0} is not divisible by {1} subvectors.'.format(
+                    dim,
+                    n_subvectors,
+                ),
+            )
+        if n_lists is None:
+            n_lists = int(4 * math.sqrt(len(embeddings)))
+
+        rng = np.random.default_rng(seed)
+        sample_size = min(sample_size, len(embeddings))
+        sample = np.sort(rng.choice(len(embeddings), sample_size, False))
+        sample = normalize(embeddings[sample])
+
+        console.log('Training {0} coarse centroids.'.format(n_lists))
+        centroids = kmeans(sample, n_lists, n_iter=n_iter, seed=seed)
+        if n_subvectors is None:
+            return cls(centroids)
+
+        console.log('Training {0} subvector codebooks.'.format(n_subvectors))
+        residuals = sample - centroids[assign(sample, centroids)]
+        codebooks = np.stack([
+            kmeans(sub, PQ_CENTROIDS, n_iter=n_iter, seed=seed)
+            for sub in np.split(residuals, n_subvectors, axis=1)
+        ])
+        return cls(centroids, codebooks)
+
+    @beartype
+    def add(
+        self,
+        embeddings: Union[np.ndarray, DedupEmbeddings],
+        ids: Optional[np.ndarray] = None,
+        block_size: int = 65536,
+    ) -> None:
+        """Append rows to the index without retraining it.
+
+        The arrays of the index are grown once per call and every block is
+        encoded in place, so add the rows in one call rather than block by
+        block.
+
+        Args:
+            embeddings (Union[np.ndarray, DedupEmbeddings]): Embeddings to
+                add, gathered block by block.
+            ids (Optional[np.ndarray]): Ids of the rows. Defaults to
+                consecutive ids after the current rows.
+            block_size (int): Number of rows encoded at once.
+        """
+        if ids is None:
+            ids = np.arange(len(self), len(self) + len(embeddings))
+
+        offset = len(self)
+        size = offset + len(embeddings)
+        lists = np.empty(size, dtype=np.int32)
+        data = np.empty((size, self.data.shape[1]), dtype=self.data.dtype)
+        lists[:offset] = self.lists
+        data[:offset] = self.data
+        for start in range(0, len(embeddings), block_size):
+            block = normalize(np.asarray(embeddings[start:start + block_size]))
+            labels = assign(block, self.centroids)
+            stop = offset + start + len(block)
+            lists[offset + start:stop] = labels
+            data[offset + start:stop] = self._encode(block, labels)
+
+        self.ids = np.concatenate([self.ids, np.asarray(ids, np.int64)])
+        self.lists = lists
+        self.data = data
+        self._order = None
+
+    @beartype
+    def search(
+        self,
+        queries: np.ndarray,
+        k_neighbors: int = 10,
+        nprobe: Optional[int] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Find the approximately most similar rows to the queries.
+
+        Args:
+            queries (np.ndarray): Query vector or matrix of query vectors.
+            k_neighbors (int): Number of neighbors to return per query.
+            nprobe (Optional[int]): Number of lists scanned per query.
+                Higher values trade latency for recall. Defaults to the
+                nprobe of the index.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: Ids and estimated cosine
+                similarities of the neighbors, most similar first. Missing
+                neighbors have id -1.
+        """
+        if self._order is None:
+            self._build_lists()
+
+        single = queries.ndim == 1
+        queries = normalize(np.atleast_2d(queries))
+        probes, coarse = top_k(
+            queries @ self.centroids.T,
+            nprobe or self.nprobe,
+        )
+
+        idxs = np.full((len(queries), k_neighbors), -1, dtype=np.int64)
+        scores = np.full((len(queries), k_neighbors), -np.inf, np.float32)
+        with metrics.timer('search.ivf', items=len(queries)):
+            for it, query in enumerate(queries):
+                rows, row_scores = self._scan(query, probes[it], coarse[it])
+                if not len(rows):
+                    continue
+                best, best_scores = top_k(row_scores[None], k_neighbors)
+                idxs[it, :best.shape[1]] = self.ids[rows[best[0]]]
+                scores[it, :best.shape[1]] = best_scores[0]
+
+        if single:
+            return idxs[0], scores[0]
+        return idxs, scores
+
+    def save(self, path: str) -> None:
+        """Save the index.
+
+        Args:
+            path (str): Path of the .npz file.
+        """
+        codebooks = self.codebooks
+        if codebooks is None:
+            codebooks = np.empty(0, dtype=np.float32)
+        np.savez(
+            path,
+            centroids=self.centroids,
+            codebooks=codebooks,
+            ids=self.ids,
+            lists=self.lists,
+            data=self.data,
+            nprobe=self.nprobe,
+            source=json.dumps(self.source),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> 'IVFIndex':
+        """Load an index.
+
+        Args:
+            path (str): Path of the .npz file.
+
+        Returns:
+            IVFIndex: The saved index.
+        """
+        with np.load(path) as arrays:
+            codebooks = arrays['codebooks']
+            index = cls(
+                arrays['centroids'],
+                codebooks if codebooks.size else None,
+                int(arrays['nprobe']),
+            )
+            index.ids = arrays['ids']
+            index.lists = arrays['lists']
+            index.data = arrays['data']
+            if 'source' in arrays:
+                index.source = json.loads(str(arrays['source']))
+        return index
+
+    def _encode(self, block: np.ndarray, labels: np.ndarray) -> np.ndarray:
+        if self.codebooks is None:
+            return block
+
+        residuals = block - self.centroids[labels]
+        subs = np.split(residuals, len(self.codebooks), axis=1)
+        return np.stack(
+            [assign(sub, book) for sub, book in zip(subs, self.codebooks)],
+            axis=1,
+        ).astype(np.uint8)
+
+    def _build_lists(self) -> None:
+        self._order = np.argsort(self.lists, kind='stable')
+        counts = np.bincount(self.lists, minlength=len(self.centroids))
+        self._offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def _scan(
+        self,
+        query: np.ndarray,
+        probes: np.ndarray,
+        coarse: np.ndarray,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        starts = self._offsets[probes]
+        stops = self._offsets[probes + 1]
+        rows = np.concatenate([
+            self._order[start:stop] for start, stop in zip(starts, stops)
+        ])
+        if self.codebooks is None:
+            return rows, self.data[rows] @ query
+
+        # q.x = q.c + q.r, with q.r summed from per-subvector lookup tables
+        subs = np.split(query, len(self.codebooks))
+        tables = np.stack([
+            book @ sub for sub, book in zip(subs, self.codebooks)
+        ])
+        codes = self.data[rows]
+        residual = tables[np.arange(len(tables)), codes].sum(axis=1)
+        return rows, np.repeat(coarse, stops - starts) + residual
+
+
+@beartype
+def recall_at_k(
+    index: IVFIndex,
+    exact: ExactSearch,
+    queries: np.ndarray,
+    k_neighbors: int = 10,
+    nprobe: Optional[int] = None,
+    candidate_rows: Optional[np.ndarray] = None,
+) -> float:
+    """Measure the share of exact top-k neighbors found by the index.
+
+    Args:
+        index (IVFIndex): Approximate index.
+        exact (ExactSearch): Exact search over the same rows, or over
+            their distinct vectors with candidate_rows.
+        queries (np.ndarray): Matrix of query vectors.
+        k_neighbors (int): Number of neighbors per query.
+        nprobe (Optional[int]): Number of lists scanned per query.
+        candidate_rows (Optional[np.ndarray]): Vector of every row, such
+            as DedupEmbeddings.rows, when the exact search runs over the
+            distinct vectors. A row found by the index then counts if its
+            vector is among the most similar ones covering k rows, as rows
+            sharing a vector are equally near.
+
+    Returns:
+        float: Mean recall@k over the queries.
+    """
+    expected, _ = exact.search(queries, k_neighbors)
+    found, _ = index.search(queries, k_neighbors, nprobe=nprobe)
+    if candidate_rows is None:
+        hits = [
+            len(np.intersect1d(exp, res))
+            for exp, res in zip(expected, found)
+        ]
+        return float(np.mean(hits)) / k_neighbors
+
+    candidate_rows = np.asarray(candidate_rows, dtype=np.int64)
+    counts = np.bincount(candidate_rows, minlength=len(exact))
+    found = np.where(found < 0, -1, candidate_rows[found])
+    hits = []
+    for exp, res in zip(expected, found):
+        # distinct vectors whose rows fill the exact top-k rows
+        covered = np.searchsorted(np.cumsum(counts[exp]), k_neighbors) + 1
+        hits.append(np.isin(res, exp[:covered]).sum())
+    return float(np.mean(hits)) / k_neighbors
+
+
+def embeddings_source(file_path: str) -> dict:
+    """Describe saved embeddings by the size and time of their files.
+
+    Args:
+        file_path (str): Path of the embeddings.
+
+    Returns:
+        dict: Size and modification time of every file of the embeddings.
+    """
+    source = {}
+    for path in embedding_paths(file_path):
+        stat = Path(path).stat()
+        source[Path(path).name] = [stat.st_size, stat.st_mtime_ns]
+    return source
+
+
+def rows_digest(
+    embeddings: Union[np.ndarray, DedupEmbeddings],
+    start: int,
+    stop: int,
+    digest=None,
+    block_size: int = 65536,
+):
+    """Hash the vectors of a range of rows.
+
+    Args:
+        embeddings (Union[np.ndarray, DedupEmbeddings]): Embeddings.
+        start (int): First row.
+        stop (int): Row after the last one.
+        digest: sha1 of the previous rows to continue, if any.
+        block_size (int): Number of rows read at once.
+
+    Returns:
+        hashlib._Hash: sha1 of the rows, after the previous ones.
+    """
+    if digest is None:
+        digest = hashlib.sha1()
+    for begin in range(start, stop, block_size):
+        block = embeddings[begin:min(begin + block_size, stop)]
+        digest.update(np.ascontiguousarray(block, dtype=np.float32).tobytes())
+    return digest
+
+
+def def_index(
+    base_path: Optional[str] = const.BASE_PATH,
+    n_subvectors: Optional[int] = None,
+) -> IVFIndex:
+    """Load the index of the saved definition embeddings.
+
+    The index is built the first time and saved next to the embeddings,
+    with a description of their files, their number of rows and a digest
+    of their vectors. Once the files differ from the saved description,
+    the rows are hashed again. If the indexed rows are still a prefix of
+    the embeddings, such as when definitions were only appended, their
+    codes are kept and only the new rows are encoded. Otherwise rows
+    changed, moved or disappeared, and every row is encoded again with
+    the trained centroids and codebooks.
+
+    Args:
+        base_path (Optional[str]): Base path of the embeddings. Defaults to
+            const.BASE_PATH.
+        n_subvectors (Optional[int]): Number of product quantizer
+            subvectors when building a new index.
+
+    Returns:
+        IVFIndex: Index over the definition embeddings.
+    """
+    index_path = Path(base_path) / 'def_ivf.npz'
+    embed_path = str(Path(base_path) / 'def_embed.npy')
+    embeddings = open_embeddings(embed_path)
+    files = embeddings_source(embed_path)
+
+    digest = None
+    if index_path.is_file():
+        index = IVFIndex.load(str(index_path))
+        saved = index.source or {}
+        if saved.get('files') == files:
+            return index
+        num_rows = saved.get('rows', 0)
+        if 0 < num_rows <= len(embeddings):
+            digest = rows_digest(embeddings, 0, num_rows)
+        if digest is not None and digest.hexdigest() == saved.get('digest'):
+            console.log('Index is missing {0} rows.'.format(
+                len(embeddings) - num_rows,
+            ))
+        else:
+            console.log('Index is stale.')
+            digest = None
+            index = IVFIndex(index.centroids, index.codebooks, index.nprobe)
+    else:
+        console.log('Index not found.')
+        # train on the distinct definitions rather than gathering all rows
+        if isinstance(embeddings, DedupEmbeddings):
+            index = IVFIndex.train(
+                embeddings.unique,
+                n_subvectors=n_subvectors,
+            )
+        else:
+            index = IVFIndex.train(embeddings, n_subvectors=n_subvectors)
+
+    num_rows = len(index)
+    console.log('Indexing {0} rows.'.format(len(embeddings) - num_rows))
+    if num_rows:
+        index.add(np.asarray(embeddings[num_rows:]))
+    else:
+        index.add(embeddings)
+    digest = rows_digest(embeddings, num_rows, len(embeddings), digest)
+    index.source = {
+        'files': files,
+        'rows': len(embeddings),
+        'digest': digest.hexdigest(),
+    }
+    index.save(str(index_path))
+    return index
@@ -0,0 +1 @@
+"""Module for serving definition retrieval."""
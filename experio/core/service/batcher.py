@@ -0,0 +1,104 @@
+"""Combine concurrent requests into micro-batches."""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+from experio.metrics import metrics
+
+
+class MicroBatcher(object):
+    """Run a batch function over requests collected from many callers.
+
+    A batch starts with the first waiting request and closes when it holds
+    max_batch requests or max_delay seconds have passed, whichever comes
+    first. The batch function runs in a worker thread, so the event loop
+    keeps accepting requests while a batch is computed, and those requests
+    form the next batch.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[list], list],
+        max_batch: int = 64,
+        max_delay: float = 0.005,
+    ):
+        """Initialize the batcher.
+
+        Args:
+            process (Callable[[list], list]): Maps a list of requests to
+                the list of their results, in the same order.
+            max_batch (int): Maximum number of requests per batch.
+            max_delay (float): Maximum seconds the first request of a batch
+                waits for more requests.
+        """
+        self.process = process
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def start(self) -> None:
+        """Start collecting batches on the running event loop."""
+        self.queue = asyncio.Queue()
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self) -> None:
+        """Stop collecting batches."""
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.executor.shutdown()
+
+    async def submit(self, request: Any) -> Any:
+        """Submit a request and wait for its result.
+
+        Args:
+            request (Any): Request.
+
+        Returns:
+            Any: Result of the request.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((request, future))
+        return await future
+
+    async def run(self) -> None:
+        """Collect and process batches until cancelled."""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(
+                        await asyncio.wait_for(self.queue.get(), timeout),
+                    )
+                except asyncio.TimeoutError:
+                    break
+
+            requests = [request for request, _ in batch]
+            metrics.count('service.batches')
+            metrics.count('service.requests', len(requests))
+            try:
+                results = await loop.run_in_executor(
+                    self.executor,
+                    self.process,
+                    requests,
+                )
+            except Exception as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
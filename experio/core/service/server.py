@@ -0,0 +1,350 @@
+"""Long-running definition retrieval service."""
+
+import asyncio
+import json
+from pathlib import Path
+from typing import Optional
+
+from experio import const
+from experio.console import console
+from experio.core.dataset.reader import ArrowReader
+from experio.core.models.dedup import (
+    DedupEmbeddings,
+    first_rows,
+    open_embeddings,
+)
+from experio.core.models.encoder import MODEL, Encoder
+from experio.core.models.store import EmbeddingStore
+from experio.core.search.exact import ExactSearch
+from experio.core.service.batcher import MicroBatcher
+from experio.metrics import metrics
+
+K_NEIGHBORS = 3
+MAX_K = 100
+MAX_BODY = 1 << 20
+REASONS = {
+    200: 'OK',
+    400: 'Bad Request',
+    404: 'Not Found',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error',
+}
+
+
+class DefinitionService(object):
+    """Predict and retrieve definitions of words.
+
+    The encoder, the trained predictor and the definition embeddings are
+    loaded once. Every text is embedded, mapped to a predicted definition
+    embedding and searched against all definitions, a whole micro-batch
+    of requests at a time.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        base_path: str = const.BASE_PATH,
+        model_name: str = MODEL,
+        hidden_layers: Optional[int] = None,
+        encoding: Optional[str] = None,
+        max_batch: int = 64,
+        max_delay: float = 0.005,
+    ):
+        """Load the models and the definitions.
+
+        Args:
+            model_path (str): Path of the trained predictor state dict.
+            base_path (str): Base path of the dataset and embeddings.
+            model_name (str): Name or local path of the pretrained model.
+            hidden_layers (Optional[int]): Hidden layers of the predictor.
+                Defaults to the layers of build_predictor.
+            encoding (Optional[str]): Encoding of the definition embedding
+                store to search, or None to search a normalized float32
+                copy of the definition embeddings. Deduplicated embeddings
+                are searched once per distinct definition.
+            max_batch (int): Maximum number of requests per micro-batch.
+            max_delay (float): Maximum seconds a request waits for a
+                micro-batch to fill.
+        """
+        import torch
+
+        from experio.core.models.predictor import (
+            HIDDEN_LAYERS,
+            build_predictor,
+        )
+
+        def_path = '{0}/def_embed.npy'.format(base_path)
+        # first row of every searched vector, when they are not rows
+        self.row_of = None
+        if encoding is None:
+            embeddings = open_embeddings(def_path)
+            if isinstance(embeddings, DedupEmbeddings):
+                self.row_of = first_rows(
+                    embeddings.rows,
+                    len(embeddings.unique),
+                )
+                embeddings = embeddings.unique
+            self.search = ExactSearch(embeddings)
+        else:
+            self.search = ExactSearch(
+                EmbeddingStore(def_path, encoding),
+                normalized=True,
+            )
+
+        reader = ArrowReader('{0}/final.arrow'.format(base_path))
+        table = reader.table(['word', 'def'])
+        self.words = table.column('word')
+        self.definitions = table.column('def')
+
+        self.encoder = Encoder(model_name)
+        dim = self.search.block(0, 1).shape[1]
+        self.predictor = build_predictor(
+            dim,
+            dim,
+            hidden_layers or HIDDEN_LAYERS,
+        )
+        self.predictor.load_state_dict(torch.load(model_path))
+        self.predictor.eval()
+
+        self.batcher = MicroBatcher(self.process, max_batch, max_delay)
+        console.log('Service loaded {0} definitions.'.format(len(self.search)))
+
+    def process(self, requests: list[dict]) -> list[dict]:
+        """Retrieve definitions for a batch of requests.
+
+        Args:
+            requests (list[dict]): Requests with a text and an optional
+                number of definitions k.
+
+        Returns:
+            list[dict]: Definitions of every request, most similar first.
+        """
+        import torch
+
+        texts = [request['text'] for request in requests]
+        k_neighbors = max(request['k'] for request in requests)
+        with metrics.timer('service.batch', items=len(requests)):
+            inputs = self.encoder.generate_embeddings(texts)
+            with torch.no_grad():
+                preds = self.predictor(torch.from_numpy(inputs)).numpy()
+            idxs, scores = self.search.search(preds, k_neighbors)
+        if self.row_of is not None:
+            idxs = self.row_of[idxs]
+
+        results = []
+        for request, row_idxs, row_scores in zip(requests, idxs, scores):
+            rows = row_idxs[:request['k']]
+            results.append({'definitions': [
+                {
+                    'row': int(row),
+                    'word': self.words[int(row)].as_py(),
+                    'def': self.definitions[int(row)].as_py(),
+                    'score': float(score),
+                }
+                for row, score in zip(rows, row_scores)
+            ]})
+        return results
+
+    async def define(self, text: str, k_neighbors: int = K_NEIGHBORS) -> dict:
+        """Retrieve the definitions of one text.
+
+        Args:
+            text (str): Word and etymology to define.
+            k_neighbors (int): Number of definitions.
+
+        Returns:
+            dict: Definitions, most similar first.
+        """
+        return await self.batcher.submit({'text': text, 'k': k_neighbors})
+
+    async def handle(self, method: str, path: str, body: bytes) -> tuple:
+        """Answer one HTTP request.
+
+        Args:
+            method (str): HTTP method.
+            path (str): Request path.
+            body (bytes): Request body.
+
+        Returns:
+            tuple: Status code, content type and response body.
+        """
+        if method == 'GET' and path == '/health':
+            return 200, 'application/json', b'{"status": "ok"}'
+        if method == 'GET' and path == '/metrics':
+            return 200, 'text/plain', metrics.to_prometheus().encode()
+        if method != 'POST' or path != '/define':
+            return 404, 'application/json', b'{"error": "not found"}'
+
+        try:
+            request = json.loads(body)
+            text = str(request['text'])
+            k_neighbors = min(int(request.get('k', K_NEIGHBORS)), MAX_K)
+        except (ValueError, KeyError, TypeError) as error:
+            return 400, 'application/json', json.dumps({
+                'error': 'invalid request: {0}'.format(error),
+            }).encode()
+
+        with metrics.timer('service.request', items=1):
+            result = await self.define(text, max(k_neighbors, 1))
+        return 200, 'application/json', json.dumps(result).encode()
+
+    async def connection(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        """Serve the HTTP/1.1 requests of a keep-alive connection.
+
+        Args:
+            reader (asyncio.StreamReader): Stream of the client requests.
+            writer (asyncio.StreamWriter): Stream of the responses.
+        """
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except ValueError as error:
+                    write_response(
+                        writer,
+                        400,
+                        'application/json',
+                        json.dumps({
+                            'error': 'bad request: {0}'.format(error),
+                        }).encode(),
+                    )
+                    await writer.drain()
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                if body is None:
+                    status, content_type, payload = (
+                        413,
+                        'application/json',
+                        b'{"error": "request too large"}',
+                    )
+                else:
+                    try:
+                        status, content_type, payload = await self.handle(
+                            method,
+                            path,
+                            body,
+                        )
+                    except Exception as error:
+                        console.log('Request failed: {0}'.format(error))
+                        status, content_type, payload = (
+                            500,
+                            'application/json',
+                            b'{"error": "internal error"}',
+                        )
+                keep_alive = headers.get('connection') != 'close'
+                write_response(writer, status, content_type, payload)
+                await writer.drain()
+                if not keep_alive or body is None:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[tuple]:
+    """Read one HTTP request.
+
+    Args:
+        reader (asyncio.StreamReader): Stream of the client requests.
+
+    Returns:
+        Optional[tuple]: Method, path, lowercased headers and body, with a
+            None body if it is too large. None once the client closed the
+            connection.
+
+    Raises:
+        ValueError: If the request line or Content-Length is malformed,
+            a line is too long, or the body is shorter than its length.
+    """
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    parts = line.decode('latin-1').split()
+    if len(parts) != 3:
+        raise ValueError('malformed request line')
+    method, path, _ = parts
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in {b'\r\n', b'\n', b''}:
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        raise ValueError('invalid Content-Length')
+    if length < 0:
+        raise ValueError('negative Content-Length')
+    if length > MAX_BODY:
+        return method, path, headers, None
+    try:
+        body = await reader.readexactly(length) if length else b''
+    except asyncio.IncompleteReadError:
+        raise ValueError('body shorter than Content-Length')
+    return method, path, headers, body
+
+
+def write_response(
+    writer: asyncio.StreamWriter,
+    status: int,
+    content_type: str,
+    payload: bytes,
+) -> None:
+    """Write one HTTP response.
+
+    Args:
+        writer (asyncio.StreamWriter): Stream of the responses.
+        status (int): Status code.
+        content_type (str): Content type of the payload.
+        payload (bytes): Response body.
+    """
+    writer.write(
+        'HTTP/1.1 {0} {1}\r\n'.format(status, REASONS[status]).encode()
+        + 'Content-Type: {0}\r\n'.format(content_type).encode()
+        + 'Content-Length: {0}\r\n\r\n'.format(len(payload)).encode()
+        + payload,
+    )
+
+
+async def serve(
+    service: DefinitionService,
+    host: str = '127.0.0.1',
+    port: int = 8000,
+    unix_path: Optional[str] = None,
+) -> None:
+    """Serve a definition service until cancelled.
+
+    Args:
+        service (DefinitionService): Loaded service.
+        host (str): Host to listen on.
+        port (int): Port to listen on.
+        unix_path (Optional[str]): Path of a Unix socket to listen on
+            instead of host and port.
+    """
+    service.batcher.start()
+    if unix_path is None:
+        server = await asyncio.start_server(service.connection, host, port)
+        console.log('Serving on http://{0}:{1}.'.format(host, port))
+    else:
+        Path(unix_path).unlink(missing_ok=True)
+        server = await asyncio.start_unix_server(
+            service.connection,
+            unix_path,
+        )
+        console.log('Serving on {0}.'.format(unix_path))
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.batcher.stop()
@@ -1,4 +1,7 @@
 """Expose dataset module."""
 
 from experio.core.dataset.experio import EtymDefDataset
+from experio.core.dataset.index import WordIndex
+from experio.core.dataset.partition import PartitionedDataset
+from experio.core.dataset.reader import ArrowReader
 from experio.core.dataset.yawipa import DefinitionDataset, EtymologyDataset
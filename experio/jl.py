@@ -1,15 +1,10 @@
 """Expose pyjulia module."""
 
+from functools import lru_cache
 from pathlib import Path
 
 from experio.console import console
-
-try:
-    from julia import Main
-except Exception:
-    import julia
-    julia.install(quiet=True)
-    from julia import Main
+from experio.metrics import metrics
 
 
 class Julia(object):
@@ -17,6 +12,13 @@ class Julia(object):
 
     def __init__(self):
         """Initialize Julia class."""
+        try:
+            from julia import Main
+        except Exception:
+            import julia
+            julia.install(quiet=True)
+            from julia import Main
+
         self.julia = Main
         cwd = Path(__file__).parent
 
@@ -27,6 +29,7 @@ class Julia(object):
         console.log('Loading julia module.')
         self.eval('include(\"{0}\")'.format(cwd / 'experio.jl'))
 
+    @metrics.timed('julia.eval')
     def eval(self, code: str):
         """Evaluate code in julia.
 
@@ -37,5 +40,11 @@ class Julia(object):
         self.julia.eval(code)
 
 
-# expose julia object to other modules
-jl = Julia()
+@lru_cache(maxsize=None)
+def get_julia() -> Julia:
+    """Get the julia runtime, starting it on first use.
+
+    Returns:
+        Julia: The shared julia runtime.
+    """
+    return Julia()
@@ -0,0 +1,281 @@
+"""Global metrics module.
+
+Stages of a run are timed with metrics.timer, as a context manager, or
+metrics.timed, as a decorator. Every stage keeps its number of calls, wall
+time and number of processed items, so throughput can be derived, and
+counters keep any other totals. A snapshot can be exported as JSON or as
+Prometheus text.
+
+Set EXPERIO_METRICS to a .json or .prom path to write a snapshot when the
+process exits, and EXPERIO_PROFILE to a comma separated list of stages to
+run cProfile and tracemalloc around their first run. Profiles are saved to
+the logs directory as <stage>.prof.
+"""
+
+import atexit
+import cProfile
+import json
+import os
+import resource
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+from experio import const
+from experio.console import console
+
+
+class Stage(object):
+    """Handle of a running stage, to report the items it processed."""
+
+    def __init__(self):
+        """Initialize the handle."""
+        self.items = 0
+
+    def add(self, items: int) -> None:
+        """Report processed items.
+
+        Args:
+            items (int): Number of items, such as rows or bytes.
+        """
+        self.items += items
+
+
+class Metrics(object):
+    """Thread-safe registry of stage timers and counters."""
+
+    def __init__(self):
+        """Initialize the registry from the environment."""
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.counters = {}
+        self.profiled = set()
+        self.profiling = False
+        self.tracing = False
+        self.profile_path = Path(const.LOG_PATH)
+
+        profile = os.environ.get('EXPERIO_PROFILE')
+        if profile:
+            self.profiled.update(profile.split(','))
+        dump_path = os.environ.get('EXPERIO_METRICS')
+        if dump_path:
+            atexit.register(self.dump, dump_path)
+
+    @contextmanager
+    def timer(self, name: str, items: int = 0) -> Iterator[Stage]:
+        """Time a stage.
+
+        Args:
+            name (str): Name of the stage, such as "search.exact".
+            items (int): Number of items the stage processes, if known
+                upfront. More can be reported with Stage.add.
+
+        Yields:
+            Stage: Handle to report processed items.
+        """
+        stage = Stage()
+        stage.add(items)
+        profiler = self._start_profile(name)
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            elapsed = time.perf_counter() - start
+            memory = self._stop_profile(name, profiler)
+            self._record(name, elapsed, stage.items, memory)
+
+    def timed(self, name: str) -> Callable:
+        """Time every call of a function as a stage.
+
+        Args:
+            name (str): Name of the stage.
+
+        Returns:
+            Callable: Decorator of the function.
+        """
+        def decorator(func: Callable) -> Callable:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name: str, value: float = 1) -> None:
+        """Increment a counter.
+
+        Args:
+            name (str): Name of the counter.
+            value (float): Increment.
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def profile(self, name: str) -> None:
+        """Run cProfile and tracemalloc around the next run of a stage.
+
+        Args:
+            name (str): Name of the stage.
+        """
+        self.profiled.add(name)
+
+    def reset(self) -> None:
+        """Clear all stages and counters."""
+        with self.lock:
+            self.stages.clear()
+            self.counters.clear()
+
+    def snapshot(self) -> dict:
+        """Get the current value of all stages and counters.
+
+        Returns:
+            dict: Stages, counters and the peak RSS of the process.
+        """
+        with self.lock:
+            stages = {
+                name: dict(
+                    stage,
+                    items_per_sec=stage['items'] / max(stage['seconds'], 1e-9),
+                )
+                for name, stage in self.stages.items()
+            }
+            counters = dict(self.counters)
+        return {
+            'stages': stages,
+            'counters': counters,
+            'max_rss_bytes': max_rss(),
+        }
+
+    def to_json(self) -> str:
+        """Export a snapshot as JSON.
+
+        Returns:
+            str: JSON document.
+        """
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Export a snapshot in the Prometheus text format.
+
+        Returns:
+            str: Prometheus exposition text.
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for metric, key, kind in (
+            ('experio_stage_calls_total', 'calls', 'counter'),
+            ('experio_stage_seconds_total', 'seconds', 'counter'),
+            ('experio_stage_seconds_max', 'max_seconds', 'gauge'),
+            ('experio_stage_items_total', 'items', 'counter'),
+            ('experio_stage_memory_peak_bytes', 'memory_peak_bytes', 'gauge'),
+        ):
+            lines.append('# TYPE {0} {1}'.format(metric, kind))
+            lines.extend(
+                '{0}{{stage="{1}"}} {2}'.format(metric, name, stage[key])
+                for name, stage in snapshot['stages'].items()
+                if stage.get(key) is not None
+            )
+        lines.append('# TYPE experio_counter_total counter')
+        lines.extend(
+            'experio_counter_total{{name="{0}"}} {1}'.format(name, value)
+            for name, value in snapshot['counters'].items()
+        )
+        lines.append('# TYPE experio_process_max_rss_bytes gauge')
+        lines.append('experio_process_max_rss_bytes {0}'.format(
+            snapshot['max_rss_bytes'],
+        ))
+        return '{0}\n'.format('\n'.join(lines))
+
+    def dump(self, file_path: str) -> None:
+        """Write a snapshot, as Prometheus text for .prom paths or JSON.
+
+        Args:
+            file_path (str): Path of the snapshot.
+        """
+        if Path(file_path).suffix == '.prom':
+            text = self.to_prometheus()
+        else:
+            text = self.to_json()
+        Path(file_path).write_text(text)
+
+    def _record(
+        self,
+        name: str,
+        elapsed: float,
+        items: int,
+        memory: Optional[int],
+    ) -> None:
+        with self.lock:
+            stage = self.stages.setdefault(name, {
+                'calls': 0,
+                'seconds': 0.0,
+                'max_seconds': 0.0,
+                'items': 0,
+            })
+            stage['calls'] += 1
+            stage['seconds'] += elapsed
+            stage['max_seconds'] = max(stage['max_seconds'], elapsed)
+            stage['items'] += items
+            if memory is not None:
+                stage['memory_peak_bytes'] = max(
+                    stage.get('memory_peak_bytes', 0),
+                    memory,
+                )
+
+    def _start_profile(self, name: str) -> Optional[cProfile.Profile]:
+        # one profile at a time, nested stages run inside the outer one
+        if name not in self.profiled:
+            return None
+        with self.lock:
+            if self.profiling:
+                return None
+            self.profiling = True
+            self.profiled.discard(name)
+        # leave tracemalloc running if it was started elsewhere
+        self.tracing = tracemalloc.is_tracing()
+        if self.tracing:
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.start()
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def _stop_profile(
+        self,
+        name: str,
+        profiler: Optional[cProfile.Profile],
+    ) -> Optional[int]:
+        if profiler is None:
+            return None
+        profiler.disable()
+        _, peak = tracemalloc.get_traced_memory()
+        if not self.tracing:
+            tracemalloc.stop()
+        self.profiling = False
+
+        self.profile_path.mkdir(parents=True, exist_ok=True)
+        prof_path = self.profile_path / '{0}.prof'.format(name)
+        profiler.dump_stats(prof_path)
+        console.log('Profile of {0} saved to {1}, peak {2:.1f} MiB.'.format(
+            name,
+            prof_path,
+            peak / (1 << 20),
+        ))
+        return peak
+
+
+def max_rss() -> int:
+    """Get the peak resident memory of the process.
+
+    Returns:
+        int: Peak RSS in bytes.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+metrics = Metrics()
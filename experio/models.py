@@ -1,3 +1,14 @@
 """Expose models module."""
 
+from experio.core.models.cache import EmbeddingCache, TextCache
+from experio.core.models.dedup import (
+    DedupEmbeddings,
+    first_rows,
+    open_embeddings,
+)
 from experio.core.models.embeddings import Embeddings
+from experio.core.models.encoder import Encoder
+from experio.core.models.layout import SplitLayout
+from experio.core.models.quantize import compare_encoders
+from experio.core.models.store import EmbeddingStore
+from experio.core.models.tokens import TokenStore
@@ -0,0 +1,4 @@
+"""Expose search module."""
+
+from experio.core.search.exact import ExactSearch
+from experio.core.search.ivf import IVFIndex, def_index, recall_at_k
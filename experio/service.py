@@ -0,0 +1,4 @@
+"""Expose service module."""
+
+from experio.core.service.batcher import MicroBatcher
+from experio.core.service.server import DefinitionService, serve
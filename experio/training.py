@@ -0,0 +1,17 @@
+"""Expose training module."""
+
+from experio.core.models.evaluation import (
+    evaluate_predictor,
+    retrieval_metrics,
+    row_cosine,
+    save_report,
+)
+from experio.core.models.predictor import build_predictor
+from experio.core.models.sweep import run_sweep, sweep_grid
+from experio.core.models.training import (
+    best_checkpoint,
+    evaluate_loss,
+    predictor_loss,
+    save_checkpoint,
+    train_predictor,
+)
@@ -0,0 +1,67 @@
+"""Script to report recall and latency of the definition index."""
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+
+from experio import const
+from experio.console import console
+from experio.models import DedupEmbeddings, open_embeddings
+from experio.search import ExactSearch, def_index, recall_at_k
+
+RANDOM_SEED = 5
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--subvectors', type=int, default=None)
+    args = parser.parse_args()
+
+    index = def_index(n_subvectors=args.subvectors)
+    embeddings = open_embeddings(
+        str(Path(const.BASE_PATH) / 'def_embed.npy'),
+    )
+    if isinstance(embeddings, DedupEmbeddings):
+        # search the distinct definitions, the index still answers rows
+        exact = ExactSearch(embeddings.unique)
+        candidate_rows = np.asarray(embeddings.rows)
+    else:
+        exact = ExactSearch(embeddings)
+        candidate_rows = None
+
+    # perturbed rows, so a query is not trivially its own neighbour
+    rng = np.random.default_rng(RANDOM_SEED)
+    sample = np.sort(rng.choice(len(embeddings), args.queries, False))
+    queries = np.asarray(embeddings[sample], dtype=np.float32)
+    queries += rng.normal(
+        scale=queries.std(),
+        size=queries.shape,
+    ).astype(np.float32)
+
+    start = time.perf_counter()
+    exact.search(queries, args.k)
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    console.log('exact: {0:.3f} ms/query'.format(exact_ms))
+
+    for nprobe in (1, 2, 4, 8, 16, 32, 64):
+        start = time.perf_counter()
+        index.search(queries, args.k, nprobe=nprobe)
+        ann_ms = (time.perf_counter() - start) * 1000 / len(queries)
+        recall = recall_at_k(
+            index,
+            exact,
+            queries,
+            args.k,
+            nprobe=nprobe,
+            candidate_rows=candidate_rows,
+        )
+        console.log(
+            'nprobe {0:>3}: recall@{1} {2:.3f}, {3:.3f} ms/query'.format(
+                nprobe,
+                args.k,
+                recall,
+                ann_ms,
+            ),
+        )
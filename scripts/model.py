@@ -1,72 +1,82 @@
 """Model for predicting definition embedding given word embedding."""
 
-import math
 from pathlib import Path
 
 import numpy as np
-import pandas as pd
 import torch
-from beartype import beartype
-from scipy.spatial.distance import cosine
-from tqdm import tqdm
 
 from experio.console import console
-from experio.dataset import EtymDefDataset
-from experio.models import Embeddings
+from experio.dataset import EtymDefDataset, WordIndex
+from experio.models import Embeddings, SplitLayout
+from experio.search import ExactSearch
+from experio.training import (
+    best_checkpoint,
+    build_predictor,
+    evaluate_loss,
+    evaluate_predictor,
+    row_cosine,
+    save_checkpoint,
+    save_report,
+    train_predictor,
+)
 
 DROP_PERCENT = 0.9
 SPLIT_PERCENT = 0.8
+VAL_PERCENT = 0.1
+PATIENCE = 2
 LEARNING_RATE = 0.001
+BATCH_SIZE = 256
 RANDOM_SEED = 5
 HIDDEN_LAYERS = 3
-epochs = 3
+epochs = 20
 base_path = Path.cwd() / 'model'
 if not base_path.exists():
     base_path.mkdir(parents=True)
 file_path = base_path / 'model.pt'
+layout_path = base_path / 'layout'
+checkpoint_path = base_path / 'checkpoints'
+report_path = base_path / 'report.json'
 
 
 def train_test_split(
-    df: pd.DataFrame,
+    index: WordIndex,
+    rows: np.ndarray,
     embeddings: Embeddings,
     split_percent: float = SPLIT_PERCENT,
+    val_percent: float = VAL_PERCENT,
     random_seed: int = RANDOM_SEED,
-) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
-    """Split dataset into train and test.
+) -> SplitLayout:
+    """Split dataset into train, validation and test.
 
     Args:
-        df (pd.DataFrame): Dataframe to split.
+        index (WordIndex): Word index of the dataset.
+        rows (np.ndarray): Rows of the dataset to split.
         embeddings (Embeddings): Embeddings to use.
-        split_percent (float): Percentage of data to use for training.
+        split_percent (float): Percentage of words to use for training
+            and validation.
+        val_percent (float): Percentage of those words held out for
+            validation.
         random_seed (int): Random seed for sampling.
 
     Returns:
-        tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]:
-            Tuple of train, train_labels, test, test_labels.
+        SplitLayout: Memory-mapped layout of the train, val and test
+            splits.
     """
-    words = set(df['word'])
-    split = int(len(words) * split_percent)
+    # randomly choose words for training, then hold some out
+    train_idxs, test_idxs = index.split(split_percent, random_seed, rows)
+    train_idxs, val_idxs = index.split(
+        1 - val_percent,
+        random_seed,
+        train_idxs,
+    )
 
-    # randomly choose words for training
-    train_words = set(df['word'].sample(
-        n=split,
-        random_state=random_seed,
-    ))
-    test_words = words - train_words
-    train_idxs = df[df['word'].isin(train_words)].index
-    test_idxs = df[df['word'].isin(test_words)].index
-
-    # get embeddings
-    train_x = embeddings.word_embeddings[train_idxs]
-    train_y = embeddings.def_embeddings[train_idxs]
-    test_x = embeddings.word_embeddings[test_idxs]
-    test_y = embeddings.def_embeddings[test_idxs]
-
-    return (
-        torch.tensor(train_x),
-        torch.tensor(train_y),
-        torch.tensor(test_x),
-        torch.tensor(test_y),
+    # rows grouped by split on disk, the splits are views of the files
+    return SplitLayout.open(
+        str(layout_path),
+        embeddings.word_embeddings,
+        embeddings.def_embeddings,
+        {'train': train_idxs, 'val': val_idxs, 'test': test_idxs},
+        source=embeddings.saved_manifest(),
     )
 
 
@@ -83,131 +93,87 @@ def build_model(
     Returns:
         torch.nn.Module: Model.
     """
-    input_neurons = train_x.shape[1]
-    output_neurons = train_y.shape[1]
-
-    hidden_neurons = int(
-        math.sqrt(input_neurons * output_neurons) / HIDDEN_LAYERS,
-    )
-
-    console.log('input_neurons: {0}'.format(input_neurons))
-    console.log('output_neurons: {0}'.format(output_neurons))
-    console.log('hidden layers: {0}'.format(HIDDEN_LAYERS))
-    console.log('hidden_neurons per layer: {0}'.format(hidden_neurons))
-
-    return torch.nn.Sequential(
-        torch.nn.Linear(
-            input_neurons,
-            hidden_neurons,
-        ),
-        torch.nn.ReLU(),
-        torch.nn.Linear(
-            hidden_neurons,
-            hidden_neurons,
-        ),
-        torch.nn.ReLU(),
-        torch.nn.Linear(
-            hidden_neurons,
-            hidden_neurons,
-        ),
-        torch.nn.ReLU(),
-        torch.nn.Linear(
-            hidden_neurons,
-            hidden_neurons,
-        ),
-        torch.nn.ReLU(),
-        torch.nn.Linear(
-            hidden_neurons,
-            output_neurons,
-        ),
+    return build_predictor(
+        train_x.shape[1],
+        train_y.shape[1],
+        hidden_layers=HIDDEN_LAYERS,
     )
 
 
-def train_model(
-    model: torch.nn.Module,
-    train_x: torch.Tensor,
-    train_y: torch.Tensor,
-    test_x: torch.Tensor,
-    test_y: torch.Tensor,
-) -> None:
+def train_model(model: torch.nn.Module, layout: SplitLayout) -> None:
     """Train model.
 
+    Training stops early once the validation loss plateaus, and resumes
+    from the checkpoints of an interrupted run on the same layout.
+
     Args:
         model (torch.nn.Module): Model.
-        train_x (torch.Tensor): Training data.
-        train_y (torch.Tensor): Training labels.
-        test_x (torch.Tensor): Test data.
-        test_y (torch.Tensor): Test labels.
+        layout (SplitLayout): Train, val and test splits.
     """
-    # loss function
-    criterion = torch.nn.MSELoss()
-
-    # optimizer
-    optimizer = torch.optim.Adam(
-        model.parameters(),
-        lr=LEARNING_RATE,
+    train_x, train_y = layout.split('train')
+    val_x, val_y = layout.split('val')
+    test_x, test_y = layout.split('test')
+
+    # train, ending with the weights of the best validation epoch
+    train_predictor(
+        model,
+        train_x,
+        train_y,
+        epochs=epochs,
+        batch_size=BATCH_SIZE,
+        learning_rate=LEARNING_RATE,
+        random_seed=RANDOM_SEED,
+        val_x=val_x,
+        val_y=val_y,
+        patience=PATIENCE,
+        checkpoint_path=str(checkpoint_path),
+        data_id=layout.meta['digest'],
     )
 
-    # train
-    for epoch in range(epochs):
-        # train
-        model.train()
-        for it, (x_data, y_label) in enumerate(zip(train_x, train_y)):
-            # forward pass
-            y_pred = model(x_data)
-            sim = 1 - embedding_similarity(
-                y_pred.detach().numpy(),
-                y_label.detach().numpy(),
-            )
-
-            # calculate loss with simlarity
-            loss = criterion(y_pred, y_label)
-            loss += sim
-
-            # backward pass
-            optimizer.zero_grad()
-            loss.backward()
-            optimizer.step()
-
-            if it % 100 == 0:
-                console.log(
-                    'Epoch {0}/{1}'.format(epoch + 1, epochs),
-                    'Batch {0}/{1}'.format(it + 1, len(train_x)),
-                    'Loss: {0:.4f}'.format(loss.item()),
-                )
-
     # test
-    model.eval()
-    with torch.no_grad():
-        y_pred = model(test_x)
-        loss = criterion(y_pred, test_y)
-        console.log('Test loss: {0:.4f}'.format(loss.item()))
+    loss = evaluate_loss(model, test_x, test_y)
+    console.log('Test loss: {0:.4f}'.format(loss))
 
     # save model
-    torch.save(model.state_dict(), file_path)
+    save_checkpoint(model.state_dict(), str(file_path))
 
 
 def load_model(
-    df: pd.DataFrame,
+    index: WordIndex,
+    rows: np.ndarray,
     embeddings: Embeddings,
 ):
     """Load model.
 
+    Without a saved model, training resumes from the checkpoints if there
+    are any, so a finished run only needs its best checkpoint.
+
     Args:
-        df (pd.DataFrame): Dataframe to use.
+        index (WordIndex): Word index of the dataset.
+        rows (np.ndarray): Rows of the dataset to use.
         embeddings (Embeddings): Embeddings to use.
 
     Returns:
         torch.nn.Module: Model.
     """
-    # split into train and test
-    train_x, train_y, test_x, test_y = train_test_split(df, embeddings)
+    # split into train, validation and test
+    layout = train_test_split(index, rows, embeddings)
 
     # build model
-    model = build_model(train_x, train_y)
+    model = build_model(*layout.split('train'))
     if not file_path.exists():
-        console.log('Model not found, training new model.')
-        train_model(model, train_x, train_y, test_x, test_y)
+        best = best_checkpoint(str(checkpoint_path))
+        if best is None:
+            console.log('Model not found, training new model.')
+        else:
+            console.log(
+                'Model not found, checkpoints found with best epoch',
+                '{0} (validation loss {1:.4f}).'.format(
+                    best['epoch'],
+                    best['val_loss'],
+                ),
+            )
+        train_model(model, layout)
 
     # load model
     model.load_state_dict(torch.load(file_path))
@@ -216,120 +182,62 @@ def load_model(
     return model
 
 
-@beartype
-def embedding_similarity(em1: np.ndarray, em2: np.ndarray) -> float:
-    """Calculate embedding distance.
-
-    Args:
-        em1 (np.ndarray): Embedding 1.
-        em2 (np.ndarray): Embedding 2.
-
-    Returns:
-        float: Distance.
-    """
-    return 1 - cosine(em1, em2)
-
-
-def nearest_neighbors(
-    k_neighbors: int,
-    arr: np.ndarray,
-    sample: np.ndarray,
-) -> list:
-    """Find nearest neighbors.
-
-    Args:
-        k_neighbors (int): Number of neighbors.
-        arr (np.ndarray): Array to search.
-        sample (np.ndarray): Sample to search for.
-
-    Returns:
-        list: Nearest neighbors.
-    """
-    highest_sim = []
-    console.log('Finding nearest neighbors...', style='cyan')
-    for idx in tqdm(range(len((arr)))):
-        embedding = arr[idx]
-        sim = embedding_similarity(embedding, sample)
-        if len(highest_sim) < k_neighbors:
-            highest_sim.append((idx, sim))
-        else:
-            for sim_idx in range(len(highest_sim)):
-                if highest_sim[sim_idx][1] < sim:
-                    highest_sim[sim_idx] = (idx, sim)
-                    break
-    return [x[0] for x in highest_sim]
-
-
 if __name__ == '__main__':
     dataset = EtymDefDataset()
     embeddings = Embeddings()
 
     df = dataset.dataset()
+    index = dataset.word_index()
+    rng = np.random.default_rng(RANDOM_SEED)
 
     # drop 90% of the data
-    ddf = df.sample(
-        frac=1 - DROP_PERCENT,
-        random_state=RANDOM_SEED,
-    )
-
-    # load model
-    model = load_model(ddf, embeddings)
-
-    # find unseen words with highest similarity to expected
-    unseen = df[~df['word'].isin(ddf['word'])]
-    unseen_words = set(unseen['word'].sample(
-        frac=0.005,
-        random_state=RANDOM_SEED,
+    rows = np.sort(rng.choice(
+        len(df),
+        size=int(len(df) * (1 - DROP_PERCENT)),
+        replace=False,
     ))
-    test_df = df[df['word'].isin(unseen_words)]
-    test_df['word_etym'] = test_df['word'] + ' ' + test_df['etym']
-
-    console.log('Finding best words by definition distance...')
-    word_dists = []
-    for word in tqdm(unseen_words):
-        word_idx = df[df['word'] == word].index[0]
 
-        # get prediction
-        input_sample = embeddings.word_embeddings[word_idx]
-        expected = embeddings.def_embeddings[word_idx]
-        with torch.no_grad():
-            pred = model(torch.tensor(expected)).detach().numpy()
-
-        # find similarity
-        word_dist = embedding_similarity(expected, pred)
-        word_dists.append((word, word_dist, pred))
-
-    # sort by similarity
-    word_dists.sort(key=lambda x: x[1])
+    # load model
+    model = load_model(index, rows, embeddings)
+
+    # evaluate every held-out word in one batched pass
+    _, test_rows = index.split(SPLIT_PERCENT, RANDOM_SEED, rows)
+    # search the distinct definitions, neighbors map back to rows
+    def_search = ExactSearch(embeddings.def_embeddings.unique)
+    report, preds, neighbors = evaluate_predictor(
+        model,
+        embeddings.word_embeddings,
+        embeddings.def_embeddings,
+        test_rows,
+        def_search,
+        codes=index.codes(),
+        candidate_rows=embeddings.def_embeddings.rows,
+    )
+    save_report(report, report_path)
+    console.log('Report saved to {0}.'.format(report_path))
 
-    # last 10 elements of sorted list
-    best_words = word_dists[-10:]
+    # ten held-out rows with the highest similarity to expected
+    cosine = row_cosine(preds, embeddings.def_embeddings[test_rows])
+    best = np.argsort(cosine)[-10:]
     console.log('Best words:')
-    for res in best_words:
-        console.log('Word {0} Dist {1}'.format(res[0], res[1]))
+    for it in best:
+        console.log('Word {0} Dist {1}'.format(
+            df.loc[test_rows[it], 'word'],
+            cosine[it],
+        ))
 
     # test prediction on unseen words
-    for res in best_words:
-        word = res[0]
-        pred = res[2]
+    for it in best:
+        row = df.loc[test_rows[it]]
 
         console.log('Word and root etymology:', style='green')
-        word_etym = test_df[test_df['word'] == word]['word_etym'].values[0]
-        console.log(word_etym)
+        console.log('{0} {1}'.format(row['word'], row['etym']))
 
-        definition = test_df[test_df['word'] == word]['def'].values[0]
         console.log('Definition:', style='red')
-        console.log(definition)
-
-        # find three most similar embeddings by distance
-        def_neighbors = nearest_neighbors(
-            k_neighbors=3,
-            arr=embeddings.def_embeddings,
-            sample=pred,
-        )
+        console.log(row['def'])
 
-        # get definitions of neighbors
-        def_neighbors_df = df.iloc[def_neighbors]
+        # get definitions of the three nearest neighbors
+        def_neighbors_df = df.iloc[neighbors[it, :3]]
 
         # print neighbors definitions
         console.log('Closest definitions:', style='red')
@@ -337,4 +245,4 @@ if __name__ == '__main__':
             console.log(def_neighbor['def'])
 
         console.log('\n')
-        console.log('-' * len(word))
+        console.log('-' * len(row['word']))
@@ -0,0 +1,34 @@
+"""Script to serve definition retrieval over HTTP or a Unix socket."""
+import argparse
+import asyncio
+from pathlib import Path
+
+from experio import const
+from experio.core.models.encoder import MODEL
+from experio.service import DefinitionService, serve
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--model-path',
+        default=str(Path.cwd() / 'model' / 'model.pt'),
+    )
+    parser.add_argument('--base-path', default=const.BASE_PATH)
+    parser.add_argument('--model-name', default=MODEL)
+    parser.add_argument('--encoding', default=None)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--unix-path', default=None)
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-delay', type=float, default=0.005)
+    args = parser.parse_args()
+
+    service = DefinitionService(
+        args.model_path,
+        base_path=args.base_path,
+        model_name=args.model_name,
+        encoding=args.encoding,
+        max_batch=args.max_batch,
+        max_delay=args.max_delay,
+    )
+    asyncio.run(serve(service, args.host, args.port, args.unix_path))
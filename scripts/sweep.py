@@ -0,0 +1,93 @@
+"""Script to sweep the hyperparameters of the definition predictor."""
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from experio.console import console
+from experio.dataset import EtymDefDataset
+from experio.models import Embeddings, SplitLayout
+from experio.training import run_sweep, sweep_grid
+
+DROP_PERCENT = 0.9
+SPLIT_PERCENT = 0.8
+VAL_PERCENT = 0.1
+RANDOM_SEED = 5
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--hidden-layers', nargs='+', type=int, default=[3])
+    parser.add_argument(
+        '--learning-rates',
+        nargs='+',
+        type=float,
+        default=[0.001],
+    )
+    parser.add_argument('--epochs', nargs='+', type=int, default=[3])
+    parser.add_argument('--batch-sizes', nargs='+', type=int, default=[256])
+    parser.add_argument('--seeds', nargs='+', type=int, default=[RANDOM_SEED])
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--threads-per-worker', type=int, default=None)
+    parser.add_argument(
+        '--out-path',
+        default=str(Path.cwd() / 'model' / 'sweep'),
+    )
+    args = parser.parse_args()
+
+    dataset = EtymDefDataset()
+    embeddings = Embeddings()
+    index = dataset.word_index()
+
+    # same rows and split as scripts/model.py
+    rng = np.random.default_rng(RANDOM_SEED)
+    num_rows = len(embeddings.word_embeddings)
+    rows = np.sort(rng.choice(
+        num_rows,
+        size=int(num_rows * (1 - DROP_PERCENT)),
+        replace=False,
+    ))
+    train_rows, test_rows = index.split(SPLIT_PERCENT, RANDOM_SEED, rows)
+    train_rows, val_rows = index.split(
+        1 - VAL_PERCENT,
+        RANDOM_SEED,
+        train_rows,
+    )
+    # the same layout as scripts/model.py, so it is only built once
+    layout = SplitLayout.open(
+        str(Path.cwd() / 'model' / 'layout'),
+        embeddings.word_embeddings,
+        embeddings.def_embeddings,
+        {'train': train_rows, 'val': val_rows, 'test': test_rows},
+        source=embeddings.saved_manifest(),
+    )
+
+    results = run_sweep(
+        str(layout.path),
+        sweep_grid(
+            hidden_layers=tuple(args.hidden_layers),
+            learning_rate=tuple(args.learning_rates),
+            epochs=tuple(args.epochs),
+            batch_size=tuple(args.batch_sizes),
+            random_seed=tuple(args.seeds),
+        ),
+        args.out_path,
+        workers=args.workers,
+        threads_per_worker=args.threads_per_worker,
+    )
+    for result in results:
+        console.log(
+            'layers {0} lr {1} epochs {2} batch {3} seed {4}:'.format(
+                result['hidden_layers'],
+                result['learning_rate'],
+                result['epochs'],
+                result['batch_size'],
+                result['random_seed'],
+            ),
+            'validation loss {0:.4f} ({1:.0f}s)'.format(
+                result['val_loss'],
+                result['seconds'],
+            ),
+        )
+    console.log('Test loss of the best configuration: {0:.4f}'.format(
+        results[0]['test_loss'],
+    ))